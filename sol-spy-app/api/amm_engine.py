@@ -0,0 +1,323 @@
+import asyncio
+import base64
+import logging
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from api.pool_layouts import (PUMP_FEE_RATE, PUMP_FUN_PROGRAM_ID, PUMP_TOKEN_DECIMALS, RAYDIUM_AMM_V4_PROGRAM_ID, WSOL,
+                              decode_pump_bonding_curve, decode_raydium_amm_v4, decode_token_amount,
+                              pump_bonding_curve_address, raydium_pool_filters)
+from api.price_oracle import PriceOracle, price_oracle
+from api.rpc_router import RpcRouter, rpc_router
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# getMultipleAccounts принимает до 100 адресов
+MAX_ACCOUNTS_PER_REQUEST = 100
+# Направления свопа: 0 — продаём base за quote, 1 — покупаем base за quote
+SELL_BASE, BUY_BASE = 0, 1
+
+
+class Pool(NamedTuple):
+    address: str
+    kind: str  # "raydium_amm_v4" | "pump_fun"
+    base_mint: str
+    quote_mint: str
+    base_decimals: int
+    quote_decimals: int
+    accounts: tuple  # что перечитывать при обновлении резервов
+
+
+class AmmQuotes(NamedTuple):
+    out_amount: np.ndarray
+    min_out_amount: np.ndarray
+    price_impact: np.ndarray
+    stale: np.ndarray
+
+
+class LocalQuote(NamedTuple):
+    pool: str
+    in_amount: int
+    out_amount: int
+    min_out_amount: int
+    price_impact: float
+
+
+class SolPools(NamedTuple):
+    pools: np.ndarray  # индексы пулов токен/SOL
+    directions: np.ndarray  # колонка резерва токена
+    scales: np.ndarray  # 10 ** decimals токена / 10 ** 9
+    owners: np.ndarray  # позиция минта в запрошенном списке
+    count: int
+
+
+class AmmQuoteEngine:
+    """
+    Котировки constant-product пулов (Raydium AMM v4, bonding curve Pump.fun) без обращения к агрегатору.
+    Резервы хранятся в массивах NumPy и обновляются пачками getMultipleAccounts, поэтому quote()
+    считает выход, price impact и minimum-out сразу для тысяч пар (пул, объём) одной векторной операцией.
+    """
+
+    def __init__(self, router: RpcRouter = None, oracle: PriceOracle = None, capacity: int = 64):
+        self.router = router or rpc_router
+        self.oracle = oracle or price_oracle
+        self._pools: list[Pool] = []
+        self._index: dict[str, int] = {}
+        self._by_mint: dict[str, list[int]] = {}
+        self._not_found: dict[str, float] = {}
+        # [base, quote] в минимальных единицах
+        self._reserves = np.zeros((capacity, 2), dtype=np.float64)
+        # Комиссия по направлению (SELL_BASE, BUY_BASE): с входа и с выхода
+        self._fee_in = np.zeros((capacity, 2), dtype=np.float64)
+        self._fee_out = np.zeros((capacity, 2), dtype=np.float64)
+        self._updated_at = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self._pools)
+
+    def _grow(self) -> None:
+        capacity = len(self._updated_at) * 2
+        for name in ("_reserves", "_fee_in", "_fee_out", "_updated_at"):
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def _register(self, pool: Pool, fee_in: tuple, fee_out: tuple) -> int:
+        if pool.address in self._index:
+            return self._index[pool.address]
+        if len(self._pools) == len(self._updated_at):
+            self._grow()
+        index = len(self._pools)
+        self._pools.append(pool)
+        self._index[pool.address] = index
+        self._fee_in[index] = fee_in
+        self._fee_out[index] = fee_out
+        for mint in (pool.base_mint, pool.quote_mint):
+            self._by_mint.setdefault(mint, []).append(index)
+        return index
+
+    def register_raydium(self, address: str, data: bytes) -> int:
+        amm = decode_raydium_amm_v4(data)
+        fee = amm.swap_fee_numerator / amm.swap_fee_denominator if amm.swap_fee_denominator else 0.0
+        pool = Pool(address, "raydium_amm_v4", amm.base_mint, amm.quote_mint, amm.base_decimals, amm.quote_decimals,
+                    (address, amm.base_vault, amm.quote_vault))
+        return self._register(pool, (fee, fee), (0.0, 0.0))
+
+    def register_pump(self, mint: str, curve_address: str) -> int:
+        # Pump.fun берёт 1% с SOL: при покупке со входа, при продаже с выхода
+        pool = Pool(curve_address, "pump_fun", mint, WSOL, PUMP_TOKEN_DECIMALS, 9, (curve_address,))
+        return self._register(pool, (0.0, PUMP_FEE_RATE), (PUMP_FEE_RATE, 0.0))
+
+    async def _fetch(self, addresses: list[str]) -> dict[str, Optional[dict]]:
+        chunks = [addresses[i:i + MAX_ACCOUNTS_PER_REQUEST] for i in range(0, len(addresses), MAX_ACCOUNTS_PER_REQUEST)]
+        results = await asyncio.gather(*[
+            self.router.request("getMultipleAccounts", [chunk, {"encoding": "base64", "commitment": "processed"}])
+            for chunk in chunks
+        ])
+        accounts = {}
+        for chunk, result in zip(chunks, results):
+            for address, account in zip(chunk, result["value"]):
+                accounts[address] = account
+        return accounts
+
+    @staticmethod
+    def _data(account: Optional[dict]) -> Optional[bytes]:
+        return base64.b64decode(account["data"][0]) if account else None
+
+    async def refresh(self, indices: Optional[list[int]] = None) -> int:
+        """
+        Перечитывает резервы пулов (по умолчанию всех) пачками getMultipleAccounts.
+        """
+        indices = range(len(self._pools)) if indices is None else indices
+        pools = [(index, self._pools[index]) for index in indices]
+        if not pools:
+            return 0
+        accounts = await self._fetch(list(dict.fromkeys(address for _, pool in pools for address in pool.accounts)))
+        now = time.monotonic()
+        updated = 0
+        for index, pool in pools:
+            data = [self._data(accounts.get(address)) for address in pool.accounts]
+            if any(item is None for item in data):
+                continue
+            if pool.kind == "pump_fun":
+                curve = decode_pump_bonding_curve(data[0])
+                if curve.complete:
+                    # Кривая завершена, ликвидность переехала в AMM
+                    self._reserves[index] = 0
+                    continue
+                self._reserves[index] = (curve.virtual_token_reserves, curve.virtual_sol_reserves)
+            else:
+                amm = decode_raydium_amm_v4(data[0])
+                self._reserves[index] = (
+                    max(decode_token_amount(data[1]) - amm.base_need_take_pnl, 0),
+                    max(decode_token_amount(data[2]) - amm.quote_need_take_pnl, 0),
+                )
+            self._updated_at[index] = now
+            updated += 1
+            self._record_price(pool, self._reserves[index])
+        return updated
+
+    def _record_price(self, pool: Pool, reserves: np.ndarray) -> None:
+        if WSOL not in (pool.base_mint, pool.quote_mint) or not reserves.all():
+            return
+        if pool.quote_mint == WSOL:
+            mint, token_reserve, token_decimals, sol_reserve = pool.base_mint, reserves[0], pool.base_decimals, reserves[1]
+        else:
+            mint, token_reserve, token_decimals, sol_reserve = pool.quote_mint, reserves[1], pool.quote_decimals, reserves[0]
+        self.oracle.record(mint, float((sol_reserve / 10 ** 9) / (token_reserve / 10 ** token_decimals)))
+
+    async def _discover_raydium(self, mint: str) -> list[int]:
+        results = await asyncio.gather(*[
+            self.router.request("getProgramAccounts", [RAYDIUM_AMM_V4_PROGRAM_ID, {
+                "encoding": "base64", "filters": raydium_pool_filters(base, quote),
+            }])
+            for base, quote in ((mint, WSOL), (WSOL, mint))
+        ])
+        return [self.register_raydium(item["pubkey"], self._data(item["account"]))
+                for result in results for item in result or []]
+
+    async def _discover_pump(self, mint: str) -> list[int]:
+        curve_address = pump_bonding_curve_address(mint)
+        account = (await self._fetch([curve_address]))[curve_address]
+        if not account or account.get("owner") != PUMP_FUN_PROGRAM_ID \
+                or decode_pump_bonding_curve(self._data(account)).complete:
+            return []
+        return [self.register_pump(mint, curve_address)]
+
+    async def track_mint(self, mint: str) -> list[int]:
+        """
+        Находит пулы токена к SOL (bonding curve Pump.fun и пулы Raydium AMM v4) и начинает их отслеживать.
+        """
+        if mint in self._by_mint:
+            return self._by_mint[mint]
+        missed_at = self._not_found.get(mint)
+        if missed_at and time.monotonic() - missed_at < settings.amm_engine.discovery_retry_seconds:
+            return []
+
+        indices = await self._discover_pump(mint)
+        if not indices:
+            indices = await self._discover_raydium(mint)
+        if not indices:
+            self._not_found[mint] = time.monotonic()
+            logger.info(f"Пулы для {mint} не найдены")
+            return []
+        await self.refresh(indices)
+        logger.info(f"Отслеживаем пулы {mint}: {[self._pools[index].address for index in indices]}")
+        return indices
+
+    def quote(self, pools, amounts, directions, slippage_bps: float = 0) -> AmmQuotes:
+        """
+        Векторная котировка exact-in: pools — индексы пулов, amounts — объёмы входа в минимальных единицах,
+        directions — SELL_BASE/BUY_BASE. Аргументы транслируются друг на друга по правилам NumPy.
+        """
+        pools, amounts, directions = np.broadcast_arrays(
+            np.asarray(pools, dtype=np.intp), np.asarray(amounts, dtype=np.float64), np.asarray(directions, dtype=np.intp)
+        )
+        # Колонка резерва входа совпадает с направлением: SELL_BASE платит base, BUY_BASE — quote
+        reserve_in = self._reserves[pools, directions]
+        reserve_out = self._reserves[pools, directions ^ 1]
+        amount_in = amounts * (1 - self._fee_in[pools, directions])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = np.where(reserve_in > 0, amount_in / (reserve_in + amount_in), 0.0)
+        out_amount = np.floor(reserve_out * share * (1 - self._fee_out[pools, directions]))
+        min_out_amount = np.floor(out_amount * (1 - slippage_bps / 10_000))
+        stale = time.monotonic() - self._updated_at[pools] > settings.amm_engine.max_age_seconds
+        return AmmQuotes(out_amount, min_out_amount, share, stale)
+
+    def pools_for(self, input_mint: str, output_mint: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Индексы пулов пары и направление свопа для каждого.
+        """
+        indices = [index for index in self._by_mint.get(input_mint, [])
+                   if {self._pools[index].base_mint, self._pools[index].quote_mint} == {input_mint, output_mint}]
+        directions = [SELL_BASE if self._pools[index].base_mint == input_mint else BUY_BASE for index in indices]
+        return np.asarray(indices, dtype=np.intp), np.asarray(directions, dtype=np.intp)
+
+    def quote_exact_in(self, input_mint: str, output_mint: str, amount: int,
+                       slippage_bps: float = 0) -> Optional[LocalQuote]:
+        """
+        Лучшая котировка по отслеживаемым пулам пары или None, если свежих пулов нет.
+        """
+        pools, directions = self.pools_for(input_mint, output_mint)
+        if not len(pools):
+            return None
+        quotes = self.quote(pools, amount, directions, slippage_bps)
+        out_amount = np.where(quotes.stale, -1, quotes.out_amount)
+        best = int(np.argmax(out_amount))
+        if out_amount[best] <= 0:
+            return None
+        return LocalQuote(self._pools[pools[best]].address, int(amount), int(quotes.out_amount[best]),
+                          int(quotes.min_out_amount[best]), float(quotes.price_impact[best]))
+
+    def spot_price(self, mint: str) -> Optional[float]:
+        """
+        Цена токена в SOL по самому глубокому свежему пулу к SOL.
+        """
+        pools, directions = self.pools_for(mint, WSOL)
+        if not len(pools):
+            return None
+        fresh = time.monotonic() - self._updated_at[pools] <= settings.amm_engine.max_age_seconds
+        token_reserves = self._reserves[pools, directions]
+        sol_reserves = self._reserves[pools, directions ^ 1]
+        candidates = np.flatnonzero(fresh & (token_reserves > 0) & (sol_reserves > 0))
+        if not len(candidates):
+            return None
+        best = candidates[np.argmax(sol_reserves[candidates])]
+        pool = self._pools[pools[best]]
+        token_decimals = pool.base_decimals if pool.base_mint == mint else pool.quote_decimals
+        return float((sol_reserves[best] / 10 ** 9) / (token_reserves[best] / 10 ** token_decimals))
+
+    def raydium_sol_is_coin(self, mint: str) -> Optional[bool]:
+        """
+        Сторона SOL в известном пуле Raydium AMM v4 токена: True — SOL в coin (base), None — пул не найден.
+        """
+        for index in self._by_mint.get(mint, ()):
+            pool = self._pools[index]
+            if pool.kind == "raydium_amm_v4" and {pool.base_mint, pool.quote_mint} == {mint, WSOL}:
+                return pool.base_mint == WSOL
+        return None
+
+    def sol_pools(self, mints: list[str]) -> SolPools:
+        """
+        Раскладка пулов к SOL для spot_prices. Индексы пулов стабильны, раскладку достаточно
+        пересобирать при изменении списка минтов.
+        """
+        pools, directions, scales, owners = [], [], [], []
+        for owner, mint in enumerate(mints):
+            indices, sides = self.pools_for(mint, WSOL)
+            for index, side in zip(indices, sides):
+                pool = self._pools[index]
+                decimals = pool.base_decimals if pool.base_mint == mint else pool.quote_decimals
+                pools.append(index)
+                directions.append(side)
+                scales.append(10.0 ** (decimals - 9))
+                owners.append(owner)
+        return SolPools(np.asarray(pools, dtype=np.intp), np.asarray(directions, dtype=np.intp),
+                        np.asarray(scales, dtype=np.float64), np.asarray(owners, dtype=np.intp), len(mints))
+
+    def spot_prices(self, layout: SolPools) -> np.ndarray:
+        """
+        spot_price сразу для всех минтов раскладки: цена по самому глубокому свежему пулу, nan — если такого нет.
+        """
+        prices = np.full(layout.count, np.nan)
+        if not len(layout.pools):
+            return prices
+        token_reserves = self._reserves[layout.pools, layout.directions]
+        sol_reserves = self._reserves[layout.pools, layout.directions ^ 1]
+        fresh = time.monotonic() - self._updated_at[layout.pools] <= settings.amm_engine.max_age_seconds
+        valid = np.flatnonzero(fresh & (token_reserves > 0) & (sol_reserves > 0))
+        if not len(valid):
+            return prices
+        # Сортировка по (минт, глубина): последний в группе минта — самый глубокий пул
+        order = valid[np.lexsort((sol_reserves[valid], layout.owners[valid]))]
+        owners = layout.owners[order]
+        deepest = order[np.append(owners[1:] != owners[:-1], True)]
+        prices[layout.owners[deepest]] = sol_reserves[deepest] * layout.scales[deepest] / token_reserves[deepest]
+        return prices
+
+
+amm_engine = AmmQuoteEngine()
@@ -1,22 +1,19 @@
-from decouple import config
-from solana.rpc.api import Client
-
 from api.helius_api import HeliusApi
 from api.jupiter_api import JupiterAPI
+from api.quote_router import QuoteRouter
 from api.raydium_api import RaydiumAPI
 from api.solana_api import SolanaAPI
 
 
 class ApiHelper:
     def __init__(self):
-        quicknode_endpoint = config("QUICKNODE_ENDPOINT")
-        self.solana_client = Client(quicknode_endpoint)
         self.solana_api = SolanaAPI()
-        self.raydium_api = RaydiumAPI(rpc_endpoint=quicknode_endpoint)
+        self.raydium_api = RaydiumAPI()
         self.helius_api=HeliusApi()
-        self.jupiter_api=JupiterAPI(quicknode_endpoint)
+        self.jupiter_api=JupiterAPI()
+        self.quote_router = QuoteRouter({"jupiter": self.jupiter_api, "raydium": self.raydium_api})
 
 
 
 
-api_helper = ApiHelper()
\ No newline at end of file
+api_helper = ApiHelper()
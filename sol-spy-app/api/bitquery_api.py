@@ -1,6 +1,7 @@
 
+import asyncio
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Optional,  Dict
+from typing import Optional,  Dict, Iterable, List
 
 from gql import Client, gql
 from gql.transport.aiohttp import AIOHTTPTransport
@@ -8,7 +9,7 @@ import os
 from dotenv import load_dotenv
 import logging
 
-from httpx import TransportError
+from core.config import settings
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -17,9 +18,125 @@ logger = logging.getLogger(__name__)
 # Загружаем переменные окружения из .env файла
 load_dotenv()
 
+# WSOL mint address
+SOL_MINT = "So11111111111111111111111111111111111111112"
+
+# Документы разбираются один раз при импорте, а не на каждый вызов
+TOKEN_PRICES_QUERY = gql(
+    """
+    query GetTokenPricesInSOL($tokenAddresses: [String!], $solMint: String!, $count: Int!) {
+      Solana {
+        DEXTradeByTokens(
+          where: {
+            Trade: {
+              Currency: {MintAddress: {in: $tokenAddresses}},
+              Side: {Currency: {MintAddress: {is: $solMint}}}
+            }
+          }
+          orderBy: {descending: Block_Time}
+          limitBy: {by: Trade_Currency_MintAddress, count: 1}
+          limit: {count: $count}
+        ) {
+          Trade {
+            Currency {
+              MintAddress
+              Symbol
+            }
+            Price
+          }
+        }
+      }
+    }
+    """
+)
+
+TRANSACTIONS_QUERY = gql(
+    """
+    query GetSolanaTransactionTypes($transactionHashes: [String!], $count: Int!) {
+      Solana {
+        DEXTrades(
+          where: {Transaction: {Signature: {in: $transactionHashes}}}
+          limit: {count: $count}
+        ) {
+          Transaction {
+            Signature
+          }
+          Trade {
+            Buy {
+              Amount
+              Currency {
+                MintAddress
+                Symbol
+              }
+            }
+            Sell {
+              Amount
+              Currency {
+                MintAddress
+                Symbol
+              }
+            }
+            Dex {
+              ProtocolName
+              ProtocolFamily
+            }
+          }
+        }
+      }
+    }
+    """
+)
+
+
+def _chunks(items: List[str], size: int) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def empty_transaction_info() -> Dict:
+    return {
+        "transaction_type": "transfer",
+        "token_address": "",
+        "token_symbol": "Unknown",
+        "buy_amount": 0.0,
+        "sell_amount": 0.0,
+        "transfer_amount": 0.0,
+        "dex_name": ""
+    }
+
+
+def classify_trade(transaction_hash: str, trade: Dict) -> Dict:
+    """
+    buy — отдали SOL и получили токен, sell — отдали токен и получили SOL, иначе transfer.
+    """
+    transaction_info = empty_transaction_info()
+    buy, sell = trade.get('Buy'), trade.get('Sell')
+    if not buy or not sell:
+        return transaction_info
+
+    if sell.get('Currency', {}).get('MintAddress') == SOL_MINT and float(sell.get('Amount', 0.0)) > 0:
+        transaction_info["transaction_type"] = "buy"
+        transaction_info["token_address"] = buy['Currency'].get('MintAddress', "")
+        transaction_info["token_symbol"] = buy['Currency'].get('Symbol', "Unknown")
+        transaction_info["buy_amount"] = float(buy.get('Amount', 0.0))
+        transaction_info["sell_amount"] = float(sell.get('Amount', 0.0))
+        transaction_info["dex_name"] = trade['Dex'].get('ProtocolFamily', "Unknown")
+        logger.info(
+            f"Transaction {transaction_hash} identified as a buy (sent SOL, received token: {transaction_info['token_symbol']}, amount: {transaction_info['buy_amount']}, SOL spent: {transaction_info['sell_amount']})")
+    # Если купили WSOL (SOL) и продали токен — это "sell" (отправил токен, получил SOL)
+    elif buy.get('Currency', {}).get('MintAddress') == SOL_MINT and float(buy.get('Amount', 0.0)) > 0:
+        transaction_info["transaction_type"] = "sell"
+        transaction_info["token_address"] = sell['Currency'].get('MintAddress', "")  # Токен, отправленный (Sell)
+        transaction_info["token_symbol"] = sell['Currency'].get('Symbol', "Unknown")  # Символ токена, отправленного
+        transaction_info["sell_amount"] = float(sell.get('Amount', 0.0))
+        transaction_info["buy_amount"] = float(buy.get('Amount', 0.0))
+        transaction_info["dex_name"] = trade['Dex'].get('ProtocolFamily', "Unknown")
+        logger.info(
+            f"Transaction {transaction_hash} identified as a sell (sent token: {transaction_info['token_symbol']}, amount: {transaction_info['sell_amount']}, received SOL: {transaction_info['buy_amount']})")
+    return transaction_info
+
 
 class BitqueryAPI:
-    def __init__(self, endpoint: str = "https://streaming.bitquery.io/eap", api_token: str = None):
+    def __init__(self, endpoint: str = None, api_token: str = None):
         # Получаем токен из переменной окружения, если он не передан явно
         self.api_token = api_token or os.getenv("BITQUERY_API_TOKEN")
         if not self.api_token:
@@ -33,188 +150,117 @@ class BitqueryAPI:
 
         logger.info(f"Инициализация Bitquery API с токеном: {self.api_token[:5]}... (сокрыт для безопасности)")
 
-        # Настраиваем транспорт с заголовком для аутентификации
+        # Настраиваем транспорт с заголовком для аутентификации; схему не запрашиваем —
+        # документы уже разобраны, а introspection стоит лишний запрос на каждое подключение
+        self.endpoint = endpoint or settings.bitquery.endpoint
         headers = {"Authorization": f"Bearer {self.api_token}", "Content-Type": "application/json"}
-        self.transport = AIOHTTPTransport(url=endpoint, headers=headers)
-        self.client = Client(transport=self.transport, fetch_schema_from_transport=True)
+        self.transport = AIOHTTPTransport(url=self.endpoint, headers=headers)
+        self.client = Client(transport=self.transport, fetch_schema_from_transport=False,
+                             execute_timeout=settings.bitquery.execute_timeout)
+        self._session = None
+        self._connect_lock = asyncio.Lock()
 
+    async def _get_session(self):
+        """
+        Одна постоянная сессия (и одно aiohttp-соединение) на все запросы.
+        """
+        if self._session is None:
+            async with self._connect_lock:
+                if self._session is None:
+                    self._session = await self.client.connect_async()
+        return self._session
 
-    async def get_token_price_in_sol(self, token_address: str) -> Optional[float]:
-        # WSOL mint address
-        sol_mint = "So11111111111111111111111111111111111111112"
-
-        query = gql(
-            """
-            query GetTokenPriceInSOL($tokenAddress: String!, $solMint: String!) {
-              Solana {
-                DEXTradeByTokens(
-                  where: {
-                    Trade: {
-                      Currency: {MintAddress: {is: $tokenAddress}},
-                      Side: {Currency: {MintAddress: {is: $solMint}}}
-                    }
-                  }
-                  orderBy: {descending: Block_Time}
-                  limit: {count: 1}
-                ) {
-                  Trade {
-                    Currency {
-                      MintAddress
-                      Symbol
-                    }
-                    Price
-                  }
-                }
-              }
-            }
-            """
-        )
+    async def _execute(self, document, variables: Dict) -> Dict:
+        session = await self._get_session()
+        return await session.execute(document, variable_values=variables)
 
-        try:
-            variables = {
-                "tokenAddress": token_address,
-                "solMint": sol_mint
-            }
+    async def _gather_chunks(self, items: List[str], fetch) -> List:
+        semaphore = asyncio.Semaphore(settings.bitquery.concurrency)
 
-            result = await self.client.execute_async(query, variable_values=variables)
-            trades = result.get('Solana', {}).get('DEXTradeByTokens', [])
+        async def run(chunk: List[str]):
+            async with semaphore:
+                return await fetch(chunk)
 
-            if trades and len(trades) > 0:
-                trade = trades[0]['Trade']
-                # Получаем цену как строку из ответа для точного представления
-                price_str = str(trade.get('Price', 0))
-                # Преобразуем в Decimal для точного расчета
-                price_decimal = Decimal(price_str).quantize(Decimal('0.00000001'),
-                                                            rounding=ROUND_HALF_UP)  # Округляем до 8 знаков после запятой
-                # Конвертируем в float для возврата
-                price_float = float(price_decimal)
+        return await asyncio.gather(*[run(chunk) for chunk in _chunks(items, settings.bitquery.batch_size)])
 
-                symbol = trade.get('Currency', {}).get('Symbol', 'Unknown')
-                logger.info(f"Found price for token {symbol} ({token_address}): {price_float} SOL")
+    async def get_token_prices_in_sol(self, token_addresses: Iterable[str]) -> Dict[str, float]:
+        """
+        Последние цены в SOL для многих токенов: один запрос на batch_size минтов.
+        """
+        token_addresses = list(dict.fromkeys(address for address in token_addresses if address))
+        if not token_addresses:
+            return {}
 
-                # Форматируем цену с 8 десятичными знаками для отображения
-                formatted_price_fixed = f"{price_float:.8f}"  # Показывает 8 десятичных знаков (например, 0.00002389)
-                print(f"Token price (fixed decimal): {formatted_price_fixed} SOL")
+        async def fetch(chunk: List[str]) -> List[Dict]:
+            try:
+                result = await self._execute(TOKEN_PRICES_QUERY, {
+                    "tokenAddresses": chunk, "solMint": SOL_MINT, "count": len(chunk)
+                })
+                return result.get('Solana', {}).get('DEXTradeByTokens', [])
+            except Exception as e:
+                logger.error(f"Error getting prices for {len(chunk)} tokens: {str(e)}")
+                return []
 
-                return price_float
+        prices = {}
+        for trades in await self._gather_chunks(token_addresses, fetch):
+            for trade in trades:
+                trade = trade['Trade']
+                mint = trade.get('Currency', {}).get('MintAddress')
+                if mint in prices or not mint:
+                    continue
+                # Округляем до 8 знаков после запятой через Decimal для точного представления
+                prices[mint] = float(Decimal(str(trade.get('Price', 0))).quantize(Decimal('0.00000001'),
+                                                                                 rounding=ROUND_HALF_UP))
+        logger.info(f"Bitquery: цены найдены для {len(prices)} из {len(token_addresses)} токенов")
+        return prices
 
+    async def get_token_price_in_sol(self, token_address: str) -> Optional[float]:
+        price = (await self.get_token_prices_in_sol([token_address])).get(token_address)
+        if price is None:
             logger.warning(f"Price for token with address {token_address} not found")
             return None
+        logger.info(f"Found price for token {token_address}: {price:.8f} SOL")
+        return price
 
-        except Exception as e:
-            logger.error(f"Error getting price for token with address {token_address}: {str(e)}")
-            return None
+    async def get_transactions_info(self, transaction_hashes: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Классификация многих транзакций: один запрос на batch_size подписей через фильтр in.
+        У транзакции с маршрутом через несколько пулов несколько ног DEXTrades, берём ногу с SOL.
+        """
+        transaction_hashes = list(dict.fromkeys(transaction_hashes))
+        if not transaction_hashes:
+            return {}
 
-    async def get_transaction_info(self, transaction_hash: str) -> Dict:
-        query = gql(
-            """
-            query GetSolanaTransactionType($transactionHash: String!) {
-              Solana {  # Исправлено на "solana" с маленькой буквы
-                DEXTrades(
-                  where: {Transaction: {Signature: {is: $transactionHash}}}
-                  limit: {count: 1}
-                ) {
-                  Transaction {
-                    Signature
-                  }
-                  Trade {
-                    Buy {
-                      Amount
-                      Currency {
-                        MintAddress
-                        Symbol
-                      }
-                    }
-                    Sell {
-                      Amount
-                      Currency {
-                        MintAddress
-                        Symbol
-                      }
-                    }
-                    Dex {
-                      ProtocolName
-                      ProtocolFamily
-                    }
-                  }
-                }
-              }
-            }
-            """
-        )
-
-        transaction_info = {
-            "transaction_type": "transfer",
-            "token_address": "",
-            "token_symbol": "Unknown",
-            "buy_amount": 0.0,
-            "sell_amount": 0.0,
-            "transfer_amount": 0.0,
-            "dex_name": ""
-        }
+        async def fetch(chunk: List[str]) -> List[Dict]:
+            try:
+                result = await self._execute(TRANSACTIONS_QUERY, {
+                    "transactionHashes": chunk, "count": len(chunk) * settings.bitquery.legs_per_transaction
+                })
+                return result.get('Solana', {}).get('DEXTrades', [])
+            except Exception as e:
+                logger.error(f"Error getting transaction info for {len(chunk)} transactions: {str(e)}")
+                return []
 
-        try:
-            variables = {"transactionHash": transaction_hash}
-            result = await self.client.execute_async(query, variable_values=variables)
-
-            # Проверяем, является ли транзакция торговлей (DEXTrades)
-            dex_trades = result.get('Solana', {}).get('DEXTrades', [])
-            if dex_trades:
-                trade = dex_trades[0]['Trade']
-
-                # Определяем тип транзакции на основе токенов и сумм
-                solana_mint = "So11111111111111111111111111111111111111112"  # WSOL mint address
-
-                if (trade.get('Buy') and
-                        trade.get('Sell') and trade['Sell'].get('Currency', {}).get('MintAddress') == solana_mint and
-                        float(trade['Sell'].get('Amount', 0.0)) > 0):
-                    transaction_info["transaction_type"] = "buy"
-                    transaction_info["token_address"] = trade['Buy']['Currency'].get('MintAddress', "")
-                    transaction_info["token_symbol"] = trade['Buy']['Currency'].get('Symbol', "Unknown")
-                    transaction_info["buy_amount"] = float(trade['Buy'].get('Amount', 0.0))
-                    transaction_info["sell_amount"] = float(trade['Sell'].get('Amount', 0.0))
-                    transaction_info["dex_name"] = trade['Dex'].get('ProtocolFamily', "Unknown")
-                    logger.info(
-                        f"Transaction {transaction_hash} identified as a buy (sent SOL, received token: {transaction_info['token_symbol']}, amount: {transaction_info['buy_amount']}, SOL spent: {transaction_info['sell_amount']})")
-                    return transaction_info
-                # Если купили WSOL (SOL) и продали токен — это "sell" (отправил токен, получил SOL)
-                elif (trade.get('Sell') and
-                      trade.get('Buy') and trade['Buy'].get('Currency', {}).get('MintAddress') == solana_mint and
-                      float(trade['Buy'].get('Amount', 0.0)) > 0):
-                    transaction_info["transaction_type"] = "sell"
-                    transaction_info["token_address"] = trade['Sell']['Currency'].get('MintAddress',
-                                                                                      "")  # Токен, отправленный (Sell)
-                    transaction_info["token_symbol"] = trade['Sell']['Currency'].get('Symbol',
-                                                                                     "Unknown")  # Символ токена, отправленного
-                    transaction_info["sell_amount"] = float(trade['Sell'].get('Amount', 0.0))
-                    transaction_info["buy_amount"] = float(trade['Buy'].get('Amount', 0.0))
-                    transaction_info["dex_name"] = trade['Dex'].get('ProtocolFamily', "Unknown")
-                    logger.info(
-                        f"Transaction {transaction_hash} identified as a sell (sent token: {transaction_info['token_symbol']}, amount: {transaction_info['buy_amount']}, received SOL: {transaction_info['sell_amount']})")
-                    return transaction_info
-            else:
-                logger.info(f"Transaction {transaction_hash} identified as a transfer (no DEX trade found)")
-                return transaction_info
-
-
-        except (TransportError, KeyError, ValueError, Exception) as e:
-            logger.error(f"Error getting transaction info for {transaction_hash}: {str(e)}")
-            return {
-                "transaction_type": "transfer",
-                "token_address": "",
-                "token_symbol": "Unknown",
-                "buy_amount": 0.0,
-                "sell_amount": 0.0,
-                "transfer_amount": 0.0,
-                "dex_name": ""
-            }
+        infos = {transaction_hash: empty_transaction_info() for transaction_hash in transaction_hashes}
+        for dex_trades in await self._gather_chunks(transaction_hashes, fetch):
+            for dex_trade in dex_trades:
+                transaction_hash = dex_trade.get('Transaction', {}).get('Signature')
+                if transaction_hash not in infos or infos[transaction_hash]["transaction_type"] != "transfer":
+                    continue
+                infos[transaction_hash] = classify_trade(transaction_hash, dex_trade['Trade'])
+        return infos
+
+    async def get_transaction_info(self, transaction_hash: str) -> Dict:
+        return (await self.get_transactions_info([transaction_hash]))[transaction_hash]
 
     async def close(self):
         """
         Закрывает соединение с Bitquery.
         """
         try:
-            await self.transport.close()
+            if self._session is not None:
+                await self.client.close_async()
+                self._session = None
             logger.info("Соединение с Bitquery успешно закрыто")
         except Exception as e:
             logger.error(f"Ошибка при закрытии соединения с Bitquery: {e}")
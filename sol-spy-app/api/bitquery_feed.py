@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from gql import Client, gql
+from gql.transport.websockets import WebsocketsTransport
+
+from api.bitquery_api import classify_trade
+from api.price_oracle import price_oracle
+from core.config import settings
+from core.dtomodels.parsed_transaction import ParsedTransaction
+
+logger = logging.getLogger(__name__)
+
+TRADES_SUBSCRIPTION = gql(
+    """
+    subscription TrackedWalletTrades($wallets: [String!]) {
+      Solana {
+        DEXTrades(where: {Transaction: {Signer: {in: $wallets}}}) {
+          Block {
+            Time
+          }
+          Transaction {
+            Signature
+            Signer
+          }
+          Trade {
+            Buy {
+              Amount
+              Currency {
+                MintAddress
+                Symbol
+              }
+            }
+            Sell {
+              Amount
+              Currency {
+                MintAddress
+                Symbol
+              }
+            }
+            Dex {
+              ProtocolName
+              ProtocolFamily
+            }
+          }
+        }
+      }
+    }
+    """
+)
+
+
+class FeedTrade(NamedTuple):
+    wallet_address: str
+    transaction: ParsedTransaction
+
+
+def _block_time(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class BitqueryTradeFeed:
+    """
+    Поток уже классифицированных сделок отслеживаемых кошельков через GraphQL-подписку Bitquery.
+    Одна подписка на все адреса; при смене списка адресов подписка пересоздаётся, при обрыве —
+    переподключение с экспоненциальной задержкой. Повторы отсекаются по подписи (LRU),
+    сделки складываются в ограниченную очередь: при переполнении вытесняется самая старая.
+    """
+
+    def __init__(self, url: str = None, api_token: str = None, maxsize: int = None):
+        api_token = api_token or os.getenv("BITQUERY_API_TOKEN", "")
+        self.url = url or f"{settings.bitquery_feed.url}?token={api_token.strip()}"
+        self.queue: asyncio.Queue[FeedTrade] = asyncio.Queue(maxsize or settings.bitquery_feed.queue_size)
+        self.connected = False
+        self._wallets: frozenset = frozenset()
+        self._wallets_changed = asyncio.Event()
+        self._seen: OrderedDict[str, None] = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"received": 0, "duplicates": 0, "dropped": 0, "reconnects": 0}
+
+    def set_wallets(self, wallets: Iterable[str]) -> None:
+        wallets = frozenset(wallets)
+        if wallets != self._wallets:
+            self._wallets = wallets
+            self._wallets_changed.set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self) -> None:
+        delay = settings.bitquery_feed.reconnect_min_delay
+        while True:
+            if not self._wallets:
+                self._wallets_changed.clear()
+                await self._wallets_changed.wait()
+                continue
+            try:
+                await self._subscribe_until_changed()
+                delay = settings.bitquery_feed.reconnect_min_delay
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["reconnects"] += 1
+                logger.warning(f"Подписка Bitquery оборвалась: {e}, переподключение через {delay} с")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.bitquery_feed.reconnect_max_delay)
+            finally:
+                self.connected = False
+
+    async def _subscribe_until_changed(self) -> None:
+        self._wallets_changed.clear()
+        wallets = sorted(self._wallets)
+        transport = WebsocketsTransport(url=self.url, ping_interval=settings.bitquery_feed.ping_interval)
+        async with Client(transport=transport, fetch_schema_from_transport=False) as session:
+            self.connected = True
+            logger.info(f"Подписка Bitquery на сделки {len(wallets)} кошельков")
+            subscription = asyncio.create_task(self._consume(session, wallets))
+            changed = asyncio.create_task(self._wallets_changed.wait())
+            try:
+                done, _ = await asyncio.wait({subscription, changed}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                subscription.cancel()
+                changed.cancel()
+            if subscription in done and not subscription.cancelled():
+                # Сервер закрыл подписку сам: поднимаем ошибку, чтобы переподключиться
+                subscription.result()
+                raise ConnectionError("подписка завершена сервером")
+
+    async def _consume(self, session, wallets: list[str]) -> None:
+        async for result in session.subscribe(TRADES_SUBSCRIPTION, variable_values={"wallets": wallets}):
+            for dex_trade in result.get("Solana", {}).get("DEXTrades", []):
+                self.handle(dex_trade)
+
+    def handle(self, dex_trade: Dict) -> Optional[FeedTrade]:
+        self._stats["received"] += 1
+        transaction = dex_trade.get("Transaction", {})
+        signature = transaction.get("Signature")
+        if not signature:
+            return None
+        if signature in self._seen:
+            self._stats["duplicates"] += 1
+            return None
+
+        info = classify_trade(signature, dex_trade.get("Trade", {}))
+        if info["transaction_type"] == "transfer":
+            # Нога маршрута без SOL: подпись не запоминаем, сделку даст нога с SOL
+            return None
+        self._seen[signature] = None
+        if len(self._seen) > settings.bitquery_feed.dedup_size:
+            self._seen.popitem(last=False)
+
+        block_time = _block_time(dex_trade.get("Block", {}).get("Time"))
+        if info["transaction_type"] == "buy":
+            price = price_oracle.record_swap(info["token_address"], info["buy_amount"], info["sell_amount"], block_time)
+        else:
+            price = price_oracle.record_swap(info["token_address"], info["sell_amount"], info["buy_amount"], block_time)
+        parsed = ParsedTransaction(
+            transaction_hash=signature,
+            transaction_action=ParsedTransaction.action_from(info["transaction_type"]),
+            token_address=info["token_address"],
+            token_symbol=info["token_symbol"],
+            buy_amount=info["buy_amount"],
+            sell_amount=info["sell_amount"],
+            dex_name=info["dex_name"],
+            price=price,
+            timestamp=ParsedTransaction.block_timestamp(block_time),
+        )
+
+        trade = FeedTrade(transaction.get("Signer"), parsed)
+        if self.queue.full():
+            self.queue.get_nowait()
+            self._stats["dropped"] += 1
+        self.queue.put_nowait(trade)
+        return trade
+
+    def stats(self) -> dict:
+        return {**self._stats, "connected": self.connected, "wallets": len(self._wallets),
+                "queued": self.queue.qsize()}
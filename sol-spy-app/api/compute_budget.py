@@ -0,0 +1,139 @@
+import base64
+import logging
+import struct
+import time
+from typing import NamedTuple, Optional
+
+from solders.compute_budget import ID as COMPUTE_BUDGET_PROGRAM_ID
+from solders.instruction import CompiledInstruction
+from solders.message import MessageV0
+from solders.signature import Signature
+from solders.transaction import VersionedTransaction
+
+from api.rpc_router import RpcRouter, rpc_router
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SET_COMPUTE_UNIT_LIMIT = 2
+
+
+class RouteShape(NamedTuple):
+    programs: frozenset
+    hops: int
+
+
+class CachedUnits(NamedTuple):
+    units: int
+    simulated_at: float
+    uses: int
+
+
+def route_shape(message: MessageV0, hops: int) -> RouteShape:
+    """
+    Набор программ, которые вызывает транзакция (без Compute Budget), и число шагов маршрута.
+    """
+    keys = message.account_keys
+    programs = frozenset(
+        str(keys[instruction.program_id_index]) for instruction in message.instructions
+        if keys[instruction.program_id_index] != COMPUTE_BUDGET_PROGRAM_ID
+    )
+    return RouteShape(programs, hops)
+
+
+def with_compute_unit_limit(message: MessageV0, units: int) -> Optional[MessageV0]:
+    """
+    Подменяет данные SetComputeUnitLimit в уже собранном сообщении. Если инструкции нет,
+    а Compute Budget уже среди статических ключей (его добавляет SetComputeUnitPrice), вставляет её первой.
+    Возвращает None, если вставить некуда.
+    """
+    keys = message.account_keys
+    data = bytes([SET_COMPUTE_UNIT_LIMIT]) + struct.pack("<I", units)
+    instructions = list(message.instructions)
+    for index, instruction in enumerate(instructions):
+        if keys[instruction.program_id_index] == COMPUTE_BUDGET_PROGRAM_ID \
+                and instruction.data[:1] == bytes([SET_COMPUTE_UNIT_LIMIT]):
+            instructions[index] = CompiledInstruction(instruction.program_id_index, data, bytes(instruction.accounts))
+            break
+    else:
+        if COMPUTE_BUDGET_PROGRAM_ID not in keys:
+            return None
+        instructions.insert(0, CompiledInstruction(keys.index(COMPUTE_BUDGET_PROGRAM_ID), data, b""))
+    return MessageV0(message.header, keys, message.recent_blockhash, instructions, message.address_table_lookups)
+
+
+class ComputeUnitEstimator:
+    """
+    Лимит compute units для свопа по результату simulateTransaction. Симуляция делается один раз
+    на форму маршрута (программы + число шагов), дальше лимит берётся из кеша с запасом.
+    Каждые resimulate_every использований или по TTL маршрут симулируется снова,
+    и запись заменяется, если потребление ушло дальше drift_threshold.
+    """
+
+    def __init__(self, router: RpcRouter = None):
+        self.router = router or rpc_router
+        self._cache: dict[RouteShape, CachedUnits] = {}
+
+    async def simulate(self, message: MessageV0) -> Optional[int]:
+        transaction = VersionedTransaction.populate(message, [Signature.default()] * message.header.num_required_signatures)
+        result = await self.router.request("simulateTransaction", [
+            base64.b64encode(bytes(transaction)).decode(),
+            {"encoding": "base64", "sigVerify": False, "replaceRecentBlockhash": True, "commitment": "processed"},
+        ])
+        value = (result or {}).get("value") or {}
+        if value.get("err"):
+            logger.warning(f"Симуляция свопа завершилась ошибкой: {value['err']}")
+            return None
+        return value.get("unitsConsumed")
+
+    def _needs_simulation(self, cached: Optional[CachedUnits]) -> bool:
+        config = settings.compute_units
+        return cached is None \
+            or cached.uses >= config.resimulate_every \
+            or time.monotonic() - cached.simulated_at > config.ttl_seconds
+
+    async def units_for(self, message: MessageV0, hops: int) -> Optional[int]:
+        shape = route_shape(message, hops)
+        cached = self._cache.get(shape)
+        if not self._needs_simulation(cached):
+            self._cache[shape] = cached._replace(uses=cached.uses + 1)
+            return cached.units
+
+        try:
+            consumed = await self.simulate(message)
+        except Exception as e:
+            logger.warning(f"Не удалось просимулировать своп: {e}")
+            consumed = None
+        if consumed is None:
+            return cached.units if cached else None
+
+        if cached and abs(consumed - cached.units) <= cached.units * settings.compute_units.drift_threshold:
+            # Расхождение в пределах нормы: оставляем большее из значений, чтобы не срезать запас
+            consumed = max(consumed, cached.units)
+        elif cached:
+            logger.info(f"Потребление CU для {sorted(shape.programs)} ({hops} шагов) изменилось: "
+                        f"{cached.units} -> {consumed}")
+        self._cache[shape] = CachedUnits(consumed, time.monotonic(), 0)
+        return consumed
+
+    async def apply(self, message: MessageV0, hops: int) -> MessageV0:
+        """
+        Ставит в сообщение лимит CU = потребление по симуляции + headroom. При любой проблеме
+        возвращает сообщение без изменений: лимит Jupiter лучше, чем никакой сделки.
+        """
+        if not isinstance(message, MessageV0):
+            return message
+        units = await self.units_for(message, hops)
+        if not units:
+            return message
+        config = settings.compute_units
+        limit = min(config.max_units, max(config.min_units, int(units * (1 + config.headroom))))
+        patched = with_compute_unit_limit(message, limit)
+        if patched is None:
+            logger.debug("В транзакции нет Compute Budget программы, лимит CU не изменён")
+            return message
+        logger.info(f"Лимит CU для свопа: {limit} (по симуляции {units})")
+        return patched
+
+
+compute_unit_estimator = ComputeUnitEstimator()
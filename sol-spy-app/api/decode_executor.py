@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, Sequence, TypeVar
+
+import numpy as np
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+P = TypeVar("P")
+R = TypeVar("R")
+
+
+def _run_batch(fn: Callable[[P], R], payloads: Sequence[P]) -> list[R]:
+    return [fn(payload) for payload in payloads]
+
+
+class DecodeExecutor:
+    """
+    Разбор сырых ответов RPC (JSON, base64, раскладки аккаунтов) пачками в пуле процессов, чтобы
+    CPU-работа больших бэкфиллов не задерживала живые сигналы копирования в event loop.
+    Пачки меньше min_batch разбираются на месте: передача в процесс дороже самого разбора.
+    fn должна быть функцией уровня модуля, а полезная нагрузка и результат — сериализуемы pickle.
+    """
+
+    def __init__(self, workers: int = None, min_batch: int = None, chunk_size: int = None):
+        self.workers = settings.decode_executor.workers if workers is None else workers
+        self.min_batch = min_batch or settings.decode_executor.min_batch
+        self.chunk_size = chunk_size or settings.decode_executor.chunk_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._stats = {"inline_items": 0, "offloaded_items": 0, "offloaded_chunks": 0, "pool_failures": 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def map(self, fn: Callable[[P], R], payloads: Sequence[P]) -> list[R]:
+        if self.workers <= 0 or len(payloads) < self.min_batch:
+            self._stats["inline_items"] += len(payloads)
+            return _run_batch(fn, payloads)
+
+        loop = asyncio.get_running_loop()
+        chunks = [payloads[i:i + self.chunk_size] for i in range(0, len(payloads), self.chunk_size)]
+        try:
+            results = await asyncio.gather(*[
+                loop.run_in_executor(self._get_pool(), _run_batch, fn, chunk) for chunk in chunks
+            ])
+        except BrokenProcessPool as e:
+            # Процесс пула упал (например, OOM): пересоздадим пул при следующем вызове, эту пачку разберём на месте
+            logger.error(f"Пул разбора недоступен, разбираем в event loop: {e}")
+            self._stats["pool_failures"] += 1
+            self._pool = None
+            self._stats["inline_items"] += len(payloads)
+            return _run_batch(fn, payloads)
+        self._stats["offloaded_items"] += len(payloads)
+        self._stats["offloaded_chunks"] += len(chunks)
+        return [result for chunk in results for result in chunk]
+
+    def stats(self) -> dict:
+        return {**self._stats, "workers": self.workers, "min_batch": self.min_batch}
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class LoopLagMonitor:
+    """
+    Задержка event loop: насколько позже запланированного просыпается sleep(interval).
+    """
+
+    def __init__(self, interval: float = None, window: int = None):
+        self.interval = interval or settings.decode_executor.lag_interval
+        self._lags: deque = deque(maxlen=window or settings.decode_executor.lag_window)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        while True:
+            started_at = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._lags.append(max(0.0, time.monotonic() - started_at - self.interval))
+
+    def stats(self) -> dict:
+        if not self._lags:
+            return {"samples": 0}
+        lags = np.fromiter(self._lags, dtype=np.float64) * 1000
+        return {
+            "samples": len(lags),
+            "mean_ms": round(float(lags.mean()), 3),
+            "p99_ms": round(float(np.percentile(lags, 99)), 3),
+            "max_ms": round(float(lags.max()), 3),
+        }
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+decode_executor = DecodeExecutor()
+loop_lag_monitor = LoopLagMonitor()
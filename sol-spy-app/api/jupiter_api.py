@@ -1,186 +1,169 @@
-from typing import Dict
-import requests
+from typing import Dict, Optional
+import asyncio
+import aiohttp
 import base64
-from solana.rpc.async_api import AsyncClient
+from solders.address_lookup_table_account import AddressLookupTableAccount
+from solders.instruction import Instruction
 from solders.keypair import Keypair
+from solders.message import MessageV0
 from solders.pubkey import Pubkey
 from solders.transaction import VersionedTransaction
-from solders.rpc.config import RpcSendTransactionConfig
 import logging
 import time
-import asyncio
+
+from api.compute_budget import ComputeUnitEstimator, compute_unit_estimator
+from api.priority_fee import PriorityFeeEstimator, priority_fee_estimator, quote_accounts
+from api.quote_router import VenueQuote
+from api.swap_builder import (BlockhashCache, LookupTableCache, assemble_message, blockhash_cache, lookup_table_cache,
+                              swap_instructions)
+from api.transaction_sender import PendingTransaction, TransactionSender, transaction_sender
+from core.config import settings
+from core.models.my_wallet_transaction import TransactionAction
 
 logger = logging.getLogger(__name__)
 
 class JupiterAPI:
-    def __init__(self,rpc_endpoint: str ,jupiter_api_endpoint: str = "https://lite-api.jup.ag/swap/v1"):
-        self.solana_client = AsyncClient(rpc_endpoint)
+    def __init__(self, sender: TransactionSender = None, fee_estimator: PriorityFeeEstimator = None,
+                 cu_estimator: ComputeUnitEstimator = None, blockhashes: BlockhashCache = None,
+                 lookup_tables: LookupTableCache = None, jupiter_api_endpoint: str = "https://lite-api.jup.ag/swap/v1"):
+        self.sender = sender or transaction_sender
+        self.fee_estimator = fee_estimator or priority_fee_estimator
+        self.cu_estimator = cu_estimator or compute_unit_estimator
+        self.blockhashes = blockhashes or blockhash_cache
+        self.lookup_tables = lookup_tables or lookup_table_cache
         self.jupiter_api_endpoint = jupiter_api_endpoint
+        self._session: Optional[aiohttp.ClientSession] = None
 
-    async def get_swap_quote_for_buy(self, input_mint: str, output_mint: str, amount: float) -> Dict:
-        url = f"{self.jupiter_api_endpoint}/quote"
-        headers = {
-            'Accept': 'application/json'
-        }
+    def _http(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(headers={"Accept": "application/json"},
+                                                  timeout=aiohttp.ClientTimeout(total=5))
+        return self._session
 
-        params = {
-            "inputMint": input_mint,
-            "outputMint": output_mint,
-            "amount": int(amount * 10 ** 6),
-            "slippageBps": str(300)
-        }
+    async def _get_quote(self, params: Dict) -> Dict:
         try:
-            response = requests.request("GET", url, headers=headers, params=params, timeout=5)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
+            async with self._http().get(f"{self.jupiter_api_endpoint}/quote", params=params) as response:
+                response.raise_for_status()
+                return await response.json()
+        except aiohttp.ClientError as e:
             logger.error(f"Failed to get swap quote: {e}")
             raise
 
-    async def get_swap_quote_for_sell(self, input_mint: str, output_mint: str, amount: float) -> Dict:
-        url = f"{self.jupiter_api_endpoint}/quote"
-        headers = {
-            'Accept': 'application/json'
-        }
-
-        params = {
+    async def get_swap_quote_for_buy(self, input_mint: str, output_mint: str, amount: float,
+                                     slippage_bps: int = 300) -> Dict:
+        return await self._get_quote({
             "inputMint": input_mint,
             "outputMint": output_mint,
-            "amount": amount,
-            "slippageBps": str(7000)
+            # Покупка всегда за SOL: amount в SOL, в котировку идут лампорты
+            "amount": int(amount * 10 ** 9),
+            "slippageBps": str(slippage_bps)
+        })
+
+    async def get_swap_quote_for_sell(self, input_mint: str, output_mint: str, amount: float,
+                                      slippage_bps: int = 7000) -> Dict:
+        return await self._get_quote({
+            "inputMint": input_mint,
+            "outputMint": output_mint,
+            "amount": int(amount),
+            "slippageBps": str(slippage_bps)
+        })
+
+    async def _build_swap_message(self, user_public_key: Pubkey, quote: Dict,
+                                  priority_fee: int) -> tuple[MessageV0, int]:
+        swap_payload = {
+            "quoteResponse": quote,
+            "userPublicKey": str(user_public_key),
+            "wrapAndUnwrapSol": True,
+            "computeUnitPriceMicroLamports": priority_fee,
         }
-        try:
-            response = requests.request("GET", url, headers=headers, params=params, timeout=5)
+        async with self._http().post(f"{self.jupiter_api_endpoint}/swap", json=swap_payload) as response:
             response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            logger.error(f"Failed to get swap quote: {e}")
-            raise
-
-    async def execute_swap_for_buy(self, keypair: Keypair, input_mint: str, output_mint: str, amount: float, action: str) -> str:
-        start_time = time.time()
-
-        # Отримуємо котирування
-        quote = await self.get_swap_quote_for_buy(input_mint, output_mint, amount)
-        if not quote or "data" not in quote:
-            raise ValueError("Failed to get swap quote from Jupiter API")
-
-        # Вибираємо першу котировку і перевіряємо outAmount
-        quote_data = quote["data"][0]
-        expected_out_amount = float(quote_data["outAmount"]) / 10 ** 6  # Конвертація в людські одиниці
-        logger.info(f"Expected output amount: {expected_out_amount} {output_mint}")
-
-        swap_url = f"{self.jupiter_api_endpoint}/swap"
+            response_data = await response.json()
+        if "swapTransaction" not in response_data:
+            raise ValueError("No swapTransaction in response")
+
+        # Jupiter уже подставил свежий blockhash, подписываем сообщение после правки лимита CU
+        unsigned = VersionedTransaction.from_bytes(base64.b64decode(response_data["swapTransaction"]))
+        return unsigned.message, response_data["lastValidBlockHeight"]
+
+    async def prepare_swap(self, user_public_key: Pubkey,
+                           quote: Dict) -> tuple[list[Instruction], list[AddressLookupTableAccount]]:
+        """
+        Инструкции свопа из /swap-instructions и его lookup tables: всё, кроме blockhash и compute budget.
+        """
         swap_payload = {
-            "quoteResponse": quote_data,
-            "userPublicKey": str(keypair.pubkey()),
+            "quoteResponse": quote,
+            "userPublicKey": str(user_public_key),
             "wrapAndUnwrapSol": True,
-            # "feeAccount": str(fee_account_pubkey)  # Опціонально, якщо потрібен окремий акаунт для комісій
         }
-        try:
-            swap_response = requests.post(swap_url, json=swap_payload, timeout=5)
-            swap_response.raise_for_status()
-            response_data = swap_response.json()
-            if "swapTransaction" not in response_data:
-                raise ValueError("No swapTransaction in response")
-            tx_data = response_data["swapTransaction"]
-        except requests.RequestException as e:
-            logger.error(f"Failed to get swap transaction: {e}")
-            raise
-
-        # Декодуємо транзакцію з base64
-        transaction_buffer = base64.b64decode(tx_data)
-
-        # Десеріалізація транзакції
-        transaction = VersionedTransaction.from_bytes(transaction_buffer)
-
-        # Отримуємо recent_blockhash
-        recent_blockhash_response = await self.solana_client.get_latest_blockhash()
-        recent_blockhash = recent_blockhash_response.value.blockhash
-
-        # Оновлюємо recent_blockhash
-        transaction.message.recent_blockhash = recent_blockhash
-
-        # Налаштовуємо конфігурацію відправки
-        config = RpcSendTransactionConfig(
-            skip_preflight=True,
-            max_retries=3,
-            preflight_commitment="confirmed",
-            priority_fee=100000
-        )
-
-        # Відправляємо транзакцію з ключем для підпису
-        tx_signature = await self.solana_client.send_transaction(
-            transaction=transaction,
-            signers=[keypair],
-            config=config
+        async with self._http().post(f"{self.jupiter_api_endpoint}/swap-instructions", json=swap_payload) as response:
+            response.raise_for_status()
+            response_data = await response.json()
+        if "swapInstruction" not in response_data:
+            raise ValueError(f"No swapInstruction in response: {response_data.get('error')}")
+        tables = await self.lookup_tables.get_many(response_data.get("addressLookupTableAddresses") or [])
+        return swap_instructions(response_data), tables
+
+    async def _assemble_swap_message(self, user_public_key: Pubkey, quote: Dict,
+                                     priority_fee: int) -> tuple[MessageV0, int]:
+        """
+        Собирает сообщение локально из /swap-instructions: ответ меньше, compute budget наш,
+        blockhash и lookup tables берутся из кешей.
+        """
+        (instructions, tables), blockhash = await asyncio.gather(
+            self.prepare_swap(user_public_key, quote),
+            self.blockhashes.get(),
         )
-        end_time = time.time()
-        logger.info(
-            f"Swap executed: {action} {output_mint} for {amount} tokens, signature: {tx_signature.value}, time: {end_time - start_time:.4f} seconds")
-        return str(tx_signature.value)
-
+        message = assemble_message(user_public_key, instructions, blockhash.blockhash, tables, priority_fee)
+        return message, blockhash.last_valid_block_height
 
-    async def execute_swap_for_sell(self, keypair: Keypair, input_mint: str, output_mint: str, amount: float, action: str) -> str:
+    async def venue_quote(self, input_mint: str, output_mint: str, amount: int, slippage_bps: int) -> VenueQuote:
+        quote = await self._get_quote({
+            "inputMint": input_mint,
+            "outputMint": output_mint,
+            "amount": int(amount),
+            "slippageBps": str(slippage_bps)
+        })
+        if not quote or "outAmount" not in quote:
+            raise ValueError(f"Failed to get swap quote from Jupiter API: {quote}")
+        return VenueQuote("jupiter", input_mint, output_mint, int(quote["inAmount"]), int(quote["outAmount"]),
+                          int((quote.get("platformFee") or {}).get("amount") or 0), quote_accounts(quote), quote)
+
+    async def _send_quote(self, keypair: Keypair, quote: Dict) -> PendingTransaction:
+        priority_fee = await self.fee_estimator.estimate(quote_accounts(quote))
+        if settings.swap_builder.mode == "instructions":
+            message, last_valid_block_height = await self._assemble_swap_message(keypair.pubkey(), quote, priority_fee)
+        else:
+            message, last_valid_block_height = await self._build_swap_message(keypair.pubkey(), quote, priority_fee)
+        message = await self.cu_estimator.apply(message, hops=len(quote.get("routePlan", [])))
+        transaction = VersionedTransaction(message, [keypair])
+        return await self.sender.send(transaction, last_valid_block_height, priority_fee)
+
+    async def execute_quote(self, keypair: Keypair, quote: VenueQuote) -> PendingTransaction:
+        pending = await self._send_quote(keypair, quote.quote)
+        logger.info(f"Swap sent via Jupiter: {quote.in_amount} {quote.input_mint} -> {quote.out_amount} "
+                    f"{quote.output_mint}, signature: {pending.signature}")
+        return pending
+
+    async def execute_swap(self, keypair: Keypair, input_mint: str, output_mint: str, amount: float, action: str,
+                           slippage_bps: int = None, quote: Optional[Dict] = None) -> PendingTransaction:
+        """
+        Котирует (если не передана готовая котировка), подписывает и рассылает своп.
+        Подтверждение — в PendingTransaction.result.
+        """
         start_time = time.time()
-
-        # Отримуємо котирування
-        quote = await self.get_swap_quote_for_sell(input_mint, output_mint, amount)
-        if not quote or "data" not in quote:
+        if quote is None:
+            if action == TransactionAction.BUY:
+                quote = await self.get_swap_quote_for_buy(input_mint, output_mint, amount, slippage_bps or 300)
+            else:
+                quote = await self.get_swap_quote_for_sell(input_mint, output_mint, amount, slippage_bps or 7000)
+        if not quote or "outAmount" not in quote:
             raise ValueError("Failed to get swap quote from Jupiter API")
+        logger.info(f"Expected output amount: {quote['outAmount']} {output_mint}")
 
-        # Вибираємо першу котировку і перевіряємо outAmount
-        quote_data = quote["data"][0]
-        expected_out_amount = float(quote_data["outAmount"])
-        logger.info(f"Expected output amount: {expected_out_amount} {output_mint}")
-
-        swap_url = f"{self.jupiter_api_endpoint}/swap"
-        swap_payload = {
-            "quoteResponse": quote_data,
-            "userPublicKey": str(keypair.pubkey()),
-            "wrapAndUnwrapSol": True,
-            # "feeAccount": str(fee_account_pubkey)  # Опціонально, якщо потрібен окремий акаунт для комісій
-        }
-        try:
-            swap_response = requests.post(swap_url, json=swap_payload, timeout=5)
-            swap_response.raise_for_status()
-            response_data = swap_response.json()
-            if "swapTransaction" not in response_data:
-                raise ValueError("No swapTransaction in response")
-            tx_data = response_data["swapTransaction"]
-        except requests.RequestException as e:
-            logger.error(f"Failed to get swap transaction: {e}")
-            raise
-
-        # Декодуємо транзакцію з base64
-        transaction_buffer = base64.b64decode(tx_data)
-
-        # Десеріалізація транзакції
-        transaction = VersionedTransaction.from_bytes(transaction_buffer)
-
-        # Отримуємо recent_blockhash
-        recent_blockhash_response = await self.solana_client.get_latest_blockhash()
-        recent_blockhash = recent_blockhash_response.value.blockhash
-
-        # Оновлюємо recent_blockhash
-        transaction.message.recent_blockhash = recent_blockhash
-
-        # Налаштовуємо конфігурацію відправки
-        config = RpcSendTransactionConfig(
-            skip_preflight=True,
-            max_retries=3,
-            preflight_commitment="confirmed",
-            priority_fee=100000
-        )
-
-        # Відправляємо транзакцію з ключем для підпису
-        tx_signature = await self.solana_client.send_transaction(
-            transaction=transaction,
-            signers=[keypair],
-            config=config
-        )
+        pending = await self._send_quote(keypair, quote)
         end_time = time.time()
         logger.info(
-            f"Swap executed: {action} {output_mint} for {amount} tokens, signature: {tx_signature.value}, time: {end_time - start_time:.4f} seconds")
-        return str(tx_signature.value)
-
+            f"Swap sent: {action} {output_mint} for {amount} tokens, signature: {pending.signature}, "
+            f"priority fee: {pending.priority_fee} micro-lamports/CU, time: {end_time - start_time:.4f} seconds")
+        return pending
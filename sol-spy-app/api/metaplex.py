@@ -0,0 +1,111 @@
+import base64
+import struct
+from typing import NamedTuple, Optional
+
+from solders.pubkey import Pubkey
+
+METADATA_PROGRAM_ID = "metaqbxxUerdq28cj1RbAWkYQm3ybzjb6a8bt518x1s"
+
+# Metaplex Token Metadata (Borsh): key(u8) + update_authority(32) + mint(32) + Data
+METADATA_V1_KEY = 4
+METADATA_UPDATE_AUTHORITY = 1
+METADATA_MINT = 33
+METADATA_DATA = 65
+# Ограничения программы Metaplex на длину полей Data
+MAX_NAME_LENGTH = 32
+MAX_SYMBOL_LENGTH = 10
+MAX_URI_LENGTH = 200
+
+# SPL Mint: mint_authority option(36) + supply(u64) + decimals(u8)
+MINT_DECIMALS = 44
+DEFAULT_DECIMALS = 6
+
+_U32 = struct.Struct("<I")
+_U16 = struct.Struct("<H")
+
+
+class MetadataDecodeError(ValueError):
+    pass
+
+
+class TokenMetadata(NamedTuple):
+    mint: Pubkey
+    update_authority: Pubkey
+    name: str
+    symbol: str
+    uri: str
+    seller_fee_basis_points: int
+
+
+def metadata_address(mint: str) -> str:
+    program_id = Pubkey.from_string(METADATA_PROGRAM_ID)
+    address, _ = Pubkey.find_program_address([b"metadata", bytes(program_id), bytes(Pubkey.from_string(mint))],
+                                             program_id)
+    return str(address)
+
+
+def _pubkey(view: memoryview, offset: int) -> Pubkey:
+    # base58 дорогой, строку получит только тот, кому нужен адрес
+    return Pubkey(view[offset:offset + 32].tobytes())
+
+
+def _borsh_string(view: memoryview, offset: int, max_length: int) -> tuple[str, int]:
+    """
+    Borsh-строка: u32 длина и байты. Metaplex дополняет значение нулями до max_length, их отрезаем.
+    """
+    if offset + 4 > len(view):
+        raise MetadataDecodeError(f"строка за пределами данных: смещение {offset}")
+    length = _U32.unpack_from(view, offset)[0]
+    start = offset + 4
+    # Лимит программы — в байтах; берём с запасом, главное — не выйти за конец буфера
+    if length > max_length * 4 or start + length > len(view):
+        raise MetadataDecodeError(f"некорректная длина строки {length} на смещении {offset}")
+    value = str(view[start:start + length], "utf-8", "replace").rstrip("\x00").strip()
+    return value, start + length
+
+
+def decode_metadata(data) -> TokenMetadata:
+    """
+    Разбор аккаунта Metadata по полям Borsh без промежуточных копий буфера.
+    """
+    view = memoryview(data)
+    if len(view) < METADATA_DATA + 4 or view[0] != METADATA_V1_KEY:
+        raise MetadataDecodeError("не аккаунт Metaplex Metadata")
+    name, offset = _borsh_string(view, METADATA_DATA, MAX_NAME_LENGTH)
+    symbol, offset = _borsh_string(view, offset, MAX_SYMBOL_LENGTH)
+    uri, offset = _borsh_string(view, offset, MAX_URI_LENGTH)
+    if offset + 2 > len(view):
+        raise MetadataDecodeError("нет seller_fee_basis_points")
+    return TokenMetadata(
+        mint=_pubkey(view, METADATA_MINT),
+        update_authority=_pubkey(view, METADATA_UPDATE_AUTHORITY),
+        name=name,
+        symbol=symbol,
+        uri=uri,
+        seller_fee_basis_points=_U16.unpack_from(view, offset)[0],
+    )
+
+
+def decode_mint_decimals(data) -> Optional[int]:
+    return data[MINT_DECIMALS] if len(data) > MINT_DECIMALS else None
+
+
+def decode_token_info(payload: tuple[str, Optional[str], Optional[str]]) -> dict:
+    """
+    Задача DecodeExecutor: (mint, base64 аккаунта Metadata, base64 аккаунта Mint) → symbol/name/decimals
+    в формате HeliusApi.get_token_metadata. Отсутствующие или битые данные дают значения по умолчанию.
+    """
+    mint, metadata_data, mint_data = payload
+    info = {"symbol": "Unknown", "name": "Unknown", "decimals": DEFAULT_DECIMALS}
+    if metadata_data:
+        try:
+            metadata = decode_metadata(base64.b64decode(metadata_data))
+            info["symbol"] = metadata.symbol or "Unknown"
+            info["name"] = metadata.name or "Unknown"
+        except (MetadataDecodeError, ValueError):
+            pass
+    if mint_data:
+        decimals = decode_mint_decimals(base64.b64decode(mint_data))
+        if decimals is not None:
+            info["decimals"] = decimals
+    return info
@@ -0,0 +1,105 @@
+import struct
+from typing import NamedTuple
+
+from solders.pubkey import Pubkey
+
+WSOL = "So11111111111111111111111111111111111111112"
+RAYDIUM_AMM_V4_PROGRAM_ID = "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8"
+PUMP_FUN_PROGRAM_ID = "6EF8rrecthR5Dkzon8Nwu78hRvfCKubJ14M5uBEwF6P"
+
+# Raydium AMM v4 (AmmInfo), смещения в байтах
+RAYDIUM_AMM_V4_SIZE = 752
+RAYDIUM_BASE_DECIMAL = 32
+RAYDIUM_QUOTE_DECIMAL = 40
+RAYDIUM_SWAP_FEE_NUMERATOR = 176
+RAYDIUM_SWAP_FEE_DENOMINATOR = 184
+RAYDIUM_BASE_NEED_TAKE_PNL = 192
+RAYDIUM_QUOTE_NEED_TAKE_PNL = 200
+RAYDIUM_BASE_VAULT = 336
+RAYDIUM_QUOTE_VAULT = 368
+RAYDIUM_BASE_MINT = 400
+RAYDIUM_QUOTE_MINT = 432
+
+# SPL Token account: mint(32) + owner(32) + amount(u64)
+SPL_TOKEN_AMOUNT = 64
+
+# Pump.fun bonding curve: 8 байт дискриминатора, дальше u64 резервы
+PUMP_VIRTUAL_TOKEN_RESERVES = 8
+PUMP_VIRTUAL_SOL_RESERVES = 16
+PUMP_COMPLETE = 48
+PUMP_FEE_RATE = 0.01
+PUMP_TOKEN_DECIMALS = 6
+
+
+def _u64(data: bytes, offset: int) -> int:
+    return struct.unpack_from("<Q", data, offset)[0]
+
+
+def _pubkey(data: bytes, offset: int) -> str:
+    return str(Pubkey(data[offset:offset + 32]))
+
+
+class RaydiumAmmV4(NamedTuple):
+    base_mint: str
+    quote_mint: str
+    base_vault: str
+    quote_vault: str
+    base_decimals: int
+    quote_decimals: int
+    swap_fee_numerator: int
+    swap_fee_denominator: int
+    base_need_take_pnl: int
+    quote_need_take_pnl: int
+
+
+class PumpBondingCurve(NamedTuple):
+    virtual_token_reserves: int
+    virtual_sol_reserves: int
+    complete: bool
+
+
+def decode_raydium_amm_v4(data: bytes) -> RaydiumAmmV4:
+    if len(data) < RAYDIUM_AMM_V4_SIZE:
+        raise ValueError(f"Raydium AMM v4: ожидалось {RAYDIUM_AMM_V4_SIZE} байт, получено {len(data)}")
+    return RaydiumAmmV4(
+        base_mint=_pubkey(data, RAYDIUM_BASE_MINT),
+        quote_mint=_pubkey(data, RAYDIUM_QUOTE_MINT),
+        base_vault=_pubkey(data, RAYDIUM_BASE_VAULT),
+        quote_vault=_pubkey(data, RAYDIUM_QUOTE_VAULT),
+        base_decimals=_u64(data, RAYDIUM_BASE_DECIMAL),
+        quote_decimals=_u64(data, RAYDIUM_QUOTE_DECIMAL),
+        swap_fee_numerator=_u64(data, RAYDIUM_SWAP_FEE_NUMERATOR),
+        swap_fee_denominator=_u64(data, RAYDIUM_SWAP_FEE_DENOMINATOR),
+        base_need_take_pnl=_u64(data, RAYDIUM_BASE_NEED_TAKE_PNL),
+        quote_need_take_pnl=_u64(data, RAYDIUM_QUOTE_NEED_TAKE_PNL),
+    )
+
+
+def decode_token_amount(data: bytes) -> int:
+    return _u64(data, SPL_TOKEN_AMOUNT)
+
+
+def decode_pump_bonding_curve(data: bytes) -> PumpBondingCurve:
+    return PumpBondingCurve(
+        virtual_token_reserves=_u64(data, PUMP_VIRTUAL_TOKEN_RESERVES),
+        virtual_sol_reserves=_u64(data, PUMP_VIRTUAL_SOL_RESERVES),
+        complete=bool(data[PUMP_COMPLETE]) if len(data) > PUMP_COMPLETE else False,
+    )
+
+
+def pump_bonding_curve_address(mint: str) -> str:
+    address, _ = Pubkey.find_program_address(
+        [b"bonding-curve", bytes(Pubkey.from_string(mint))], Pubkey.from_string(PUMP_FUN_PROGRAM_ID)
+    )
+    return str(address)
+
+
+def raydium_pool_filters(base_mint: str, quote_mint: str) -> list[dict]:
+    """
+    Фильтры getProgramAccounts для поиска пулов Raydium AMM v4 по паре минтов.
+    """
+    return [
+        {"dataSize": RAYDIUM_AMM_V4_SIZE},
+        {"memcmp": {"offset": RAYDIUM_BASE_MINT, "bytes": base_mint}},
+        {"memcmp": {"offset": RAYDIUM_QUOTE_MINT, "bytes": quote_mint}},
+    ]
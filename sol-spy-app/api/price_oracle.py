@@ -0,0 +1,129 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TS, PRICE, VOLUME = 0, 1, 2
+
+
+class PriceRing:
+    """
+    Кольцевой буфер последних цен одного минта: строки [timestamp, цена в SOL, объём в SOL].
+    """
+    __slots__ = ("_data", "_head", "_size")
+
+    def __init__(self, capacity: int):
+        self._data = np.zeros((capacity, 3), dtype=np.float64)
+        self._head = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, price: float, volume: float) -> None:
+        self._data[self._head] = (timestamp, price, volume)
+        self._head = (self._head + 1) % len(self._data)
+        self._size = min(self._size + 1, len(self._data))
+
+    def samples(self) -> np.ndarray:
+        return self._data[:self._size] if self._size < len(self._data) else self._data
+
+    def latest(self) -> Optional[tuple[float, float]]:
+        if not self._size:
+            return None
+        samples = self.samples()
+        row = samples[np.argmax(samples[:, TS])]
+        return float(row[TS]), float(row[PRICE])
+
+    def vwap(self, since: float) -> Optional[float]:
+        samples = self.samples()
+        window = samples[samples[:, TS] >= since]
+        if not len(window):
+            return None
+        volume = window[:, VOLUME].sum()
+        if volume <= 0:
+            # В окне только чтения резервов без объёма
+            return float(window[:, PRICE].mean())
+        return float((window[:, PRICE] * window[:, VOLUME]).sum() / volume)
+
+    def at(self, timestamp: float) -> Optional[tuple[float, float]]:
+        samples = self.samples()
+        before = samples[samples[:, TS] <= timestamp]
+        if not len(before):
+            return None
+        row = before[np.argmax(before[:, TS])]
+        return float(row[TS]), float(row[PRICE])
+
+
+class PriceOracle:
+    """
+    Цены токенов в SOL из памяти: наполняется свопами из парсера транзакций и чтениями резервов пулов,
+    отдаёт latest / vwap / at без сетевых запросов. Хранит не больше max_mints минтов, вытесняя давно не обновлённые.
+    """
+
+    def __init__(self, capacity: int = None, max_mints: int = None):
+        self.capacity = capacity or settings.price_oracle.capacity
+        self.max_mints = max_mints or settings.price_oracle.max_mints
+        self._rings: OrderedDict[str, PriceRing] = OrderedDict()
+
+    def record(self, mint: str, price: float, volume: float = 0.0, timestamp: Optional[float] = None) -> None:
+        if not mint or not price or price <= 0:
+            return
+        ring = self._rings.get(mint)
+        if ring is None:
+            ring = self._rings[mint] = PriceRing(self.capacity)
+            if len(self._rings) > self.max_mints:
+                self._rings.popitem(last=False)
+        else:
+            self._rings.move_to_end(mint)
+        ring.append(time.time() if timestamp is None else timestamp, price, volume)
+
+    def record_swap(self, mint: str, token_amount: float, sol_amount: float,
+                    timestamp: Optional[float] = None) -> Optional[float]:
+        """
+        Записывает цену сделки (SOL за токен) с объёмом в SOL и возвращает её.
+        """
+        if not token_amount or not sol_amount or token_amount <= 0 or sol_amount <= 0:
+            return None
+        price = sol_amount / token_amount
+        self.record(mint, price, sol_amount, timestamp)
+        return price
+
+    def latest(self, mint: str, max_age: Optional[float] = None) -> Optional[float]:
+        ring = self._rings.get(mint)
+        latest = ring.latest() if ring else None
+        if latest is None:
+            return None
+        max_age = settings.price_oracle.max_age_seconds if max_age is None else max_age
+        return latest[1] if time.time() - latest[0] <= max_age else None
+
+    def vwap(self, mint: str, window: float) -> Optional[float]:
+        ring = self._rings.get(mint)
+        return ring.vwap(time.time() - window) if ring else None
+
+    def at(self, mint: str, timestamp: float, max_gap: Optional[float] = None) -> Optional[float]:
+        """
+        Последняя известная цена на момент timestamp, если она не старше max_gap секунд.
+        """
+        ring = self._rings.get(mint)
+        sample = ring.at(timestamp) if ring else None
+        if sample is None:
+            return None
+        max_gap = settings.price_oracle.at_max_gap_seconds if max_gap is None else max_gap
+        return sample[1] if timestamp - sample[0] <= max_gap else None
+
+    def stats(self) -> dict:
+        return {
+            "mints": len(self._rings),
+            "samples": sum(len(ring) for ring in self._rings.values()),
+            "capacity": self.capacity,
+        }
+
+
+price_oracle = PriceOracle()
@@ -0,0 +1,61 @@
+import logging
+import time
+from typing import Dict, Iterable, Optional
+
+from api.rpc_router import RpcRouter, rpc_router
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# getRecentPrioritizationFees принимает не больше 128 адресов
+MAX_FEE_ACCOUNTS = 128
+
+
+def quote_accounts(quote: Dict) -> list[str]:
+    """
+    Аккаунты, в которые пишет своп по котировке Jupiter: пулы из routePlan.
+    """
+    return list(dict.fromkeys(
+        step["swapInfo"]["ammKey"] for step in quote.get("routePlan", []) if step.get("swapInfo", {}).get("ammKey")
+    ))
+
+
+class PriorityFeeEstimator:
+    """
+    Цена compute unit (micro-lamports) по недавним комиссиям за аккаунты, в которые пишет транзакция.
+    Выборка getRecentPrioritizationFees кешируется на короткий TTL по набору аккаунтов.
+    """
+
+    def __init__(self, router: RpcRouter = None):
+        self.router = router or rpc_router
+        self._cache: dict[frozenset, tuple[list[int], float]] = {}
+
+    async def _recent_fees(self, accounts: frozenset) -> list[int]:
+        cached = self._cache.get(accounts)
+        if cached and time.monotonic() - cached[1] < settings.priority_fee.ttl_seconds:
+            return cached[0]
+
+        result = await self.router.request("getRecentPrioritizationFees", [sorted(accounts)[:MAX_FEE_ACCOUNTS]])
+        fees = sorted(item["prioritizationFee"] for item in result or [])
+        self._cache[accounts] = (fees, time.monotonic())
+        # Старые наборы аккаунтов не нужны: пулы меняются от сделки к сделке
+        if len(self._cache) > settings.priority_fee.max_cache_entries:
+            self._cache.pop(next(iter(self._cache)))
+        return fees
+
+    async def estimate(self, accounts: Iterable[str], percentile: Optional[float] = None) -> int:
+        config = settings.priority_fee
+        percentile = config.percentile if percentile is None else percentile
+        try:
+            fees = await self._recent_fees(frozenset(accounts))
+        except Exception as e:
+            logger.warning(f"Не удалось получить недавние priority fee, используем {config.fallback}: {e}")
+            return config.fallback
+        if not fees:
+            return config.min_fee
+
+        fee = fees[min(len(fees) - 1, int(percentile / 100 * len(fees)))]
+        return max(config.min_fee, min(config.max_fee, fee))
+
+
+priority_fee_estimator = PriorityFeeEstimator()
@@ -0,0 +1,314 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+from functools import lru_cache
+from typing import Callable, Iterable, NamedTuple, Optional
+
+import aiohttp
+from solders.pubkey import Pubkey
+
+from api.amm_engine import AmmQuoteEngine, amm_engine
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Anchor-события Pump.fun пишутся в лог как "Program data: base64(дискриминатор + Borsh)"
+PROGRAM_DATA_PREFIX = "Program data: "
+PUMP_CREATE_EVENT = hashlib.sha256(b"event:CreateEvent").digest()[:8]
+PUMP_TRADE_EVENT = hashlib.sha256(b"event:TradeEvent").digest()[:8]
+# TradeEvent: mint(32) sol_amount(u64) token_amount(u64) is_buy(u8) user(32) timestamp(i64)
+# virtual_sol_reserves(u64) virtual_token_reserves(u64) [real_sol_reserves(u64) ...]
+PUMP_TRADE_MINT = 8
+PUMP_TRADE_VIRTUAL_SOL = 97
+PUMP_TRADE_REAL_SOL = 113
+# Виртуальный SOL-резерв новой кривой: реальная ликвидность — всё, что сверху
+PUMP_INITIAL_VIRTUAL_SOL = 30_000_000_000
+
+# Raydium AMM v4 пишет "Program log: ray_log: base64(log_type + поля)"; минта в логе нет,
+# поэтому подписка идёт на каждый минт отдельно (mentions)
+RAY_LOG_PREFIX = "Program log: ray_log: "
+RAY_LOG_INIT = 0
+RAY_LOG_DEPOSIT = 1
+RAY_LOG_SWAP_BASE_IN = 3
+RAY_LOG_SWAP_BASE_OUT = 4
+# InitLog: time(u64) pc_decimals(u8) coin_decimals(u8) pc_lot_size(u64) coin_lot_size(u64) pc_amount(u64) coin_amount(u64)
+_RAY_INIT = struct.Struct("<QBBQQQQ")
+# DepositLog: max_coin max_pc base pool_coin pool_pc pool_lp (u64) calc_pnl_x calc_pnl_y (u128) deduct_coin deduct_pc
+_RAY_DEPOSIT = struct.Struct("<QQQQQQ16s16sQQ")
+# SwapBaseIn/OutLog: amount_in/max_in amount_out/min_out direction user_source pool_coin pool_pc
+_RAY_SWAP = struct.Struct("<QQQQQQ")
+SOL_DECIMALS = 9
+_U64 = struct.Struct("<Q")
+
+CREATE = "create"
+ADD_LIQUIDITY = "add_liquidity"
+TRADE = "trade"
+
+
+class LiquidityEvent(NamedTuple):
+    mint: str
+    kind: str
+    venue: str
+    sol_liquidity: float  # SOL в пуле после события
+    signature: str
+    slot: Optional[int]
+    received_at: float  # time.perf_counter() приёма сообщения
+
+
+@lru_cache(maxsize=4096)
+def _mint_bytes(mint: str) -> bytes:
+    return bytes(Pubkey.from_string(mint))
+
+
+def _pump_event(mint: str, data: bytes) -> Optional[tuple[str, float]]:
+    discriminator = data[:8]
+    if discriminator == PUMP_CREATE_EVENT:
+        # В CreateEvent минт идёт после строк name/symbol/uri, нам хватает минта подписки
+        return CREATE, 0.0
+    if discriminator != PUMP_TRADE_EVENT or len(data) < PUMP_TRADE_VIRTUAL_SOL + 8:
+        return None
+    if data[PUMP_TRADE_MINT:PUMP_TRADE_MINT + 32] != _mint_bytes(mint):
+        return None
+    if len(data) >= PUMP_TRADE_REAL_SOL + 8:
+        lamports = _U64.unpack_from(data, PUMP_TRADE_REAL_SOL)[0]
+    else:
+        lamports = max(0, _U64.unpack_from(data, PUMP_TRADE_VIRTUAL_SOL)[0] - PUMP_INITIAL_VIRTUAL_SOL)
+    return TRADE, lamports / 10 ** SOL_DECIMALS
+
+
+def _ray_log(data: bytes, sol_is_coin: bool = False) -> Optional[tuple[str, float, bool]]:
+    """
+    (тип события, SOL в пуле, SOL в coin). В Deposit и Swap decimals нет, поэтому сторону SOL передаёт
+    вызывающий (по умолчанию pc, как у пулов token/SOL из интерфейса Raydium); InitLog определяет её по decimals.
+    """
+    log_type, body = data[0], data[1:]
+    if log_type == RAY_LOG_INIT and len(body) >= _RAY_INIT.size:
+        _, pc_decimals, coin_decimals, _, _, pc_amount, coin_amount = _RAY_INIT.unpack_from(body)
+        sol_is_coin = coin_decimals == SOL_DECIMALS and pc_decimals != SOL_DECIMALS
+        return CREATE, (coin_amount if sol_is_coin else pc_amount) / 10 ** SOL_DECIMALS, sol_is_coin
+    if log_type == RAY_LOG_DEPOSIT and len(body) >= _RAY_DEPOSIT.size:
+        fields = _RAY_DEPOSIT.unpack_from(body)
+        # pool_* — резерв до депозита, deduct_* — сколько добавлено
+        lamports = fields[3] + fields[8] if sol_is_coin else fields[4] + fields[9]
+        return ADD_LIQUIDITY, lamports / 10 ** SOL_DECIMALS, sol_is_coin
+    if log_type in (RAY_LOG_SWAP_BASE_IN, RAY_LOG_SWAP_BASE_OUT) and len(body) >= _RAY_SWAP.size:
+        fields = _RAY_SWAP.unpack_from(body)
+        return TRADE, (fields[4] if sol_is_coin else fields[5]) / 10 ** SOL_DECIMALS, sol_is_coin
+    return None
+
+
+def parse_logs(mint: str, logs: Iterable[str],
+               sol_is_coin: Optional[dict[str, bool]] = None) -> Optional[tuple[str, str, float]]:
+    """
+    (тип события, площадка, SOL в пуле) по логам транзакции, упоминающей минт, или None.
+    Берётся последнее событие транзакции: оно отражает состояние пула после неё.
+    sol_is_coin — сторона SOL в пулах Raydium по минтам: по ней читаются Deposit и Swap, InitLog её дополняет.
+    """
+    sides = {} if sol_is_coin is None else sol_is_coin
+    found = None
+    for line in logs:
+        if line.startswith(PROGRAM_DATA_PREFIX):
+            venue, prefix = "pump_fun", PROGRAM_DATA_PREFIX
+        elif line.startswith(RAY_LOG_PREFIX):
+            venue, prefix = "raydium", RAY_LOG_PREFIX
+        else:
+            continue
+        try:
+            data = base64.b64decode(line[len(prefix):])
+        except (binascii.Error, ValueError):
+            continue
+        if not data:
+            continue
+        if venue == "pump_fun":
+            event = _pump_event(mint, data)
+        else:
+            event = _ray_log(data, sides.get(mint, False))
+            if event and event[0] == CREATE:
+                sides[mint] = event[2]
+        if event:
+            found = (event[0], venue, event[1])
+    return found
+
+
+class ProgramLogFeed:
+    """
+    События создания пулов и добавления ликвидности по минтам через logsSubscribe (mentions) на websocket RPC.
+    Все подписки идут по одному соединению; при смене набора минтов досылаются только разница
+    (подписка/отписка), при обрыве — переподключение с экспоненциальной задержкой. handler вызывается прямо из цикла чтения,
+    без очереди: на пути от сообщения до решения о покупке нет переключений задач.
+    """
+
+    def __init__(self, handler: Callable[[LiquidityEvent], None], url: str = None, engine: AmmQuoteEngine = None):
+        self.handler = handler
+        self.engine = engine or amm_engine
+        self.url = url or settings.sniper.ws_url or \
+            f"{settings.rpc.helius_endpoint.replace('https://', 'wss://')}/?api-key={os.getenv('HELIUS_API_TOKEN', '').strip()}"
+        self.connected = False
+        self._mints: frozenset = frozenset()
+        self._mints_changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Состояние текущего соединения: запросы по id, подписки по минту и по номеру
+        self._request_id = 0
+        self._requests: dict[int, tuple[str, str]] = {}
+        self._subscribed: dict[str, Optional[int]] = {}
+        self._subscriptions: dict[int, str] = {}
+        # Сторона SOL в пуле Raydium по минту: из InitLog или из пула, известного AmmQuoteEngine
+        self._sol_is_coin: dict[str, bool] = {}
+        self._stats = {"notifications": 0, "events": 0, "errors": 0, "reconnects": 0}
+
+    def set_mints(self, mints: Iterable[str]) -> None:
+        mints = frozenset(mints)
+        if mints != self._mints:
+            self._mints = mints
+            self._sol_is_coin = {mint: side for mint, side in self._sol_is_coin.items() if mint in mints}
+            self._mints_changed.set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self) -> None:
+        delay = settings.sniper.reconnect_min_delay
+        while True:
+            if not self._mints:
+                self._mints_changed.clear()
+                await self._mints_changed.wait()
+                continue
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.connected:
+                    delay = settings.sniper.reconnect_min_delay
+                self._stats["reconnects"] += 1
+                logger.warning(f"Подписка на логи программ оборвалась: {e}, переподключение через {delay} с")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.sniper.reconnect_max_delay)
+            finally:
+                self.connected = False
+
+    async def _send(self, ws: aiohttp.ClientWebSocketResponse, method: str, params: list, mint: str) -> None:
+        self._request_id += 1
+        self._requests[self._request_id] = (method, mint)
+        await ws.send_str(json.dumps({"jsonrpc": "2.0", "id": self._request_id, "method": method, "params": params}))
+
+    async def _apply_mints(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        """
+        Досылает logsSubscribe для новых минтов и logsUnsubscribe для убранных, не трогая остальные подписки.
+        """
+        self._mints_changed.clear()
+        # Проверяем заново на каждом шаге: между await-ами разницу мог досылать и цикл чтения
+        for mint in list(self._mints - self._subscribed.keys()):
+            if mint in self._subscribed or mint not in self._mints:
+                continue
+            self._subscribed[mint] = None
+            await self._send(ws, "logsSubscribe",
+                             [{"mentions": [mint]}, {"commitment": settings.sniper.commitment}], mint)
+        for mint in list(self._subscribed.keys() - self._mints):
+            subscription = self._subscribed.get(mint)
+            # Ещё не подтверждённую подписку снимем, когда придёт её номер
+            if subscription is not None and mint not in self._mints:
+                del self._subscribed[mint]
+                self._subscriptions.pop(subscription, None)
+                await self._send(ws, "logsUnsubscribe", [subscription], mint)
+
+    async def _listen(self) -> None:
+        async with aiohttp.ClientSession() as http:
+            async with http.ws_connect(self.url, heartbeat=settings.sniper.ping_interval) as ws:
+                self._requests, self._subscribed, self._subscriptions = {}, {}, {}
+                self.connected = True
+                reader = asyncio.create_task(self._consume(ws))
+                try:
+                    while True:
+                        await self._apply_mints(ws)
+                        logger.info(f"Подписка на логи программ по {len(self._subscribed)} минтам")
+                        changed = asyncio.create_task(self._mints_changed.wait())
+                        done, _ = await asyncio.wait({reader, changed}, return_when=asyncio.FIRST_COMPLETED)
+                        changed.cancel()
+                        if reader in done:
+                            reader.result()
+                            raise ConnectionError("соединение закрыто сервером")
+                finally:
+                    reader.cancel()
+
+    async def _consume(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        async for message in ws:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                if message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    break
+                continue
+            event = self.handle(message.data)
+            if event is False:
+                await self._apply_mints(ws)
+
+    def _confirm(self, message: dict) -> bool:
+        """
+        Ответ на logsSubscribe/logsUnsubscribe. True — минт убрали, пока подписка подтверждалась, её надо снять.
+        """
+        method, mint = self._requests.pop(message["id"], (None, None))
+        if method != "logsSubscribe":
+            return False
+        if "result" not in message:
+            self._stats["errors"] += 1
+            self._subscribed.pop(mint, None)
+            logger.error(f"logsSubscribe для {mint} отклонён: {message.get('error')}")
+            return False
+        if mint not in self._subscribed:
+            return False
+        self._subscribed[mint] = message["result"]
+        self._subscriptions[message["result"]] = mint
+        return mint not in self._mints
+
+    def handle(self, raw: str) -> Optional[LiquidityEvent]:
+        """
+        Событие ликвидности, None или False, если надо досинхронизировать подписки.
+        """
+        received_at = time.perf_counter()
+        message = json.loads(raw)
+        if "id" in message:
+            return False if self._confirm(message) else None
+        params = message.get("params") or {}
+        mint = self._subscriptions.get(params.get("subscription"))
+        if message.get("method") != "logsNotification" or mint is None:
+            return None
+        self._stats["notifications"] += 1
+        result = params["result"]
+        value = result["value"]
+        if value.get("err"):
+            return None
+        if mint not in self._sol_is_coin:
+            side = self.engine.raydium_sol_is_coin(mint)
+            if side is not None:
+                self._sol_is_coin[mint] = side
+        parsed = parse_logs(mint, value.get("logs") or (), self._sol_is_coin)
+        if parsed is None:
+            return None
+        self._stats["events"] += 1
+        event = LiquidityEvent(mint, parsed[0], parsed[1], parsed[2], value.get("signature", ""),
+                               result.get("context", {}).get("slot"), received_at)
+        try:
+            self.handler(event)
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"Ошибка обработки события {event.kind} по {mint}: {e}")
+        return event
+
+    def stats(self) -> dict:
+        return {**self._stats, "connected": self.connected, "mints": len(self._mints),
+                "subscriptions": len(self._subscriptions)}
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from typing import Dict, NamedTuple, Optional, Protocol
+
+from solders.keypair import Keypair
+
+from api.priority_fee import PriorityFeeEstimator, priority_fee_estimator
+from api.transaction_sender import PendingTransaction
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+WSOL = "So11111111111111111111111111111111111111112"
+# Базовая комиссия за одну подпись
+BASE_FEE_LAMPORTS = 5000
+
+
+class VenueQuote(NamedTuple):
+    venue: str
+    input_mint: str
+    output_mint: str
+    in_amount: int
+    out_amount: int
+    platform_fee: int  # в единицах output_mint
+    accounts: list[str]  # пулы маршрута, по ним оценивается priority fee
+    quote: Dict  # ответ площадки, по нему и исполняется своп
+    network_fee: int = 0  # стоимость исполнения в единицах output_mint
+    latency_ms: float = 0.0
+
+    @property
+    def net_out_amount(self) -> int:
+        return self.out_amount - self.platform_fee - self.network_fee
+
+
+class Venue(Protocol):
+    async def venue_quote(self, input_mint: str, output_mint: str, amount: int, slippage_bps: int) -> VenueQuote: ...
+
+    async def execute_quote(self, keypair: Keypair, quote: VenueQuote) -> PendingTransaction: ...
+
+
+class NoQuoteError(Exception):
+    pass
+
+
+class QuoteRouter:
+    """
+    Лучшее исполнение по нескольким площадкам: котировки запрашиваются одновременно с жёстким дедлайном,
+    опоздавшие отбрасываются. Побеждает наибольший выход после комиссии площадки и стоимости
+    исполнения (базовая комиссия + priority fee на оценочный лимит CU площадки).
+    """
+
+    def __init__(self, venues: Dict[str, Venue], fee_estimator: PriorityFeeEstimator = None):
+        self.venues = venues
+        self.fee_estimator = fee_estimator or priority_fee_estimator
+        self._stats = {name: {"quotes": 0, "wins": 0, "late": 0, "errors": 0} for name in venues}
+
+    @property
+    def enabled(self) -> Dict[str, Venue]:
+        return {name: venue for name, venue in self.venues.items() if name in settings.quote_router.venues}
+
+    async def _network_fee(self, quote: VenueQuote) -> int:
+        units = settings.quote_router.compute_units.get(quote.venue, settings.compute_units.max_units)
+        priority_fee = await self.fee_estimator.estimate(quote.accounts)
+        lamports = BASE_FEE_LAMPORTS + priority_fee * units // 1_000_000
+        if quote.output_mint == WSOL:
+            return lamports
+        if quote.input_mint == WSOL and quote.in_amount:
+            # Переводим в токены по курсу самой котировки
+            return lamports * quote.out_amount // quote.in_amount
+        return 0
+
+    async def _timed_quote(self, name: str, venue: Venue, input_mint: str, output_mint: str, amount: int,
+                           slippage_bps: int) -> VenueQuote:
+        started = time.monotonic()
+        quote = await venue.venue_quote(input_mint, output_mint, amount, slippage_bps)
+        quote = quote._replace(network_fee=await self._network_fee(quote))
+        return quote._replace(latency_ms=(time.monotonic() - started) * 1000)
+
+    async def quotes(self, input_mint: str, output_mint: str, amount: int, slippage_bps: int,
+                     deadline_ms: Optional[float] = None) -> list[VenueQuote]:
+        """
+        Котировки всех включённых площадок, успевших до дедлайна, от лучшей к худшей.
+        """
+        deadline_ms = settings.quote_router.deadline_ms if deadline_ms is None else deadline_ms
+        tasks = {
+            asyncio.create_task(self._timed_quote(name, venue, input_mint, output_mint, amount, slippage_bps)): name
+            for name, venue in self.enabled.items()
+        }
+        if not tasks:
+            return []
+        done, late = await asyncio.wait(tasks, timeout=deadline_ms / 1000)
+        for task in late:
+            task.cancel()
+            self._stats[tasks[task]]["late"] += 1
+            logger.info(f"Котировка {tasks[task]} не успела за {deadline_ms} мс, отброшена")
+
+        quotes = []
+        for task in done:
+            name = tasks[task]
+            if task.exception():
+                self._stats[name]["errors"] += 1
+                logger.warning(f"Котировка {name} не получена: {task.exception()}")
+                continue
+            self._stats[name]["quotes"] += 1
+            quotes.append(task.result())
+        return sorted(quotes, key=lambda quote: quote.net_out_amount, reverse=True)
+
+    async def best_quote(self, input_mint: str, output_mint: str, amount: int, slippage_bps: int,
+                         deadline_ms: Optional[float] = None) -> VenueQuote:
+        quotes = await self.quotes(input_mint, output_mint, amount, slippage_bps, deadline_ms)
+        if not quotes:
+            raise NoQuoteError(f"Ни одна площадка не дала котировку {input_mint} -> {output_mint} на {amount}")
+        return quotes[0]
+
+    async def execute(self, keypair: Keypair, quote: VenueQuote) -> PendingTransaction:
+        return await self.venues[quote.venue].execute_quote(keypair, quote)
+
+    async def swap(self, keypair: Keypair, input_mint: str, output_mint: str, amount: int, slippage_bps: int,
+                   deadline_ms: Optional[float] = None) -> PendingTransaction:
+        """
+        Котирует на всех площадках и исполняет на лучшей. Если сборка или отправка на ней упала,
+        пробует следующую по выходу котировку.
+        """
+        quotes = await self.quotes(input_mint, output_mint, amount, slippage_bps, deadline_ms)
+        if not quotes:
+            raise NoQuoteError(f"Ни одна площадка не дала котировку {input_mint} -> {output_mint} на {amount}")
+        logger.info("Котировки: " + ", ".join(
+            f"{quote.venue}={quote.net_out_amount} ({quote.latency_ms:.0f} мс)" for quote in quotes))
+
+        error = None
+        for quote in quotes:
+            try:
+                pending = await self.execute(keypair, quote)
+            except Exception as e:
+                logger.warning(f"Своп через {quote.venue} не отправлен: {e}")
+                error = e
+                continue
+            self._stats[quote.venue]["wins"] += 1
+            return pending
+        raise error
+
+    def stats(self) -> dict:
+        return {name: dict(stats) for name, stats in self._stats.items()}
@@ -1,86 +1,128 @@
-from typing import  Dict
+from typing import Dict, Optional
 
-import requests
-
-from solana.rpc.async_api import AsyncClient
+import aiohttp
+import base64
 from solders.keypair import Keypair
+from solders.message import MessageV0
 from solders.pubkey import Pubkey
-
-from solders.solders import Transaction
-
-from solders.rpc.config import RpcSendTransactionConfig
-from solders.instruction import Instruction
+from solders.transaction import VersionedTransaction
+from spl.token.instructions import get_associated_token_address
 import logging
 import time
 
+from api.compute_budget import ComputeUnitEstimator, compute_unit_estimator
+from api.priority_fee import PriorityFeeEstimator, priority_fee_estimator
+from api.quote_router import WSOL, VenueQuote
+from api.swap_builder import BlockhashCache, blockhash_cache
+from api.transaction_sender import PendingTransaction, TransactionSender, transaction_sender
 
 logger = logging.getLogger(__name__)
 
 
-class RaydiumAPI:
-    def __init__(self, rpc_endpoint: str, raydium_api_endpoint: str = "https://api.raydium.io/v1"):
+def route_pools(quote: Dict) -> list[str]:
+    """
+    Пулы из routePlan ответа Raydium compute/swap-base-in.
+    """
+    return list(dict.fromkeys(step["poolId"] for step in quote["data"].get("routePlan", []) if step.get("poolId")))
+
 
-        self.solana_client = AsyncClient(rpc_endpoint)
+class RaydiumAPI:
+    """
+    Прямые свопы через Raydium Trade API: котировка compute/swap-base-in, транзакция transaction/swap-base-in.
+    Blockhash в готовой транзакции заменяется на закешированный, чтобы знать lastValidBlockHeight для отправки.
+    """
+
+    def __init__(self, sender: TransactionSender = None, fee_estimator: PriorityFeeEstimator = None,
+                 cu_estimator: ComputeUnitEstimator = None, blockhashes: BlockhashCache = None,
+                 raydium_api_endpoint: str = "https://transaction-v1.raydium.io"):
+        self.sender = sender or transaction_sender
+        self.fee_estimator = fee_estimator or priority_fee_estimator
+        self.cu_estimator = cu_estimator or compute_unit_estimator
+        self.blockhashes = blockhashes or blockhash_cache
         self.raydium_api_endpoint = raydium_api_endpoint
+        self._session: Optional[aiohttp.ClientSession] = None
 
-    async def get_swap_quote(self, input_mint: str, output_mint: str, amount: float, slippage_bps: int = 100) -> Dict:
+    def _http(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(headers={"Accept": "application/json"},
+                                                  timeout=aiohttp.ClientTimeout(total=5))
+        return self._session
 
-        url = f"{self.raydium_api_endpoint}/swap/quote"
-        payload = {
+    async def get_swap_quote(self, input_mint: str, output_mint: str, amount: int, slippage_bps: int = 100) -> Dict:
+        params = {
             "inputMint": input_mint,
             "outputMint": output_mint,
-            "amount": str(amount),  # Конвертируем в строку для точности
-            "slippageBps": slippage_bps
+            "amount": str(int(amount)),
+            "slippageBps": str(slippage_bps),
+            "txVersion": "V0",
         }
         try:
-            response = requests.post(url, json=payload, timeout=5)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
+            async with self._http().get(f"{self.raydium_api_endpoint}/compute/swap-base-in", params=params) as response:
+                response.raise_for_status()
+                quote = await response.json()
+        except aiohttp.ClientError as e:
             logger.error(f"Failed to get swap quote: {e}")
             raise
+        if not quote.get("success"):
+            raise ValueError(f"Raydium quote failed: {quote.get('msg')}")
+        return quote
 
-    async def execute_swap(self, keypair: Keypair, input_mint: str, output_mint: str, amount: float, action: str,
-                           slippage_bps: int = 100) -> str:
-
-        start_time = time.time()  # Измеряем время для оптимизации скорости
-
-        # Получаем котировку для свопа
+    async def venue_quote(self, input_mint: str, output_mint: str, amount: int, slippage_bps: int) -> VenueQuote:
         quote = await self.get_swap_quote(input_mint, output_mint, amount, slippage_bps)
-        if not quote or "transaction" not in quote:
-            raise ValueError("Failed to get swap quote from Raydium API")
-
-        # Извлекаем данные транзакции из ответа API
-        transaction_data = quote["transaction"]
-        transaction_buffer = bytes.fromhex(transaction_data["transaction"])  # Предполагаем, что данные в hex-формате
-
-        # Создаем инструкцию из данных Raydium
-        instruction = Instruction(
-            program_id=Pubkey.from_string(
-                transaction_data.get("programId", "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8")),
-            accounts=[Pubkey.from_string(acc["pubkey"]) for acc in transaction_data.get("accounts", [])],
-            data=transaction_buffer
-        )
-
-        # Получаем recent_blockhash с QuickNode
-        recent_blockhash = self.solana_client.get_latest_blockhash()
-
-        # Создаем и подписываем транзакцию
-        transaction = Transaction(recent_blockhash=recent_blockhash.value.blockhash)
-        transaction.add(instruction)
-        transaction.sign(keypair)
-
-        # Настраиваем конфигурацию отправки с приоритетом для повышения скорости
-        config = RpcSendTransactionConfig(
-            skip_preflight=True,
-            max_retries=3,
-            preflight_commitment="confirmed",
-            priority_fee=100000  # Пример приоритета, можно настроить динамически
-        )
-
-        # Отправляем транзакцию через QuickNode
-        tx_signature = self.solana_client.send_transaction(transaction, config=config)
+        data = quote["data"]
+        # Комиссия пулов (feeAmount в routePlan) уже вычтена из outputAmount, своей комиссии у Trade API нет
+        return VenueQuote("raydium", input_mint, output_mint, int(data["inputAmount"]), int(data["outputAmount"]),
+                          0, route_pools(quote), quote)
+
+    async def _build_swap_message(self, user_public_key: Pubkey, quote: Dict, priority_fee: int) -> MessageV0:
+        data = quote["data"]
+        swap_payload = {
+            "computeUnitPriceMicroLamports": str(priority_fee),
+            "swapResponse": quote,
+            "txVersion": "V0",
+            "wallet": str(user_public_key),
+            "wrapSol": data["inputMint"] == WSOL,
+            "unwrapSol": data["outputMint"] == WSOL,
+        }
+        # Для токенов (не SOL) Raydium нужен ассоциированный токен-аккаунт владельца
+        if data["inputMint"] != WSOL:
+            swap_payload["inputAccount"] = str(
+                get_associated_token_address(user_public_key, Pubkey.from_string(data["inputMint"])))
+        if data["outputMint"] != WSOL:
+            swap_payload["outputAccount"] = str(
+                get_associated_token_address(user_public_key, Pubkey.from_string(data["outputMint"])))
+
+        async with self._http().post(f"{self.raydium_api_endpoint}/transaction/swap-base-in",
+                                     json=swap_payload) as response:
+            response.raise_for_status()
+            response_data = await response.json()
+        transactions = response_data.get("data") or []
+        if not response_data.get("success") or not transactions:
+            raise ValueError(f"No transaction in Raydium response: {response_data.get('msg')}")
+        if len(transactions) > 1:
+            # Несколько транзакций означают отдельную подготовку аккаунтов — атомарно такой своп не отправить
+            raise ValueError(f"Raydium вернул {len(transactions)} транзакции, ожидалась одна")
+        return VersionedTransaction.from_bytes(base64.b64decode(transactions[0]["transaction"])).message
+
+    async def execute_quote(self, keypair: Keypair, quote: VenueQuote) -> PendingTransaction:
+        start_time = time.time()
+        priority_fee = await self.fee_estimator.estimate(quote.accounts)
+        message = await self._build_swap_message(keypair.pubkey(), quote.quote, priority_fee)
+        blockhash = await self.blockhashes.get()
+        message = MessageV0(message.header, message.account_keys, blockhash.blockhash, message.instructions,
+                            message.address_table_lookups)
+        message = await self.cu_estimator.apply(message, hops=len(quote.quote["data"].get("routePlan", [])))
+        transaction = VersionedTransaction(message, [keypair])
+        pending = await self.sender.send(transaction, blockhash.last_valid_block_height, priority_fee)
         end_time = time.time()
         logger.info(
-            f"Swap executed: {action} {output_mint} for {amount} tokens, signature: {tx_signature.value}, time: {end_time - start_time:.4f} seconds")
-        return str(tx_signature.value)
+            f"Swap sent via Raydium: {quote.in_amount} {quote.input_mint} -> {quote.out_amount} {quote.output_mint}, "
+            f"signature: {pending.signature}, priority fee: {priority_fee} micro-lamports/CU, "
+            f"time: {end_time - start_time:.4f} seconds")
+        return pending
+
+    async def execute_swap(self, keypair: Keypair, input_mint: str, output_mint: str, amount: int, action: str,
+                           slippage_bps: int = 100) -> PendingTransaction:
+        quote = await self.venue_quote(input_mint, output_mint, amount, slippage_bps)
+        logger.info(f"{action}: Raydium котировка {quote.out_amount} {output_mint}")
+        return await self.execute_quote(keypair, quote)
@@ -8,10 +8,14 @@ from fastapi.security import APIKeyHeader
 from pydantic import BaseModel, field_validator
 
 from api.api_init_helper import api_helper
+from api.decode_executor import decode_executor, loop_lag_monitor
 from api.routers.auth_utils import TokenUtils
 from core.db_helper import db_helper
 from core.models.user import User
 from core.service.copy_traiding_service import CopyTradingService
+from core.service.quote_prefetch_service import quote_cache
+from core.service.risk_monitor_service import risk_monitor_service
+from core.service.trade_feed_service import trade_feed_service
 
 router = APIRouter(prefix="/copy_trading", tags=["copy_trading"])
 
@@ -102,3 +106,43 @@ async def get_tracking_status(
     except Exception as e:
         logger.error(f"Ошибка при проверке статуса кошелька {wallet_address}: {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка при проверке статуса: {str(e)}")
+
+
+@router.get("/quote-cache/stats")
+async def get_quote_cache_stats(user: User = Depends(verify_token)):
+    """
+    Доля попаданий в кеш котировок продажи и возраст котировок в момент использования.
+    """
+    return quote_cache.stats()
+
+
+@router.get("/quote-router/stats")
+async def get_quote_router_stats(user: User = Depends(verify_token)):
+    """
+    По площадкам: полученные котировки, выигранные сделки, опоздавшие к дедлайну и ошибки.
+    """
+    return api_helper.quote_router.stats()
+
+
+@router.get("/trade-feed/stats")
+async def get_trade_feed_stats(user: User = Depends(verify_token)):
+    """
+    Состояние подписки Bitquery: подключение, полученные сделки, дубли, вытесненные из очереди.
+    """
+    return trade_feed_service.feed.stats()
+
+
+@router.get("/event-loop/stats")
+async def get_event_loop_stats(user: User = Depends(verify_token)):
+    """
+    Задержка event loop и сколько разбора ушло в пул процессов.
+    """
+    return {"loop_lag": loop_lag_monitor.stats(), "decode_executor": decode_executor.stats()}
+
+
+@router.get("/risk-monitor/stats")
+async def get_risk_monitor_stats(user: User = Depends(verify_token)):
+    """
+    Позиции под stop-loss/take-profit, сколько токенов удалось оценить, продажи и время тика.
+    """
+    return risk_monitor_service.stats()
@@ -0,0 +1,76 @@
+import logging
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.security import APIKeyHeader
+from pydantic import BaseModel
+
+from api.routers.auth_utils import TokenUtils
+from core.db_helper import db_helper
+from core.models.sniper_target import Status
+from core.models.user import User
+from core.service.sniper_service import sniper_service
+
+router = APIRouter(prefix="/sniper", tags=["sniper"])
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SniperTargetRequest(BaseModel):
+    token_address: str
+    liquidity_threshold: float  # SOL в пуле
+    max_buy_amount: float  # SOL на покупку
+
+
+class SniperTargetResponse(BaseModel):
+    id: int
+    token_address: str
+    name: str
+    symbol: str
+    liquidity_threshold: float
+    max_buy_amount: float
+    status: Status
+    created_at: datetime
+    last_checked_at: Optional[datetime] = None
+    buy_signature: Optional[str] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+async def get_token_utils():
+    return TokenUtils(db_helper.session_factory)
+
+
+async def verify_token(
+    access_token_code: str = Depends(APIKeyHeader(name="Authorization", auto_error=True)),
+    token_utils: TokenUtils = Depends(get_token_utils)
+):
+    return await token_utils.verify_token(access_token_code)
+
+
+@router.post("/targets", response_model=SniperTargetResponse)
+async def add_sniper_target(request: SniperTargetRequest, user: User = Depends(verify_token)):
+    if request.liquidity_threshold < 0 or request.max_buy_amount <= 0:
+        raise HTTPException(status_code=400, detail="Некорректный порог ликвидности или сумма покупки")
+    try:
+        return await sniper_service.add_target(user.id, request.token_address, request.liquidity_threshold,
+                                               request.max_buy_amount)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/targets", response_model=list[SniperTargetResponse])
+async def get_sniper_targets(user: User = Depends(verify_token)):
+    return await sniper_service.get_targets(user.id)
+
+
+@router.get("/stats")
+async def get_sniper_stats(user: User = Depends(verify_token)):
+    """
+    Заготовленные покупки, события подписки и задержка от сообщения до подписанной покупки.
+    """
+    return sniper_service.stats()
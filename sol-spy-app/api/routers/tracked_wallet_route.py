@@ -1,17 +1,25 @@
+import csv
+import io
+import json
 from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import AsyncIterator, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from fastapi.security import APIKeyHeader
 from pydantic import BaseModel
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 
 from api.routers.auth_utils import TokenUtils
 
 from core.db_helper import db_helper
 from core.models.user import User
 from core.models.wallet_transaction import TransactionAction, TransactionStatus
-from core.service.tracked_wallet_service import TrackedWalletService
+from core.service.tracked_wallet_service import TrackedWalletService, TRANSACTION_EXPORT_COLUMNS
 from core.models.tracked_wallet import FollowMode, CopyMode
+from core.models.wallet_backfill import BackfillStatus
+from core.service.wallet_backfill_service import wallet_backfill_service
 from api.api_init_helper import api_helper
 import logging
 
@@ -36,6 +44,21 @@ class ChangeTrackedWalletModeRequest(BaseModel):
         from_attributes = True
 
 
+class RiskLimitsRequest(BaseModel):
+    wallet_address: str
+    stop_loss_pct: float | None = None
+    take_profit_pct: float | None = None
+
+
+class CopySettingsRequest(BaseModel):
+    wallet_address: str
+    copy_mode: CopyMode | None = None
+    copy_multiplier: float | None = None
+    copy_fixed_amount: float | None = None
+    max_trade_sol: float | None = None
+    max_balance_pct: float | None = None
+
+
 class TrackedWalletResponse(BaseModel):
     id: int
     bot_wallet_id: int
@@ -46,6 +69,12 @@ class TrackedWalletResponse(BaseModel):
     created_at: datetime
     last_activity_at: datetime | None = None
     sol_balance: float | None = None
+    stop_loss_pct: float | None = None
+    take_profit_pct: float | None = None
+    copy_multiplier: float | None = None
+    copy_fixed_amount: float | None = None
+    max_trade_sol: float | None = None
+    max_balance_pct: float | None = None
 
     class Config:
         from_attributes = True
@@ -70,6 +99,22 @@ class TrackedWalletTransactionResponse(BaseModel):
         from_attributes = True
 
 
+class WalletBackfillResponse(BaseModel):
+    wallet_id: int
+    status: BackfillStatus
+    signatures_seen: int
+    transactions_stored: int
+    oldest_block_time: datetime | None = None
+    attempts: int
+    error: str | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+
 def get_tracked_wallet_service() -> TrackedWalletService:
     return TrackedWalletService(db_helper.session_factory, api_heler=api_helper)
 
@@ -141,6 +186,44 @@ async def update_wallet(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.put("/risk-limits")
+async def update_risk_limits(
+        request: RiskLimitsRequest,
+        tracked_wallet_service: TrackedWalletService = Depends(get_tracked_wallet_service),
+        user: User = Depends(verify_token),
+):
+    if request.stop_loss_pct is not None and not 0 < request.stop_loss_pct < 100:
+        raise HTTPException(status_code=400, detail="Stop-loss должен быть в диапазоне (0, 100)")
+    if request.take_profit_pct is not None and request.take_profit_pct <= 0:
+        raise HTTPException(status_code=400, detail="Take-profit должен быть больше 0")
+    try:
+        await tracked_wallet_service.update_risk_limits(request.wallet_address, user, request.stop_loss_pct,
+                                                        request.take_profit_pct)
+        return JSONResponse(status_code=201, content={"detail": "Пороги кошелька обновлены"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.put("/copy-settings")
+async def update_copy_settings(
+        request: CopySettingsRequest,
+        tracked_wallet_service: TrackedWalletService = Depends(get_tracked_wallet_service),
+        user: User = Depends(verify_token),
+):
+    positive = (request.copy_multiplier, request.copy_fixed_amount, request.max_trade_sol, request.max_balance_pct)
+    if any(value is not None and value <= 0 for value in positive) \
+            or (request.max_balance_pct is not None and request.max_balance_pct > 100):
+        raise HTTPException(status_code=400, detail="Множитель, суммы и лимиты должны быть больше 0, "
+                                                    "лимит баланса — не больше 100%")
+    try:
+        await tracked_wallet_service.update_copy_settings(
+            request.wallet_address, user, request.copy_mode, request.copy_multiplier, request.copy_fixed_amount,
+            request.max_trade_sol, request.max_balance_pct)
+        return JSONResponse(status_code=201, content={"detail": "Настройки копирования обновлены"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/{wallet_address}", response_model=TrackedWalletResponse)
 async def get_wallet_by_address(
         wallet_address: str,
@@ -157,6 +240,19 @@ async def get_wallet_by_address(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.get("/backfill/{wallet_address}", response_model=WalletBackfillResponse)
+async def get_wallet_backfill(
+        wallet_address: str,
+        user: User = Depends(verify_token),
+):
+    if not user:
+        raise HTTPException(status_code=401)
+    backfill = await wallet_backfill_service.get_progress(wallet_address)
+    if not backfill:
+        raise HTTPException(status_code=404, detail=f"Загрузка истории для {wallet_address} не найдена")
+    return backfill
+
+
 @router.put("/stop-tracking/{wallet_address}")
 async def stop_track_wallet(
         wallet_address: str,
@@ -208,14 +304,88 @@ async def delete_tracked_wallet(
 @router.get("/transaction/{wallet_address}", response_model=list[TrackedWalletTransactionResponse])
 async def get_wallet_transactions_by_address(
         wallet_address: str,
+        response: Response,
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: Optional[str] = None,
+        action: Optional[TransactionAction] = None,
+        token_address: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
         tracked_wallet_service: TrackedWalletService = Depends(get_tracked_wallet_service),
         user: User = Depends(verify_token),
 ):
     if not user:
         raise HTTPException(status_code=401)
     try:
-        wallet_transactions = await tracked_wallet_service.get_wallet_transactions(wallet_address)
+        wallet_transactions, next_cursor = await tracked_wallet_service.get_wallet_transactions(
+            wallet_address, limit=limit, cursor=cursor, action=action, token_address=token_address,
+            start=start, end=end
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return wallet_transactions
     except ValueError as e:
         logger.warning(f"Кошелёк {wallet_address} не найден: {e}")
         raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/transaction/{wallet_address}/export")
+async def export_wallet_transactions(
+        wallet_address: str,
+        format: Literal["ndjson", "csv"] = "ndjson",
+        action: Optional[TransactionAction] = None,
+        token_address: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        tracked_wallet_service: TrackedWalletService = Depends(get_tracked_wallet_service),
+        user: User = Depends(verify_token),
+):
+    if not user:
+        raise HTTPException(status_code=401)
+    try:
+        tracked_wallet = await tracked_wallet_service.get_wallet_by_address(wallet_address)
+    except ValueError as e:
+        logger.warning(f"Кошелёк {wallet_address} не найден: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rows = tracked_wallet_service.stream_wallet_transactions(
+        tracked_wallet.id, action=action, token_address=token_address, start=start, end=end
+    )
+    if format == "csv":
+        return StreamingResponse(
+            _csv_lines(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{wallet_address}.csv"'},
+        )
+    return StreamingResponse(_ndjson_lines(rows), media_type="application/x-ndjson")
+
+
+def _export_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+async def _ndjson_lines(rows: AsyncIterator[dict]) -> AsyncIterator[str]:
+    async for row in rows:
+        yield json.dumps({key: _export_value(value) for key, value in row.items()}) + "\n"
+
+
+async def _csv_lines(rows: AsyncIterator[dict], flush_every: int = 500) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(TRANSACTION_EXPORT_COLUMNS)
+    pending = 0
+    async for row in rows:
+        writer.writerow([_export_value(row[column]) for column in TRANSACTION_EXPORT_COLUMNS])
+        pending += 1
+        if pending >= flush_every:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    yield buffer.getvalue()
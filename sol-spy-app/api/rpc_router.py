@@ -0,0 +1,367 @@
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, List, Optional, TypeVar
+
+import aiohttp
+from decouple import config
+from solana.exceptions import SolanaRpcException
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.core import RPCException
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Коды JSON-RPC, при которых имеет смысл спросить другую ноду
+RETRYABLE_RPC_CODES = frozenset({-32005, -32004, -32014, -32016, 429})
+
+# Ответы длиннее этого в режиме raw не разбираются в event loop
+RAW_PARSE_LIMIT = 4096
+
+
+class RpcError(Exception):
+    pass
+
+
+class RpcResponseError(RpcError):
+    """
+    Нода ответила ошибкой JSON-RPC (неверные параметры, транзакция не найдена и т.п.).
+    """
+
+    def __init__(self, method: str, error: dict):
+        self.code = error.get("code")
+        self.error = error
+        super().__init__(f"{method}: {error}")
+
+
+class RateLimiter:
+    """
+    Token bucket: не больше rate запросов в секунду с запасом burst.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, background: bool = False) -> None:
+        """
+        background — фоновый запрос (например, бэкфилл истории): берёт токен, только если в корзине
+        остаётся запас для основного трафика, и ждёт вне блокировки, не задерживая его.
+        """
+        if background:
+            needed = 1 + min(self.capacity * settings.rpc.background_reserve, self.capacity - 1)
+            while True:
+                async with self._lock:
+                    self._refill()
+                    if self.tokens >= needed:
+                        self.tokens -= 1
+                        return
+                    delay = (needed - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _percentile(samples, q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RpcEndpoint:
+    def __init__(self, name: str, url: str, rate: float):
+        self.name = name
+        self.url = url
+        self.limiter = RateLimiter(rate)
+        self.latencies: dict[str, deque] = defaultdict(lambda: deque(maxlen=settings.rpc.stats_window))
+        self.outcomes: deque = deque(maxlen=settings.rpc.stats_window)
+        self.consecutive_errors = 0
+        self.down_until = 0.0
+        self.slot: Optional[int] = None
+        self.slot_lag = 0
+        self._client: Optional[AsyncClient] = None
+
+    @property
+    def client(self) -> AsyncClient:
+        if self._client is None:
+            self._client = AsyncClient(self.url, timeout=settings.rpc.request_timeout)
+        return self._client
+
+    def record_success(self, method: str, latency: float) -> None:
+        self.latencies[method].append(latency)
+        self.outcomes.append(True)
+        self.consecutive_errors = 0
+
+    def record_error(self) -> None:
+        self.outcomes.append(False)
+        self.consecutive_errors += 1
+        if self.consecutive_errors >= settings.rpc.max_consecutive_errors:
+            self.down_until = time.monotonic() + settings.rpc.cooldown_seconds
+            logger.warning(f"RPC {self.name}: {self.consecutive_errors} ошибок подряд, "
+                           f"отключён на {settings.rpc.cooldown_seconds} с")
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def latency(self, method: str, q: float) -> Optional[float]:
+        samples = self.latencies.get(method)
+        if not samples or len(samples) < 5:
+            samples = [latency for values in self.latencies.values() for latency in values]
+        return _percentile(samples, q)
+
+    def score(self, method: str) -> float:
+        """
+        Чем меньше, тем лучше: медианная задержка, штраф за ошибки и отставание по слоту.
+        """
+        p50 = self.latency(method, 0.5)
+        score = p50 if p50 is not None else settings.rpc.default_latency
+        score *= 1 + 10 * self.error_rate
+        score += self.slot_lag * settings.rpc.slot_lag_penalty
+        return score
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until and self.slot_lag <= settings.rpc.max_slot_lag
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "available": self.available,
+            "error_rate": round(self.error_rate, 4),
+            "slot": self.slot,
+            "slot_lag": self.slot_lag,
+            "methods": {
+                method: {
+                    "count": len(samples),
+                    "p50_ms": round(_percentile(samples, 0.5) * 1000, 1),
+                    "p95_ms": round(_percentile(samples, 0.95) * 1000, 1),
+                    "p99_ms": round(_percentile(samples, 0.99) * 1000, 1),
+                }
+                for method, samples in self.latencies.items() if samples
+            },
+        }
+
+
+class RpcRouter:
+    """
+    Общая точка входа во все Solana RPC ноды: выбирает самую здоровую ноду под метод,
+    переключается на следующую при ошибке и дублирует медленные чтения (hedged reads).
+    """
+
+    def __init__(self, endpoints: List[RpcEndpoint]):
+        if not endpoints:
+            raise ValueError("Не задано ни одного RPC эндпоинта")
+        self.endpoints = endpoints
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._request_id = 0
+
+    @classmethod
+    def from_env(cls) -> "RpcRouter":
+        endpoints = []
+        helius_token = config("HELIUS_API_TOKEN", default="").strip()
+        if helius_token:
+            endpoints.append(RpcEndpoint("helius", f"{settings.rpc.helius_endpoint}?api-key={helius_token}",
+                                         settings.rpc.helius_rps))
+        quicknode_endpoint = config("QUICKNODE_ENDPOINT", default="").strip()
+        if quicknode_endpoint:
+            endpoints.append(RpcEndpoint("quicknode", quicknode_endpoint, settings.rpc.quicknode_rps))
+        endpoints.append(RpcEndpoint("public", settings.rpc.public_endpoint, settings.rpc.public_rps))
+        return cls(endpoints)
+
+    def ranked(self, method: str) -> List[RpcEndpoint]:
+        ranked = sorted(self.endpoints, key=lambda endpoint: endpoint.score(method))
+        # Недоступные ноды не выкидываем совсем, а ставим в конец: лучше медленный ответ, чем никакого
+        return [endpoint for endpoint in ranked if endpoint.available] + \
+            [endpoint for endpoint in ranked if not endpoint.available]
+
+    @staticmethod
+    def is_read(method: str) -> bool:
+        return method.startswith("get") or method == "simulateTransaction"
+
+    def _hedge_delay(self, endpoint: RpcEndpoint, method: str) -> float:
+        p95 = endpoint.latency(method, 0.95)
+        return max(settings.rpc.hedge_min_delay, p95 if p95 is not None else settings.rpc.request_timeout / 2)
+
+    async def _attempt(self, endpoint: RpcEndpoint, method: str, attempt: Callable[[RpcEndpoint], Awaitable[T]],
+                       background: bool = False) -> T:
+        await endpoint.limiter.acquire(background)
+        started_at = time.monotonic()
+        try:
+            result = await asyncio.wait_for(attempt(endpoint), settings.rpc.request_timeout)
+        except asyncio.CancelledError:
+            # Проигравший hedged-запрос — не ошибка ноды
+            raise
+        except (RpcResponseError, RPCException) as e:
+            if getattr(e, "code", None) in RETRYABLE_RPC_CODES:
+                endpoint.record_error()
+            else:
+                endpoint.record_success(method, time.monotonic() - started_at)
+            raise
+        except Exception:
+            endpoint.record_error()
+            raise
+        endpoint.record_success(method, time.monotonic() - started_at)
+        return result
+
+    async def _dispatch(self, method: str, attempt: Callable[[RpcEndpoint], Awaitable[T]],
+                        hedge: Optional[bool] = None, background: bool = False) -> T:
+        if hedge is None:
+            # Фоновые запросы не дублируем: лишний токен лимита нужнее основному трафику
+            hedge = settings.rpc.hedge_reads and self.is_read(method) and not background
+        candidates = self.ranked(method)
+        tasks: dict[asyncio.Task, RpcEndpoint] = {}
+        last_error: Optional[BaseException] = None
+        launch = True
+        try:
+            while candidates or tasks:
+                if launch and candidates:
+                    endpoint = candidates.pop(0)
+                    tasks[asyncio.create_task(self._attempt(endpoint, method, attempt, background))] = endpoint
+                launch = False
+
+                timeout = None
+                if hedge and candidates and len(tasks) <= settings.rpc.max_hedges:
+                    timeout = self._hedge_delay(next(iter(tasks.values())), method)
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.debug(f"RPC {method}: нет ответа за {timeout:.3f} с, дублируем запрос")
+                    launch = True
+                    continue
+
+                for task in done:
+                    endpoint = tasks.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    last_error = error
+                    if isinstance(error, (RpcResponseError, RPCException)) and \
+                            getattr(error, "code", None) not in RETRYABLE_RPC_CODES:
+                        raise error
+                    logger.warning(f"RPC {endpoint.name} ошибка в {method}: {error!r}")
+                launch = True
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise RpcError(f"{method}: все RPC ноды недоступны ({last_error!r})") from last_error
+
+    async def _post(self, endpoint: RpcEndpoint, method: str, params: List[Any], raw: bool = False) -> Any:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={"accept": "application/json", "Content-Type": "application/json"},
+            )
+        self._request_id += 1
+        payload = {"jsonrpc": "2.0", "id": self._request_id, "method": method, "params": params}
+        async with self._session.post(endpoint.url, json=payload) as response:
+            if response.status != 200:
+                raise RpcError(f"{endpoint.name}: HTTP {response.status} - {await response.text()}")
+            body = await response.read()
+        # Ответ с ошибкой короткий; большой ответ в режиме raw отдаём байтами, не разбирая в event loop
+        if raw and len(body) > RAW_PARSE_LIMIT:
+            return body
+        data = json.loads(body)
+        if "error" in data:
+            raise RpcResponseError(method, data["error"])
+        return body if raw else data.get("result")
+
+    async def request(self, method: str, params: Optional[List[Any]] = None, hedge: Optional[bool] = None,
+                      background: bool = False) -> Any:
+        """
+        Сырой JSON-RPC запрос, возвращает поле result.
+        """
+        return await self._dispatch(method, lambda endpoint: self._post(endpoint, method, params or []), hedge,
+                                    background)
+
+    async def request_raw(self, method: str, params: Optional[List[Any]] = None, hedge: Optional[bool] = None,
+                          background: bool = False) -> bytes:
+        """
+        Тело ответа JSON-RPC байтами: разбор большого ответа (jsonParsed-транзакции) остаётся вызывающему,
+        например процессам DecodeExecutor.
+        """
+        return await self._dispatch(method, lambda endpoint: self._post(endpoint, method, params or [], raw=True),
+                                    hedge, background)
+
+    async def call(self, method: str, fn: Callable[[AsyncClient], Awaitable[T]], hedge: Optional[bool] = None,
+                   background: bool = False) -> T:
+        """
+        Запрос через solana-py клиент выбранной ноды: fn получает AsyncClient.
+        method — имя JSON-RPC метода, по нему ведётся статистика и выбор ноды.
+        """
+        return await self._dispatch(method, lambda endpoint: fn(endpoint.client), hedge, background)
+
+    async def broadcast(self, method: str, params: Optional[List[Any]] = None) -> dict[str, Any]:
+        """
+        Отправляет один и тот же запрос на все доступные ноды параллельно (для sendTransaction).
+        Возвращает ответы по именам нод, RpcError — если не ответила ни одна.
+        """
+        endpoints = [endpoint for endpoint in self.endpoints if endpoint.available] or self.endpoints
+        results = await asyncio.gather(*[
+            self._attempt(endpoint, method, lambda e: self._post(e, method, params or []))
+            for endpoint in endpoints
+        ], return_exceptions=True)
+
+        responses = {}
+        errors = []
+        for endpoint, result in zip(endpoints, results):
+            if isinstance(result, BaseException):
+                errors.append(f"{endpoint.name}: {result!r}")
+            else:
+                responses[endpoint.name] = result
+        if not responses:
+            raise RpcError(f"{method}: ни одна нода не приняла запрос ({'; '.join(errors)})")
+        return responses
+
+    async def refresh_slots(self) -> None:
+        """
+        Опрашивает getSlot на всех нодах и пересчитывает отставание от самой свежей.
+        """
+        async def fetch(endpoint: RpcEndpoint) -> None:
+            try:
+                endpoint.slot = await self._attempt(
+                    endpoint, "getSlot", lambda e: self._post(e, "getSlot", [{"commitment": "processed"}])
+                )
+            except (RpcError, SolanaRpcException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"RPC {endpoint.name}: не удалось получить слот: {e!r}")
+
+        await asyncio.gather(*[fetch(endpoint) for endpoint in self.endpoints])
+        slots = [endpoint.slot for endpoint in self.endpoints if endpoint.slot is not None]
+        if not slots:
+            return
+        head = max(slots)
+        for endpoint in self.endpoints:
+            endpoint.slot_lag = head - endpoint.slot if endpoint.slot is not None else 0
+
+    def stats(self) -> List[dict]:
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+        for endpoint in self.endpoints:
+            if endpoint._client is not None:
+                await endpoint._client.close()
+
+
+rpc_router = RpcRouter.from_env()
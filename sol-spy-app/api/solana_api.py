@@ -1,34 +1,81 @@
 
-from typing import  Dict
+import asyncio
+from typing import  Dict, Optional
 
 from solders.pubkey import Pubkey
-from solana.rpc.async_api import AsyncClient
 from solders.signature import Signature
+
+from api.rpc_router import RpcRouter, rpc_router
 from core.models.wallet_transaction import TransactionAction
 
 
 class SolanaAPI:
-    def __init__(self, endpoint: str = "https://api.mainnet-beta.solana.com"):
-        self.client = AsyncClient(endpoint)
+    def __init__(self, router: RpcRouter = None):
+        self.router = router or rpc_router
 
 
     async def get_balance(self, wallet_address: str) -> float:
         try:
             public_key = Pubkey.from_string(wallet_address)
-            response = await self.client.get_balance(public_key)
+            response = await self.router.call("getBalance", lambda client: client.get_balance(public_key))
             lamports = response.value
             return lamports / 1_000_000_000
         except Exception as e:
             raise ValueError(f"Failed to get balance for {wallet_address}: {e}")
 
+    async def get_balances(self, wallet_addresses: list[str], chunk_size: int = 100) -> Dict[str, float]:
+        """
+        Балансы SOL для многих адресов через getMultipleAccounts, по chunk_size адресов за запрос.
+        Несуществующий аккаунт считается нулевым балансом.
+        """
+        addresses = list(dict.fromkeys(wallet_addresses))
+        chunks = [addresses[i:i + chunk_size] for i in range(0, len(addresses), chunk_size)]
+        try:
+            responses = await asyncio.gather(*[
+                self.router.call(
+                    "getMultipleAccounts",
+                    lambda client, chunk=chunk: client.get_multiple_accounts(
+                        [Pubkey.from_string(address) for address in chunk])
+                )
+                for chunk in chunks
+            ])
+        except Exception as e:
+            raise ValueError(f"Failed to get balances for {len(addresses)} wallets: {e}")
+
+        balances = {}
+        for chunk, response in zip(chunks, responses):
+            for address, account in zip(chunk, response.value):
+                balances[address] = (account.lamports if account else 0) / 1_000_000_000
+        return balances
+
     async def get_wallet_transactions(self, wallet_address: str, limit: int = 5):
         try:
             public_key = Pubkey.from_string(wallet_address)
-            response = await self.client.get_signatures_for_address(public_key, limit=limit)
+            response = await self.router.call(
+                "getSignaturesForAddress",
+                lambda client: client.get_signatures_for_address(public_key, limit=limit)
+            )
             return response.value
         except Exception as e:
             raise ValueError(f"Failed to fetch transactions for {wallet_address}: {e}")
 
+    async def get_signatures_page(self, wallet_address: str, before: Optional[str] = None, limit: int = 1000,
+                                  background: bool = False):
+        """
+        Страница подписей кошелька от новых к старым, начиная после подписи before.
+        """
+        try:
+            public_key = Pubkey.from_string(wallet_address)
+            before_signature = Signature.from_string(before) if before else None
+            response = await self.router.call(
+                "getSignaturesForAddress",
+                lambda client: client.get_signatures_for_address(public_key, before=before_signature, limit=limit),
+                background=background,
+            )
+            return response.value
+        except Exception as e:
+            raise ValueError(f"Failed to fetch signatures for {wallet_address}: {e}")
+
     async def get_transaction_details(self, signature: Signature) -> Dict :
 
         """
@@ -83,7 +130,6 @@ class SolanaAPI:
 
     async def close(self):
         """
-        Закрывает соединение с клиентом Solana и Bitquery.
+        Закрывает соединения с RPC нодами.
         """
-        await self.client.close()
-        await self.bitquery.close()
+        await self.router.close()
@@ -0,0 +1,153 @@
+import base64
+import hashlib
+import logging
+import time
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from solders.address_lookup_table_account import AddressLookupTable, AddressLookupTableAccount
+from solders.compute_budget import set_compute_unit_limit, set_compute_unit_price
+from solders.hash import Hash
+from solders.instruction import AccountMeta, Instruction
+from solders.message import MessageV0
+from solders.pubkey import Pubkey
+
+from api.rpc_router import RpcRouter, rpc_router
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# getMultipleAccounts принимает до 100 адресов
+MAX_ACCOUNTS_PER_REQUEST = 100
+
+
+class Blockhash(NamedTuple):
+    blockhash: Hash
+    last_valid_block_height: int
+    fetched_at: float
+
+
+class BlockhashCache:
+    """
+    Последний blockhash, чтобы сборка транзакции не ждала RPC. Обновляется фоновой задачей,
+    get() сам обновит его, если значение старше max_age.
+    """
+
+    def __init__(self, router: RpcRouter = None):
+        self.router = router or rpc_router
+        self._latest: Optional[Blockhash] = None
+
+    async def refresh(self) -> Blockhash:
+        result = await self.router.request("getLatestBlockhash", [{"commitment": "confirmed"}])
+        value = result["value"]
+        self._latest = Blockhash(Hash.from_string(value["blockhash"]), value["lastValidBlockHeight"], time.monotonic())
+        return self._latest
+
+    def peek(self, max_age: Optional[float] = None) -> Optional[Blockhash]:
+        """
+        Закешированный blockhash без обращения к RPC или None, если он старше max_age.
+        """
+        max_age = settings.swap_builder.blockhash_max_age if max_age is None else max_age
+        if self._latest is None or time.monotonic() - self._latest.fetched_at > max_age:
+            return None
+        return self._latest
+
+    async def get(self, max_age: Optional[float] = None) -> Blockhash:
+        max_age = settings.swap_builder.blockhash_max_age if max_age is None else max_age
+        if self._latest is None or time.monotonic() - self._latest.fetched_at > max_age:
+            return await self.refresh()
+        return self._latest
+
+
+class LookupTableCache:
+    """
+    Address lookup tables по адресу. Таблицы почти не меняются, поэтому держим их долго
+    и периодически сверяем содержимое пачками getMultipleAccounts.
+    """
+
+    def __init__(self, router: RpcRouter = None):
+        self.router = router or rpc_router
+        self._tables: dict[str, tuple[AddressLookupTableAccount, bytes]] = {}
+
+    async def _fetch(self, addresses: list[str]) -> dict[str, Optional[bytes]]:
+        accounts = {}
+        for i in range(0, len(addresses), MAX_ACCOUNTS_PER_REQUEST):
+            chunk = addresses[i:i + MAX_ACCOUNTS_PER_REQUEST]
+            result = await self.router.request("getMultipleAccounts", [chunk, {"encoding": "base64"}])
+            for address, account in zip(chunk, result["value"]):
+                accounts[address] = base64.b64decode(account["data"][0]) if account else None
+        return accounts
+
+    def _store(self, address: str, data: bytes) -> bool:
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        cached = self._tables.get(address)
+        if cached and cached[1] == digest:
+            return False
+        table = AddressLookupTable.deserialize(data)
+        self._tables[address] = (AddressLookupTableAccount(Pubkey.from_string(address), list(table.addresses)), digest)
+        return True
+
+    async def get_many(self, addresses: Iterable[str]) -> list[AddressLookupTableAccount]:
+        addresses = list(dict.fromkeys(addresses))
+        missing = [address for address in addresses if address not in self._tables]
+        if missing:
+            for address, data in (await self._fetch(missing)).items():
+                if data is None:
+                    logger.warning(f"Lookup table {address} не найдена")
+                    continue
+                self._store(address, data)
+        return [self._tables[address][0] for address in addresses if address in self._tables]
+
+    async def refresh(self) -> int:
+        """
+        Перечитывает все закешированные таблицы, обновляет изменившиеся и удаляет закрытые.
+        """
+        if not self._tables:
+            return 0
+        changed = 0
+        for address, data in (await self._fetch(list(self._tables))).items():
+            if data is None:
+                self._tables.pop(address, None)
+                changed += 1
+            elif self._store(address, data):
+                changed += 1
+        if changed:
+            logger.info(f"Обновлено lookup tables: {changed} из {len(self._tables)}")
+        return changed
+
+
+def parse_instruction(instruction: Dict) -> Instruction:
+    return Instruction(
+        Pubkey.from_string(instruction["programId"]),
+        base64.b64decode(instruction["data"]),
+        [
+            AccountMeta(Pubkey.from_string(account["pubkey"]), account["isSigner"], account["isWritable"])
+            for account in instruction["accounts"]
+        ],
+    )
+
+
+def swap_instructions(response: Dict) -> list[Instruction]:
+    """
+    Инструкции из ответа Jupiter /swap-instructions в порядке исполнения, без compute budget —
+    его мы ставим сами.
+    """
+    instructions = [parse_instruction(ix) for ix in response.get("otherInstructions") or []]
+    instructions += [parse_instruction(ix) for ix in response.get("setupInstructions") or []]
+    if response.get("tokenLedgerInstruction"):
+        instructions.append(parse_instruction(response["tokenLedgerInstruction"]))
+    instructions.append(parse_instruction(response["swapInstruction"]))
+    if response.get("cleanupInstruction"):
+        instructions.append(parse_instruction(response["cleanupInstruction"]))
+    return instructions
+
+
+def assemble_message(payer: Pubkey, instructions: list[Instruction], blockhash: Hash,
+                     lookup_tables: list[AddressLookupTableAccount], compute_unit_price: int,
+                     compute_unit_limit: Optional[int] = None) -> MessageV0:
+    budget = [set_compute_unit_limit(compute_unit_limit or settings.compute_units.max_units),
+              set_compute_unit_price(compute_unit_price)]
+    return MessageV0.try_compile(payer, budget + instructions, lookup_tables, blockhash)
+
+
+blockhash_cache = BlockhashCache()
+lookup_table_cache = LookupTableCache()
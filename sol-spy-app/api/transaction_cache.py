@@ -0,0 +1,154 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import zlib
+from typing import Dict, Iterable, Optional
+
+import aiosqlite
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EVICT_BATCH = 500
+
+
+def encode_payload(result: Dict, level: int = None) -> bytes:
+    level = settings.transaction_cache.compress_level if level is None else level
+    return zlib.compress(json.dumps(result, separators=(",", ":")).encode(), level)
+
+
+def decode_payload(payload: bytes) -> Dict:
+    return json.loads(zlib.decompress(payload))
+
+
+class TransactionCache:
+    """
+    Локальный кэш ответов getTransaction с commitment finalized: такие транзакции неизменны,
+    поэтому повторный разбор истории не должен тратить кредиты RPC. Ключ — подпись,
+    значение — сжатый zlib JSON ответа в SQLite. При превышении max_bytes вытесняются
+    давно не читанные записи, пока размер не опустится до low_watermark.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None, compress_level: int = None):
+        self.path = path or settings.transaction_cache.path
+        self.max_bytes = max_bytes or settings.transaction_cache.max_bytes
+        self.low_watermark = int(self.max_bytes * settings.transaction_cache.low_watermark)
+        self.compress_level = compress_level if compress_level is not None else settings.transaction_cache.compress_level
+        self._db: Optional[aiosqlite.Connection] = None
+        self._connect_lock = asyncio.Lock()
+        self._size = 0
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0, "errors": 0}
+
+    async def _connection(self) -> aiosqlite.Connection:
+        if self._db is None:
+            async with self._connect_lock:
+                if self._db is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    db = await aiosqlite.connect(self.path)
+                    await db.execute("PRAGMA journal_mode=WAL")
+                    await db.execute("PRAGMA synchronous=NORMAL")
+                    await db.execute(
+                        "CREATE TABLE IF NOT EXISTS transactions ("
+                        "signature TEXT PRIMARY KEY, payload BLOB NOT NULL, "
+                        "size INTEGER NOT NULL, accessed_at REAL NOT NULL) WITHOUT ROWID"
+                    )
+                    await db.execute("CREATE INDEX IF NOT EXISTS ix_transactions_accessed_at ON transactions (accessed_at)")
+                    await db.commit()
+                    async with db.execute("SELECT COALESCE(SUM(size), 0) FROM transactions") as cursor:
+                        self._size = (await cursor.fetchone())[0]
+                    self._db = db
+        return self._db
+
+    async def get(self, signature: str) -> Optional[Dict]:
+        return (await self.get_many([signature])).get(signature)
+
+    async def get_many(self, signatures: Iterable[str]) -> Dict[str, Dict]:
+        payloads = await self.get_many_raw(signatures)
+        return {signature: decode_payload(payload) for signature, payload in payloads.items()}
+
+    async def get_many_raw(self, signatures: Iterable[str]) -> Dict[str, bytes]:
+        """
+        Сжатые ответы без распаковки: большие пачки распаковывает DecodeExecutor вне event loop.
+        """
+        signatures = list(dict.fromkeys(signatures))
+        if not signatures:
+            return {}
+        try:
+            db = await self._connection()
+            placeholders = ",".join("?" * len(signatures))
+            async with db.execute(
+                    f"SELECT signature, payload FROM transactions WHERE signature IN ({placeholders})",
+                    signatures) as cursor:
+                found = dict(await cursor.fetchall())
+            if found:
+                await db.execute(
+                    f"UPDATE transactions SET accessed_at = ? WHERE signature IN ({','.join('?' * len(found))})",
+                    [time.time(), *found])
+                await db.commit()
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.warning(f"Кэш транзакций недоступен: {e}")
+            return {}
+        self._stats["hits"] += len(found)
+        self._stats["misses"] += len(signatures) - len(found)
+        return found
+
+    async def put(self, signature: str, result: Dict) -> None:
+        await self.put_raw(signature, encode_payload(result, self.compress_level))
+
+    async def put_raw(self, signature: str, payload: bytes) -> None:
+        await self.put_many_raw({signature: payload})
+
+    async def put_many_raw(self, payloads: Dict[str, bytes]) -> None:
+        if not payloads:
+            return
+        try:
+            db = await self._connection()
+            for signature, payload in payloads.items():
+                cursor = await db.execute(
+                    "INSERT OR IGNORE INTO transactions (signature, payload, size, accessed_at) VALUES (?, ?, ?, ?)",
+                    (signature, payload, len(payload), time.time()))
+                if cursor.rowcount:
+                    self._size += len(payload)
+                    self._stats["stored"] += 1
+            await db.commit()
+            if self._size > self.max_bytes:
+                await self._evict(db)
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.warning(f"Не удалось сохранить {len(payloads)} транзакций в кэш: {e}")
+
+    async def _evict(self, db: aiosqlite.Connection) -> None:
+        evicted = 0
+        while self._size > self.low_watermark:
+            async with db.execute(
+                    "SELECT signature, size FROM transactions ORDER BY accessed_at LIMIT ?", (EVICT_BATCH,)) as cursor:
+                rows = await cursor.fetchall()
+            if not rows:
+                self._size = 0
+                break
+            victims = []
+            for signature, size in rows:
+                victims.append((signature,))
+                self._size -= size
+                if self._size <= self.low_watermark:
+                    break
+            await db.executemany("DELETE FROM transactions WHERE signature = ?", victims)
+            await db.commit()
+            evicted += len(victims)
+        self._stats["evicted"] += evicted
+        logger.info(f"Кэш транзакций: вытеснено {evicted} записей, размер {self._size} байт")
+
+    def stats(self) -> dict:
+        return {**self._stats, "size_bytes": self._size, "max_bytes": self.max_bytes}
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+transaction_cache = TransactionCache()
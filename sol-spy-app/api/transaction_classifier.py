@@ -0,0 +1,181 @@
+import json
+import logging
+from itertools import chain
+from types import MappingProxyType
+from typing import Dict, Optional, Tuple
+
+from api.pool_layouts import PUMP_FUN_PROGRAM_ID, RAYDIUM_AMM_V4_PROGRAM_ID, WSOL
+from api.price_oracle import PriceOracle, price_oracle
+from api.transaction_cache import decode_payload, encode_payload
+from core.dtomodels.parsed_transaction import ParsedTransaction
+from core.models.wallet_transaction import TransactionAction
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PROGRAM_ID = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+TOKEN_TRANSFER_TYPES = frozenset(("transfer", "transferChecked"))
+
+# Программа → DEX; таблица строится один раз при импорте и не меняется
+DEX_PROGRAMS = MappingProxyType({
+    RAYDIUM_AMM_V4_PROGRAM_ID: "Raydium",
+    "675kPX9MHTjS2zt1DYMimMnD2Dqi37ZnmcYrwjG3s2W": "Raydium",
+    "CAMMCzo5YL8w4VFF8KVHrK22GGUsp5VTaW7grrKgrWqK": "Raydium",
+    "CPMMoo8L3F4NbTegBCKVNunggL7H1ZpdTHKxQB5qKP1C": "Raydium",
+    "JUP6LkbZbjS1jKKwapdHNy74zcZ3tLUZoi5QNyVTaV4": "Jupiter",
+    PUMP_FUN_PROGRAM_ID: "Pump.fun AMM",
+    "6EF8rrecthR5DkcocFusWxYxuUULjohJoXcBrL1t9tA": "Pump.fun AMM",
+    "pAMMBay6oceH9fJKBRHGP5D4bD4sWpmSwMn52FMfXEA": "Pump.fun AMM",
+    "LBUZKhRxPF3XUpBCjp4YzTKgLccjZhTSDM9YuVaPwxo": "Meteora DLMM",
+    "J9G2mzdy3vrgY25GQA1pbysvNNtbnM4mQB2jH4tWT3Mx": "Meteora DLMM",
+})
+
+
+def _account_key(key) -> str:
+    return key["pubkey"] if isinstance(key, dict) else key
+
+
+def _swap_price(oracle: Optional[PriceOracle], mint: str, token_amount: float, sol_amount: float,
+                block_time: Optional[float]) -> Optional[float]:
+    if oracle is not None:
+        return oracle.record_swap(mint, token_amount, sol_amount, block_time)
+    return sol_amount / token_amount if token_amount > 0 and sol_amount > 0 else None
+
+
+def _owner_token_balance(balances, owner: str, mint: str) -> float:
+    return sum(float(balance.get("uiTokenAmount", {}).get("uiAmount") or 0) for balance in balances or ()
+               if balance.get("owner") == owner and balance.get("mint") == mint)
+
+
+def classify_transaction(transaction_hash: str, result: Optional[Dict],
+                         oracle: Optional[PriceOracle] = price_oracle) -> ParsedTransaction:
+    """
+    Разбор ответа getTransaction (jsonParsed) в ParsedTransaction за один проход по внешним и внутренним
+    инструкциям. BUY — потратил SOL и получил токен, SELL — отдал токен и получил SOL,
+    обмен токена на токен и всё без DEX — TRANSFER. С oracle=None оракул цен не читается и не пополняется
+    (разбор в процессе DecodeExecutor, цены записывает вызывающий).
+    """
+    if not result or "meta" not in result or "transaction" not in result:
+        logger.info(f"Transaction {transaction_hash} not found or invalid")
+        return ParsedTransaction(transaction_hash, TransactionAction.TRANSFER,
+                                 timestamp=ParsedTransaction.block_timestamp(None))
+
+    meta = result["meta"]
+    block_time = result.get("blockTime")
+    timestamp = ParsedTransaction.block_timestamp(block_time)
+    message = result["transaction"]["message"]
+    account_keys = message.get("accountKeys", [])
+    signer = _account_key(account_keys[0]) if account_keys else None
+    if not signer:
+        logger.info(f"Transaction {transaction_hash} has no valid signer")
+        return ParsedTransaction(transaction_hash, TransactionAction.TRANSFER, timestamp=timestamp)
+
+    # Токен-аккаунты подписанта и минты всех токен-аккаунтов: pre- и post-балансы читаются по одному разу.
+    # В обычном transfer (Raydium AMM v4, Pump.fun) минта и decimals нет, их берём отсюда
+    signer_accounts = {signer}
+    account_mints: Dict[str, Tuple[str, int]] = {}
+    for balances in (meta.get("preTokenBalances") or (), meta.get("postTokenBalances") or ()):
+        for balance in balances:
+            account = _account_key(account_keys[balance["accountIndex"]])
+            account_mints[account] = (balance.get("mint", ""), balance.get("uiTokenAmount", {}).get("decimals", 0))
+            if balance.get("owner") == signer:
+                signer_accounts.add(account)
+
+    dex_name = ""
+    tokens_sent: Dict[str, float] = {}
+    tokens_received: Dict[str, float] = {}
+    outer = ((False, instruction) for instruction in message.get("instructions", ()))
+    inner = ((True, instruction) for group in meta.get("innerInstructions") or ()
+             for instruction in group.get("instructions", ()))
+    for is_inner, instruction in chain(outer, inner):
+        program_id = instruction.get("programId", "")
+        if not dex_name:
+            dex_name = DEX_PROGRAMS.get(program_id, "")
+        # Потоки токенов считаем только по внутренним переводам, которые делает программа DEX
+        if not is_inner or program_id != TOKEN_PROGRAM_ID:
+            continue
+        parsed = instruction.get("parsed")
+        if not isinstance(parsed, dict) or parsed.get("type") not in TOKEN_TRANSFER_TYPES:
+            continue
+        info = parsed.get("info", {})
+        token_amount = info.get("tokenAmount")
+        if token_amount is not None:
+            mint, amount = info.get("mint", ""), float(token_amount.get("uiAmount") or 0)
+        else:
+            mint, decimals = account_mints.get(info.get("source")) or account_mints.get(info.get("destination"), ("", 0))
+            amount = int(info.get("amount") or 0) / 10 ** decimals
+        # WSOL — тот же SOL: его поток уже есть в изменении баланса подписанта
+        if not mint or mint == WSOL:
+            continue
+        if info.get("source") in signer_accounts or info.get("authority") in signer_accounts:
+            tokens_sent[mint] = tokens_sent.get(mint, 0) + amount
+        if info.get("destination") in signer_accounts:
+            tokens_received[mint] = tokens_received.get(mint, 0) + amount
+
+    # Подписант — первый аккаунт, изменение SOL без комиссии
+    pre_balances, post_balances = meta.get("preBalances") or [0], meta.get("postBalances") or [0]
+    net_balance_change = (post_balances[0] - pre_balances[0] + meta.get("fee", 0)) / 1e9
+
+    if dex_name:
+        if net_balance_change < 0 and tokens_received and not tokens_sent:
+            mint, buy_amount = max(tokens_received.items(), key=lambda item: item[1])
+            spent = -net_balance_change
+            logger.info(f"Transaction {transaction_hash} classified as BUY "
+                        f"(token: {mint}, amount: {buy_amount}, spent SOL: {spent})")
+            return ParsedTransaction(transaction_hash, TransactionAction.BUY, mint, mint, buy_amount, spent,
+                                     dex_name=dex_name, timestamp=timestamp,
+                                     price=_swap_price(oracle, mint, buy_amount, spent, block_time),
+                                     sol_balance_before=pre_balances[0] / 1e9,
+                                     token_balance_before=_owner_token_balance(
+                                         meta.get("preTokenBalances"), signer, mint))
+        if net_balance_change > 0 and tokens_sent and not tokens_received:
+            mint, sell_amount = max(tokens_sent.items(), key=lambda item: item[1])
+            logger.info(f"Transaction {transaction_hash} classified as SELL "
+                        f"(token: {mint}, amount: {sell_amount}, received SOL: {net_balance_change})")
+            return ParsedTransaction(transaction_hash, TransactionAction.SELL, mint, mint, net_balance_change,
+                                     sell_amount, dex_name=dex_name, timestamp=timestamp,
+                                     price=_swap_price(oracle, mint, sell_amount, net_balance_change, block_time),
+                                     sol_balance_before=pre_balances[0] / 1e9,
+                                     token_balance_before=_owner_token_balance(
+                                         meta.get("preTokenBalances"), signer, mint))
+        if tokens_sent and tokens_received:
+            sell_mint, sell_amount = max(tokens_sent.items(), key=lambda item: item[1])
+            buy_mint, buy_amount = max(tokens_received.items(), key=lambda item: item[1])
+            pair = f"{sell_mint}:{buy_mint}"
+            logger.info(f"Transaction {transaction_hash} classified as SWAP "
+                        f"(sold {sell_mint}: {sell_amount}, bought {buy_mint}: {buy_amount})")
+            return ParsedTransaction(transaction_hash, TransactionAction.TRANSFER, pair, pair, buy_amount,
+                                     sell_amount, dex_name=dex_name, timestamp=timestamp)
+        return ParsedTransaction(transaction_hash, TransactionAction.TRANSFER, timestamp=timestamp)
+
+    if tokens_sent or tokens_received:
+        mint = max(tokens_sent, key=tokens_sent.get,
+                   default=max(tokens_received, key=tokens_received.get, default=""))
+        amount = tokens_sent.get(mint, tokens_received.get(mint, 0))
+        logger.info(f"Transaction {transaction_hash} classified as TRANSFER (token: {mint}, amount: {amount})")
+        return ParsedTransaction(transaction_hash, TransactionAction.TRANSFER, mint, mint, transfer_amount=amount,
+                                 timestamp=timestamp,
+                                 price=oracle.at(mint, block_time) if oracle is not None and block_time else None)
+    if net_balance_change:
+        amount = abs(net_balance_change)
+        logger.info(f"Transaction {transaction_hash} classified as TRANSFER (token: SOL, amount: {amount})")
+        return ParsedTransaction(transaction_hash, TransactionAction.TRANSFER, WSOL, "SOL", transfer_amount=amount,
+                                 timestamp=timestamp)
+    return ParsedTransaction(transaction_hash, TransactionAction.TRANSFER, timestamp=timestamp)
+
+
+def classify_payload(payload: Tuple[str, bytes, bool]) -> Tuple[ParsedTransaction, Optional[bytes]]:
+    """
+    Задача DecodeExecutor: (подпись, данные, из кэша ли) → транзакция и, для нового полного ответа RPC,
+    сжатая запись для TransactionCache. Данные — сжатый ответ из кэша или тело ответа JSON-RPC.
+    """
+    transaction_hash, data, cached = payload
+    try:
+        if cached:
+            return classify_transaction(transaction_hash, decode_payload(data), oracle=None), None
+        result = json.loads(data).get("result")
+        complete = bool(result) and "meta" in result and "transaction" in result
+        return classify_transaction(transaction_hash, result, oracle=None), encode_payload(result) if complete else None
+    except Exception as e:
+        logger.error(f"Error classifying transaction {transaction_hash}: {e}")
+        return ParsedTransaction(transaction_hash, TransactionAction.TRANSFER,
+                                 timestamp=ParsedTransaction.block_timestamp(None)), None
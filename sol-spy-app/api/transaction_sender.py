@@ -0,0 +1,147 @@
+import asyncio
+import base64
+import logging
+import time
+from typing import NamedTuple, Optional
+
+from solders.transaction import VersionedTransaction
+
+from api.rpc_router import RpcRouter, rpc_router
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LANDED_STATUSES = {
+    "processed": ("processed", "confirmed", "finalized"),
+    "confirmed": ("confirmed", "finalized"),
+    "finalized": ("finalized",),
+}
+
+
+class SendResult(NamedTuple):
+    signature: str
+    landed: bool
+    slot: Optional[int]
+    landing_latency_ms: Optional[int]
+    error: Optional[str]
+
+
+class PendingTransaction:
+    __slots__ = ("signature", "raw", "last_valid_block_height", "priority_fee", "sent_at", "result", "broadcasts",
+                 "rebroadcast_task")
+
+    def __init__(self, signature: str, raw: str, last_valid_block_height: int, priority_fee: Optional[int] = None):
+        self.signature = signature
+        self.raw = raw
+        self.last_valid_block_height = last_valid_block_height
+        self.priority_fee = priority_fee
+        self.sent_at = time.monotonic()
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.broadcasts = 0
+        self.rebroadcast_task: Optional[asyncio.Task] = None
+
+
+class TransactionSender:
+    """
+    Рассылает подписанную транзакцию на все RPC ноды, повторяет рассылку, пока она не попадёт
+    в блок или не истечёт blockhash, и отслеживает подтверждение одним пакетным
+    getSignatureStatuses на все ожидающие подписи.
+    """
+
+    def __init__(self, router: RpcRouter = None):
+        self.router = router or rpc_router
+        self._pending: dict[str, PendingTransaction] = {}
+        self._poller: Optional[asyncio.Task] = None
+
+    @property
+    def pending_signatures(self) -> set[str]:
+        return set(self._pending)
+
+    async def send(self, transaction: VersionedTransaction, last_valid_block_height: int,
+                   priority_fee: Optional[int] = None) -> PendingTransaction:
+        """
+        Первая рассылка синхронная: если ни одна нода не приняла транзакцию, бросает RpcError.
+        Результат подтверждения — в PendingTransaction.result.
+        """
+        signature = str(transaction.signatures[0])
+        pending = PendingTransaction(signature, base64.b64encode(bytes(transaction)).decode(), last_valid_block_height,
+                                     priority_fee)
+        await self._broadcast(pending)
+
+        self._pending[signature] = pending
+        pending.rebroadcast_task = asyncio.create_task(self._rebroadcast(pending))
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll_statuses())
+        logger.info(f"Транзакция {signature} отправлена, lastValidBlockHeight={last_valid_block_height}, "
+                    f"priority_fee={priority_fee}")
+        return pending
+
+    async def send_and_confirm(self, transaction: VersionedTransaction, last_valid_block_height: int) -> SendResult:
+        pending = await self.send(transaction, last_valid_block_height)
+        return await pending.result
+
+    async def _broadcast(self, pending: PendingTransaction) -> None:
+        await self.router.broadcast("sendTransaction", [
+            pending.raw, {"encoding": "base64", "skipPreflight": True, "maxRetries": 0}
+        ])
+        pending.broadcasts += 1
+
+    async def _rebroadcast(self, pending: PendingTransaction) -> None:
+        while not pending.result.done():
+            await asyncio.sleep(settings.sender.rebroadcast_interval)
+            if pending.result.done():
+                return
+            try:
+                await self._broadcast(pending)
+            except Exception as e:
+                logger.warning(f"Повторная рассылка {pending.signature} не удалась: {e}")
+
+    def _resolve(self, pending: PendingTransaction, landed: bool, slot: Optional[int] = None,
+                 error: Optional[str] = None) -> None:
+        self._pending.pop(pending.signature, None)
+        if pending.rebroadcast_task:
+            pending.rebroadcast_task.cancel()
+        latency_ms = int((time.monotonic() - pending.sent_at) * 1000) if landed else None
+        if not pending.result.done():
+            pending.result.set_result(SendResult(pending.signature, landed, slot, latency_ms, error))
+        logger.info(f"Транзакция {pending.signature}: landed={landed}, slot={slot}, priority_fee={pending.priority_fee}, "
+                    f"latency={latency_ms} мс, рассылок={pending.broadcasts}, ошибка={error}")
+
+    async def fetch_statuses(self, signatures: list[str], search_history: bool = False) -> dict[str, Optional[dict]]:
+        statuses = {}
+        batch_size = settings.sender.max_signatures_per_request
+        for i in range(0, len(signatures), batch_size):
+            chunk = signatures[i:i + batch_size]
+            result = await self.router.request(
+                "getSignatureStatuses", [chunk, {"searchTransactionHistory": search_history}], hedge=False
+            )
+            statuses.update(zip(chunk, result["value"]))
+        return statuses
+
+    async def _poll_statuses(self) -> None:
+        landed_statuses = LANDED_STATUSES[settings.sender.commitment]
+        while self._pending:
+            await asyncio.sleep(settings.sender.poll_interval)
+            try:
+                statuses = await self.fetch_statuses(list(self._pending))
+                for signature, status in statuses.items():
+                    pending = self._pending.get(signature)
+                    if not pending or not status:
+                        continue
+                    if status.get("err"):
+                        self._resolve(pending, False, status.get("slot"), str(status["err"]))
+                    elif status.get("confirmationStatus") in landed_statuses:
+                        self._resolve(pending, True, status.get("slot"))
+
+                if not self._pending:
+                    continue
+                block_height = await self.router.request("getBlockHeight", [{"commitment": "confirmed"}])
+                for signature, pending in list(self._pending.items()):
+                    # Транзакция, уже видимая как processed, ещё может подтвердиться
+                    if block_height > pending.last_valid_block_height and not statuses.get(signature):
+                        self._resolve(pending, False, error="blockhash expired")
+            except Exception as e:
+                logger.error(f"Ошибка проверки статусов транзакций: {e}")
+
+
+transaction_sender = TransactionSender()
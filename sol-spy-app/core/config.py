@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import PostgresDsn
@@ -19,6 +21,211 @@ class DatabaseConfig(BaseModel):
     max_overflow: int = 10
 
 
+class ArchiveConfig(BaseModel):
+    dir: str = "archive/transactions"
+    retention_months: int = 6
+
+
+class BalanceRefreshConfig(BaseModel):
+    interval_seconds: int = 30
+    chunk_size: int = 100
+
+
+class PortfolioSnapshotConfig(BaseModel):
+    interval_seconds: int = 60
+    concurrency: int = 5
+
+
+class RpcConfig(BaseModel):
+    helius_endpoint: str = "https://mainnet.helius-rpc.com"
+    public_endpoint: str = "https://api.mainnet-beta.solana.com"
+    helius_rps: float = 10
+    quicknode_rps: float = 25
+    public_rps: float = 4
+    request_timeout: float = 10.0
+    hedge_reads: bool = True
+    max_hedges: int = 1
+    hedge_min_delay: float = 0.05
+    default_latency: float = 0.3
+    stats_window: int = 200
+    max_consecutive_errors: int = 5
+    cooldown_seconds: float = 15.0
+    max_slot_lag: int = 50
+    slot_lag_penalty: float = 0.01
+    slot_refresh_seconds: int = 5
+    # Доля корзины лимита, которую фоновые запросы оставляют основному трафику
+    background_reserve: float = 0.5
+
+
+class SenderConfig(BaseModel):
+    rebroadcast_interval: float = 2.0
+    poll_interval: float = 0.5
+    commitment: str = "confirmed"
+    max_signatures_per_request: int = 256
+    reconcile_interval_seconds: int = 60
+
+
+class PriorityFeeConfig(BaseModel):
+    # micro-lamports за compute unit
+    percentile: float = 75
+    min_fee: int = 1_000
+    max_fee: int = 2_000_000
+    fallback: int = 100_000
+    ttl_seconds: float = 2.0
+    max_cache_entries: int = 1024
+
+
+class ComputeUnitConfig(BaseModel):
+    headroom: float = 0.15
+    min_units: int = 50_000
+    max_units: int = 1_400_000
+    resimulate_every: int = 25
+    ttl_seconds: float = 900
+    drift_threshold: float = 0.2
+
+
+class SwapBuilderConfig(BaseModel):
+    # "instructions" — собирать транзакцию локально из /swap-instructions, "transaction" — готовая из /swap
+    mode: str = "instructions"
+    blockhash_max_age: float = 5.0
+    blockhash_refresh_seconds: int = 2
+    lookup_table_refresh_seconds: int = 300
+
+
+class QuotePrefetchConfig(BaseModel):
+    interval_seconds: int = 5
+    max_age_seconds: float = 10.0
+    bucket_step: float = 0.05
+    sell_fractions: list[float] = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+    price_move_threshold: float = 0.02
+    slippage_bps: int = 100
+    concurrency: int = 4
+
+
+class QuoteRouterConfig(BaseModel):
+    venues: list[str] = ["jupiter", "raydium"]
+    deadline_ms: float = 400
+    # Оценка лимита CU свопа на площадке для расчёта стоимости исполнения
+    compute_units: dict[str, int] = {"jupiter": 300_000, "raydium": 200_000}
+
+
+class AmmEngineConfig(BaseModel):
+    refresh_seconds: int = 1
+    # Котировки по резервам старше этого считаются устаревшими
+    max_age_seconds: float = 5.0
+    discovery_retry_seconds: int = 60
+
+
+class PriceOracleConfig(BaseModel):
+    # Отсчётов на минт; при чтении резервов раз в секунду это около 8 минут истории
+    capacity: int = 512
+    max_mints: int = 5000
+    max_age_seconds: float = 60.0
+    at_max_gap_seconds: float = 300.0
+
+
+class BitqueryConfig(BaseModel):
+    endpoint: str = "https://streaming.bitquery.io/eap"
+    # Подписей или минтов в одном запросе
+    batch_size: int = 100
+    # Ног DEXTrades на транзакцию, под которые резервируется limit запроса
+    legs_per_transaction: int = 4
+    concurrency: int = 4
+    execute_timeout: int = 30
+
+
+class BitqueryFeedConfig(BaseModel):
+    # Сделки по подписке вместо опроса getSignaturesForAddress + getTransaction
+    enabled: bool = False
+    url: str = "wss://streaming.bitquery.io/eap"
+    queue_size: int = 10_000
+    dedup_size: int = 50_000
+    reconnect_min_delay: float = 1.0
+    reconnect_max_delay: float = 30.0
+    ping_interval: float = 20.0
+
+
+class TransactionCacheConfig(BaseModel):
+    # Ответы getTransaction (finalized) на диске, чтобы повторный разбор не ходил в RPC
+    enabled: bool = True
+    path: str = "cache/transactions.sqlite3"
+    max_bytes: int = 512 * 1024 * 1024
+    # После вытеснения размер опускается до этой доли max_bytes
+    low_watermark: float = 0.9
+    compress_level: int = 6
+
+
+class WalletBackfillConfig(BaseModel):
+    enabled: bool = True
+    interval_seconds: int = 30
+    # Глубина истории: не старше depth_days и не больше max_signatures подписей
+    depth_days: int = 30
+    max_signatures: int = 5000
+    page_size: int = 200
+    concurrency: int = 4
+    max_wallets: int = 2
+    max_attempts: int = 5
+
+
+class DecodeExecutorConfig(BaseModel):
+    # 0 — разбирать всё в event loop
+    workers: int = 2
+    # Пачки меньше этого разбираются на месте
+    min_batch: int = 8
+    chunk_size: int = 16
+    lag_interval: float = 0.1
+    lag_window: int = 600
+
+
+class SniperConfig(BaseModel):
+    # Покупки без участия пользователя: включается явно
+    enabled: bool = False
+    # Пусто — websocket Helius по HELIUS_API_TOKEN
+    ws_url: str = ""
+    commitment: str = "processed"
+    sync_seconds: int = 5
+    # Заготовленная покупка старше этого пересобирается: котировка внутри неё стареет
+    rearm_seconds: float = 10.0
+    slippage_bps: int = 1500
+    fee_percentile: float = 90
+    compute_unit_limit: int = 300_000
+    reconnect_min_delay: float = 1.0
+    reconnect_max_delay: float = 30.0
+    ping_interval: float = 20.0
+    latency_window: int = 1000
+
+
+class CopySizingConfig(BaseModel):
+    # Режим для кошельков без copy_mode
+    default_mode: str = "copy_percent"
+    multiplier: float = 2.0  # COPY_XPERCENT
+    fixed_amount: float = 0.05  # COPY_FIX, SOL на покупку
+    # Ограничения покупки: доля баланса бот-кошелька в процентах и сумма в SOL
+    max_balance_pct: float = 5.0
+    max_trade_sol: Optional[float] = None
+    # Баланс бот-кошелька из BalanceCache старше этого не используется
+    balance_max_age_seconds: float = 120.0
+
+
+class RiskMonitorConfig(BaseModel):
+    # Продажи без сигнала отслеживаемого кошелька: включается явно
+    enabled: bool = False
+    tick_seconds: float = 1.0
+    # Перечитывание позиций из БД и балансов бот-кошельков
+    sync_seconds: int = 30
+    # Пороги в процентах от цены входа; порог кошелька важнее порога CopyMode, тот — общего
+    stop_loss_pct: Optional[float] = None
+    take_profit_pct: Optional[float] = None
+    copy_mode_stop_loss_pct: dict[str, float] = {}
+    copy_mode_take_profit_pct: dict[str, float] = {}
+    sell_percentage: float = 100.0
+    # Цена из оракула старше этого не используется
+    price_max_age_seconds: float = 30.0
+    # Если после продажи позиция не закрылась, повторяем не раньше чем через
+    exit_retry_seconds: float = 60.0
+    track_concurrency: int = 8
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=("env","env.template"),
@@ -30,6 +237,26 @@ class Settings(BaseSettings):
     run: RunConfig = RunConfig()
     api: ApiPrefix = ApiPrefix()
     db: DatabaseConfig
+    archive: ArchiveConfig = ArchiveConfig()
+    balance_refresh: BalanceRefreshConfig = BalanceRefreshConfig()
+    portfolio_snapshot: PortfolioSnapshotConfig = PortfolioSnapshotConfig()
+    rpc: RpcConfig = RpcConfig()
+    sender: SenderConfig = SenderConfig()
+    priority_fee: PriorityFeeConfig = PriorityFeeConfig()
+    compute_units: ComputeUnitConfig = ComputeUnitConfig()
+    swap_builder: SwapBuilderConfig = SwapBuilderConfig()
+    quote_prefetch: QuotePrefetchConfig = QuotePrefetchConfig()
+    quote_router: QuoteRouterConfig = QuoteRouterConfig()
+    amm_engine: AmmEngineConfig = AmmEngineConfig()
+    price_oracle: PriceOracleConfig = PriceOracleConfig()
+    bitquery: BitqueryConfig = BitqueryConfig()
+    bitquery_feed: BitqueryFeedConfig = BitqueryFeedConfig()
+    transaction_cache: TransactionCacheConfig = TransactionCacheConfig()
+    wallet_backfill: WalletBackfillConfig = WalletBackfillConfig()
+    decode_executor: DecodeExecutorConfig = DecodeExecutorConfig()
+    sniper: SniperConfig = SniperConfig()
+    risk_monitor: RiskMonitorConfig = RiskMonitorConfig()
+    copy_sizing: CopySizingConfig = CopySizingConfig()
 
 
 settings = Settings()
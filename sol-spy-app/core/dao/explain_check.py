@@ -0,0 +1,139 @@
+import asyncio
+import json
+import logging
+import sys
+from contextlib import contextmanager
+
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.dao.migrations import import_models
+from core.db_helper import db_helper
+from core.models.bot_wallet import BotWallet
+from core.models.tracked_wallet import TrackedWallet
+from core.models.user import User
+
+logger = logging.getLogger(__name__)
+
+WSOL = "So11111111111111111111111111111111111111112"
+
+# Таблицы, которые на горячем пути обязаны читаться по индексу
+HOT_TABLES = ("tracked_wallets", "transactions", "wallet_tokens", "bot_wallets", "tracked_statistics")
+INDEX_NODE_TYPES = ("Index Scan", "Index Only Scan", "Bitmap Heap Scan")
+
+
+@contextmanager
+def capture_selects(engine: AsyncEngine):
+    """
+    Записывает все SELECT, которые движок отправляет в базу, вместе с параметрами.
+    """
+    captured = []
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+
+
+def _hot_table(relation_name: str) -> str | None:
+    for table in HOT_TABLES:
+        if relation_name == table or relation_name.startswith(f"{table}_"):
+            return table
+    return None
+
+
+def _scan_violations(plan: dict) -> list[str]:
+    violations = []
+    relation = plan.get("Relation Name")
+    if relation and _hot_table(relation) and plan.get("Node Type") not in INDEX_NODE_TYPES:
+        violations.append(f"{plan.get('Node Type')} on {relation}")
+    for child in plan.get("Plans", []):
+        violations.extend(_scan_violations(child))
+    return violations
+
+
+async def explain_statements(engine: AsyncEngine, statements: list) -> list[tuple[str, list[str]]]:
+    """
+    Прогоняет EXPLAIN для каждого запроса с выключенным seq scan и возвращает нарушения.
+    На маленьких таблицах планировщик всё равно выбрал бы seq scan, поэтому
+    enable_seqscan=off проверяет именно наличие подходящего индекса.
+    """
+    report = []
+    async with engine.connect() as conn:
+        for statement, parameters in statements:
+            async with conn.begin():
+                await conn.execute(text("SET LOCAL enable_seqscan = off"))
+                result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                plan = result.scalar()
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                report.append((statement, _scan_violations(plan[0]["Plan"])))
+    return report
+
+
+async def _run_service_queries(session_factory, user: User, tracked_wallet: TrackedWallet):
+    from api.api_init_helper import api_helper
+    from core.service.tracked_statistics_service import TrackedStatisticsService
+    from core.service.tracked_wallet_service import TrackedWalletService
+    from core.service.wallet_token_service import WalletTokenService
+
+    tracked_wallet_service = TrackedWalletService(session_factory, api_heler=api_helper)
+    await tracked_wallet_service.get_wallet_by_address(tracked_wallet.wallet_address)
+    await tracked_wallet_service.get_wallet_transactions(tracked_wallet.wallet_address, limit=50)
+    await tracked_wallet_service.get_user_tracking_wallets(user)
+
+    wallet_token_service = WalletTokenService(session_factory)
+    wallet_tokens = await wallet_token_service.get_wallet_tokens(tracked_wallet.id)
+    # Точечный запрос проверяем на настоящем минте кошелька; если токенов нет — на WSOL
+    mint = wallet_tokens[0].token_address if wallet_tokens else WSOL
+    await wallet_token_service.get_wallet_token(tracked_wallet.id, mint)
+
+    tracked_statistics_service = TrackedStatisticsService(session_factory)
+    await tracked_statistics_service.get_statistics_for_bot_wallet(user, tracked_wallet.wallet_address)
+
+
+async def check_index_usage(engine: AsyncEngine = None, session_factory=None) -> list[tuple[str, list[str]]]:
+    """
+    Выполняет запросы TrackedWalletService, WalletTokenService и TrackedStatisticsService
+    на первом отслеживаемом кошельке и проверяет их планы.
+    """
+    engine = engine or db_helper.engine
+    session_factory = session_factory or db_helper.session_factory
+    import_models()
+
+    async with session_factory() as session:
+        result = await session.execute(
+            select(TrackedWallet, User)
+            .join(BotWallet, BotWallet.id == TrackedWallet.bot_wallet_id)
+            .join(User, User.id == BotWallet.user_id)
+            .limit(1)
+        )
+        row = result.first()
+    if not row:
+        raise RuntimeError("В базе нет отслеживаемых кошельков, проверять нечего")
+    tracked_wallet, user = row
+
+    with capture_selects(engine) as captured:
+        await _run_service_queries(session_factory, user, tracked_wallet)
+    return await explain_statements(engine, captured)
+
+
+async def main() -> int:
+    report = await check_index_usage()
+    failed = [(statement, violations) for statement, violations in report if violations]
+    for statement, violations in report:
+        status = "FAIL" if violations else "ok"
+        print(f"[{status}] {' '.join(statement.split())[:140]}")
+        for violation in violations:
+            print(f"       {violation}")
+    print(f"Проверено запросов: {len(report)}, без индекса: {len(failed)}")
+    await db_helper.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
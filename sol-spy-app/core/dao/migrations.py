@@ -0,0 +1,158 @@
+import logging
+from typing import NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from core.dao.partitions import add_months, ensure_transactions_partitions, month_start, utc_now
+from core.db_helper import db_helper
+from core.models.base import Base
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-lock, чтобы два процесса (например, uvicorn --reload) не мигрировали одновременно
+MIGRATIONS_LOCK_KEY = 726_001
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    statements: tuple[str, ...]
+
+
+# Только изменения существующих таблиц. Новые таблицы создаёт create_all,
+# новая база сразу помечается как полностью мигрированная.
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(1, "hot_path_indexes", (
+        "CREATE INDEX IF NOT EXISTS ix_tracked_wallets_wallet_address ON tracked_wallets (wallet_address)",
+        "CREATE INDEX IF NOT EXISTS ix_tracked_wallets_bot_wallet_id ON tracked_wallets (bot_wallet_id)",
+        "CREATE INDEX IF NOT EXISTS ix_transactions_wallet_id_timestamp ON transactions (wallet_id, timestamp, id)",
+        # Перед уникальным индексом убираем дубли, оставляя самую свежую запись
+        "DELETE FROM wallet_tokens a USING wallet_tokens b "
+        "WHERE a.wallet_id = b.wallet_id AND a.token_address = b.token_address AND a.id < b.id",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_wallet_tokens_wallet_id_token_address "
+        "ON wallet_tokens (wallet_id, token_address)",
+        "CREATE INDEX IF NOT EXISTS ix_bot_wallets_user_id_status ON bot_wallets (user_id, status)",
+        "CREATE INDEX IF NOT EXISTS ix_tracked_statistics_tracked_wallet_id_created_at "
+        "ON tracked_statistics (tracked_wallet_id, created_at)",
+    )),
+    Migration(2, "partition_transactions_by_month", (
+        "UPDATE transactions SET timestamp = now() WHERE timestamp IS NULL",
+        "ALTER TABLE transactions RENAME TO transactions_unpartitioned",
+        "CREATE TABLE transactions (LIKE transactions_unpartitioned INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (timestamp)",
+        "ALTER TABLE transactions ALTER COLUMN timestamp SET NOT NULL",
+        "ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id",
+        # Секции на весь диапазон существующих данных плюс следующий месяц
+        """
+        DO $$
+        DECLARE
+            month_start date;
+        BEGIN
+            SELECT date_trunc('month', coalesce(min(timestamp), now()))::date INTO month_start
+            FROM transactions_unpartitioned;
+            WHILE month_start <= date_trunc('month', now() + interval '1 month')::date LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF transactions FOR VALUES FROM (%L) TO (%L)',
+                    'transactions_' || to_char(month_start, 'YYYY_MM'),
+                    month_start,
+                    (month_start + interval '1 month')::date
+                );
+                month_start := (month_start + interval '1 month')::date;
+            END LOOP;
+        END $$
+        """,
+        "INSERT INTO transactions SELECT * FROM transactions_unpartitioned",
+        "DROP TABLE transactions_unpartitioned",
+        "ALTER TABLE transactions ADD CONSTRAINT transactions_pkey PRIMARY KEY (id, timestamp)",
+        "ALTER TABLE transactions ADD CONSTRAINT uq_transactions_transaction_hash_timestamp "
+        "UNIQUE (transaction_hash, timestamp)",
+        "ALTER TABLE transactions ADD CONSTRAINT transactions_wallet_id_fkey "
+        "FOREIGN KEY (wallet_id) REFERENCES tracked_wallets (id) ON DELETE CASCADE",
+        "CREATE INDEX ix_transactions_id ON transactions (id)",
+        "CREATE INDEX ix_transactions_wallet_id_timestamp ON transactions (wallet_id, timestamp, id)",
+    )),
+    Migration(3, "bot_transaction_landing", (
+        "ALTER TABLE my_wallet_transactions ADD COLUMN IF NOT EXISTS landed_slot BIGINT",
+        "ALTER TABLE my_wallet_transactions ADD COLUMN IF NOT EXISTS landing_latency_ms INTEGER",
+        "ALTER TABLE my_wallet_transactions ADD COLUMN IF NOT EXISTS error VARCHAR",
+        "CREATE INDEX IF NOT EXISTS ix_my_wallet_transactions_status ON my_wallet_transactions (status)",
+    )),
+    Migration(4, "bot_transaction_priority_fee", (
+        "ALTER TABLE my_wallet_transactions ADD COLUMN IF NOT EXISTS priority_fee BIGINT",
+    )),
+    Migration(5, "sniper_target_execution", (
+        "ALTER TABLE sniper_targets ADD COLUMN IF NOT EXISTS bot_wallet_id INTEGER "
+        "REFERENCES bot_wallets (id) ON DELETE SET NULL",
+        "ALTER TABLE sniper_targets ADD COLUMN IF NOT EXISTS buy_signature VARCHAR",
+        "ALTER TABLE sniper_targets ADD COLUMN IF NOT EXISTS error TEXT",
+    )),
+    Migration(6, "risk_limits", (
+        "ALTER TABLE tracked_wallets ADD COLUMN IF NOT EXISTS stop_loss_pct DOUBLE PRECISION",
+        "ALTER TABLE tracked_wallets ADD COLUMN IF NOT EXISTS take_profit_pct DOUBLE PRECISION",
+        "ALTER TABLE my_wallet_transactions ADD COLUMN IF NOT EXISTS tracked_wallet_id INTEGER "
+        "REFERENCES tracked_wallets (id) ON DELETE SET NULL",
+    )),
+    Migration(7, "copy_sizing", (
+        "ALTER TABLE tracked_wallets ADD COLUMN IF NOT EXISTS copy_multiplier DOUBLE PRECISION",
+        "ALTER TABLE tracked_wallets ADD COLUMN IF NOT EXISTS copy_fixed_amount DOUBLE PRECISION",
+        "ALTER TABLE tracked_wallets ADD COLUMN IF NOT EXISTS max_trade_sol DOUBLE PRECISION",
+        "ALTER TABLE tracked_wallets ADD COLUMN IF NOT EXISTS max_balance_pct DOUBLE PRECISION",
+    )),
+)
+
+
+def import_models():
+    from core.models import (auth_token, bot_log, bot_wallet, my_wallet_transaction, sniper_target,  # noqa: F401
+                             tracked_statistics, tracked_wallet, user, wallet_backfill, wallet_token,
+                             wallet_transaction)
+
+
+async def _table_exists(conn: AsyncConnection, table_name: str) -> bool:
+    result = await conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": table_name})
+    return bool(result.scalar())
+
+
+async def _applied_versions(conn: AsyncConnection) -> set[int]:
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    return set(result.scalars().all())
+
+
+async def run_migrations(engine: AsyncEngine = None) -> list[int]:
+    """
+    Приводит схему к текущим моделям без потери данных. Возвращает список применённых версий.
+    """
+    engine = engine or db_helper.engine
+    import_models()
+    applied_now = []
+
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+        fresh_database = not await _table_exists(conn, "tracked_wallets")
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL DEFAULT now())"
+        ))
+        await conn.run_sync(Base.metadata.create_all)
+
+        applied = await _applied_versions(conn)
+        for migration in MIGRATIONS:
+            if migration.version in applied:
+                continue
+            # На новой базе create_all уже создал всё, что описано в моделях
+            if not fresh_database:
+                logger.info(f"Применяем миграцию {migration.version}: {migration.name}")
+                for statement in migration.statements:
+                    await conn.execute(text(statement))
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                {"version": migration.version, "name": migration.name},
+            )
+            applied_now.append(migration.version)
+
+        today = utc_now()
+        await ensure_transactions_partitions(conn, today, add_months(month_start(today), 1))
+
+    if applied_now:
+        logger.info(f"Схема обновлена, применены миграции: {applied_now}")
+    return applied_now
@@ -0,0 +1,69 @@
+from datetime import date, datetime, timezone
+from typing import NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+TRANSACTIONS_TABLE = "transactions"
+
+
+class Partition(NamedTuple):
+    name: str
+    month: date
+
+
+def utc_now() -> datetime:
+    """
+    Текущее время UTC без часового пояса: в таком виде оно хранится в колонках TIMESTAMP.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def month_start(value: date | datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TRANSACTIONS_TABLE}_{month:%Y_%m}"
+
+
+def partition_month(name: str) -> date | None:
+    try:
+        return datetime.strptime(name[len(TRANSACTIONS_TABLE) + 1:], "%Y_%m").date()
+    except ValueError:
+        return None
+
+
+async def ensure_transactions_partitions(conn: AsyncConnection, start: date | datetime, end: date | datetime) -> None:
+    """
+    Создаёт месячные секции transactions, покрывающие [start, end] включительно.
+    """
+    month = month_start(start)
+    last = month_start(end)
+    while month <= last:
+        next_month = add_months(month, 1)
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TRANSACTIONS_TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+        ))
+        month = next_month
+
+
+async def list_transactions_partitions(conn: AsyncConnection) -> list[Partition]:
+    result = await conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table"
+    ), {"table": TRANSACTIONS_TABLE})
+    partitions = []
+    for name in result.scalars().all():
+        month = partition_month(name)
+        if month:
+            partitions.append(Partition(name, month))
+    return sorted(partitions, key=lambda partition: partition.month)
@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from core.dao.partitions import utc_now
+from core.models.wallet_transaction import TransactionAction, TransactionStatus
+
+
+@dataclass(slots=True)
+class ParsedTransaction:
+    """
+    Разобранная транзакция отслеживаемого кошелька: общий тип для парсеров, записи в БД,
+    обработки сигналов и ответов API. timestamp — время блока в UTC.
+    Не frozen: frozen-датакласс заполняет поля через object.__setattr__, это заметно на горячем пути.
+    """
+    transaction_hash: str
+    transaction_action: TransactionAction
+    token_address: str = ""
+    token_symbol: str = "Unknown"
+    buy_amount: float = 0.0
+    sell_amount: float = 0.0
+    transfer_amount: float = 0.0
+    dex_name: str = ""
+    price: Optional[float] = None
+    timestamp: Optional[datetime] = None
+    # Балансы подписанта до сделки (SOL и проданного/купленного токена), если источник их знает
+    sol_balance_before: Optional[float] = None
+    token_balance_before: Optional[float] = None
+
+    @property
+    def is_trade(self) -> bool:
+        return self.transaction_action in (TransactionAction.BUY, TransactionAction.SELL)
+
+    @staticmethod
+    def action_from(value) -> TransactionAction:
+        """
+        Тип из парсеров ("BUY", "buy", "SWAP", ...) в TransactionAction; всё, что не покупка и не продажа, — перевод.
+        """
+        if isinstance(value, TransactionAction):
+            return value
+        return TransactionAction.__members__.get(str(value).upper(), TransactionAction.TRANSFER)
+
+    @staticmethod
+    def block_timestamp(block_time: Optional[float]) -> datetime:
+        # Колонка timestamp без часового пояса, храним UTC
+        if not block_time:
+            return utc_now()
+        return datetime.fromtimestamp(block_time, timezone.utc).replace(tzinfo=None)
+
+    @staticmethod
+    def to_rows(transactions: Iterable["ParsedTransaction"], wallet_id: int) -> list[dict]:
+        """
+        Строки для одного bulk insert в transactions, собранные за один проход.
+        """
+        now = utc_now()
+        success = TransactionStatus.SUCCESS
+        return [
+            {
+                "wallet_id": wallet_id,
+                "transaction_hash": transaction.transaction_hash,
+                "transaction_action": transaction.transaction_action,
+                "status": success,
+                "token_address": transaction.token_address,
+                "token_symbol": transaction.token_symbol,
+                "buy_amount": transaction.buy_amount,
+                "sell_amount": transaction.sell_amount,
+                "transfer_amount": transaction.transfer_amount,
+                "dex_name": transaction.dex_name,
+                "price": transaction.price,
+                "timestamp": transaction.timestamp or now,
+            }
+            for transaction in transactions
+        ]
@@ -1,6 +1,6 @@
 from email.policy import default
 
-from sqlalchemy import Column, Integer, String, TIMESTAMP, Numeric, ForeignKey, Float, Boolean, false
+from sqlalchemy import Column, Integer, String, TIMESTAMP, Numeric, ForeignKey, Float, Boolean, false, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from core.models.base import Base
@@ -15,6 +15,9 @@ if TYPE_CHECKING:
 
 class BotWallet(Base):
     __tablename__ = "bot_wallets"
+    __table_args__ = (
+        Index("ix_bot_wallets_user_id_status", "user_id", "status"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=True)
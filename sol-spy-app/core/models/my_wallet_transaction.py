@@ -1,31 +1,24 @@
-from sqlalchemy import Column, Integer, String, TIMESTAMP, Numeric, ForeignKey, Float,Enum
+from sqlalchemy import Column, Integer, String, TIMESTAMP, Numeric, ForeignKey, Float,Enum, BigInteger, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped, mapped_column
 from core.models.base import Base
 from sqlalchemy.sql import func
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
-from enum import Enum as PyEnum
+# Те же enum, что и у transactions: в базе это общие типы transactionstatus/transactionaction,
+# а сделки бота сравниваются с действиями отслеживаемых кошельков
+from core.models.wallet_transaction import TransactionStatus, TransactionAction
 
 
 if TYPE_CHECKING:
     from core.models.bot_wallet import BotWallet
 
 
-
-class TransactionStatus(PyEnum):
-    PENDING = 'pending'
-    SUCCESS = 'success'
-    FAILED = 'failed'
-
-class TransactionAction(PyEnum):
-    BUY = 'buy'
-    SELL = 'sell'
-    TRANSFER = 'transfer'
-
-
 class MyWalletTransaction(Base):
     __tablename__ = "my_wallet_transactions"
+    __table_args__ = (
+        Index("ix_my_wallet_transactions_status", "status"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True, autoincrement=True)
     wallet_id: Mapped[int] = mapped_column(ForeignKey("bot_wallets.id", ondelete='CASCADE'), nullable=False)
@@ -38,6 +31,13 @@ class MyWalletTransaction(Base):
     sell_amount: Mapped[float] = mapped_column(Float)
     price: Mapped[float] = mapped_column(Float, nullable=False)
     timestamp: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP, server_default=func.now())
+    landed_slot: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    landing_latency_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    priority_fee: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)  # micro-lamports за CU
+    # Кошелёк, сделку которого скопировали; нужен для порогов монитора рисков
+    tracked_wallet_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("tracked_wallets.id", ondelete='SET NULL'), nullable=True)
 
 
     bot_wallet: Mapped["BotWallet"] = relationship("BotWallet", back_populates="transactions")
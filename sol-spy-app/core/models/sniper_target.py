@@ -8,6 +8,7 @@ from sqlalchemy import Column, Integer, String, Float, TIMESTAMP, ForeignKey, Bo
 from sqlalchemy.sql import func
 from sqlalchemy.sql import func
 from enum import Enum as PyEnum
+from typing import Optional
 
 
 class Status(PyEnum):
@@ -29,5 +30,9 @@ class SniperTarget(Base):
     status: Mapped[Status] = mapped_column(Enum(Status), default="waiting")  # Статус токена (waiting, bought, failed)
     created_at: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP, default=func.now())  # Дата добавления
     last_checked_at: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP, default=func.now())  # Последняя проверка
+    bot_wallet_id: Mapped[Optional[int]] = mapped_column(ForeignKey("bot_wallets.id", ondelete="SET NULL"),
+                                                         nullable=True)  # Кошелёк, с которого покупаем
+    buy_signature: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
 
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import  Integer, Float, TIMESTAMP, ForeignKey
+from sqlalchemy import  Integer, Float, TIMESTAMP, ForeignKey, Index
 from sqlalchemy.orm import  Mapped, mapped_column
 from sqlalchemy.sql import func
 from core.models.base import Base
@@ -11,6 +11,9 @@ from typing import Optional
 
 class TrackedStatistics(Base):
     __tablename__ = "tracked_statistics"
+    __table_args__ = (
+        Index("ix_tracked_statistics_tracked_wallet_id_created_at", "tracked_wallet_id", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True, autoincrement=True)
     tracked_wallet_id: Mapped[int] = mapped_column(ForeignKey("tracked_wallets.id"), nullable=False)  # Унікальний зовнішній ключ
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import  String, TIMESTAMP, Enum, Float, ForeignKey, Boolean
+from sqlalchemy import  String, TIMESTAMP, Enum, Float, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -27,6 +27,10 @@ class CopyMode(PyEnum):
 
 class TrackedWallet(Base):
     __tablename__ = "tracked_wallets"
+    __table_args__ = (
+        Index("ix_tracked_wallets_wallet_address", "wallet_address"),
+        Index("ix_tracked_wallets_bot_wallet_id", "bot_wallet_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True, autoincrement=True)
     bot_wallet_id: Mapped[int] = mapped_column(ForeignKey("bot_wallets.id"), nullable=False)
@@ -37,6 +41,14 @@ class TrackedWallet(Base):
     created_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP, server_default=func.now())
     last_activity_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP, nullable=True)
     sol_balance: Mapped[float] = mapped_column(Float, nullable=False)
+    # Пороги монитора рисков в процентах от цены входа
+    stop_loss_pct: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    take_profit_pct: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    # Параметры размера копируемых сделок; None — значение из настроек copy_sizing
+    copy_multiplier: Mapped[Optional[float]] = mapped_column(Float, nullable=True)  # COPY_XPERCENT
+    copy_fixed_amount: Mapped[Optional[float]] = mapped_column(Float, nullable=True)  # COPY_FIX, SOL
+    max_trade_sol: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    max_balance_pct: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
 
     transactions: Mapped[list["WalletTransaction"]] = relationship("WalletTransaction", back_populates="tracked_wallet")
 
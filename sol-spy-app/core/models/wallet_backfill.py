@@ -0,0 +1,37 @@
+from datetime import datetime
+from enum import Enum as PyEnum
+from typing import Optional
+
+from sqlalchemy import Enum, ForeignKey, Integer, String, Text, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from core.models.base import Base
+
+
+class BackfillStatus(PyEnum):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class WalletBackfill(Base):
+    """
+    Чекпоинт загрузки истории отслеживаемого кошелька: после перезапуска продолжаем с before_signature.
+    """
+    __tablename__ = "wallet_backfills"
+
+    wallet_id: Mapped[int] = mapped_column(ForeignKey("tracked_wallets.id", ondelete='CASCADE'), primary_key=True)
+    status: Mapped[BackfillStatus] = mapped_column(Enum(BackfillStatus), nullable=False,
+                                                   default=BackfillStatus.PENDING)
+    # Самая старая обработанная подпись — курсор before для следующей страницы
+    before_signature: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    signatures_seen: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    transactions_stored: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    oldest_block_time: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP, server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP, nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, String, Integer, Float
+from sqlalchemy import ForeignKey, String, Integer, Float, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.models.base import Base
@@ -8,6 +8,9 @@ from typing import TYPE_CHECKING, Optional
 
 class WalletToken(Base):
     __tablename__ = "wallet_tokens"
+    __table_args__ = (
+        Index("uq_wallet_tokens_wallet_id_token_address", "wallet_id", "token_address", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True,autoincrement=True)
     wallet_id: Mapped[int] = mapped_column(ForeignKey("tracked_wallets.id", ondelete='CASCADE'), nullable=False)  # Связь с кошельком
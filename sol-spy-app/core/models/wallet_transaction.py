@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, TIMESTAMP, Numeric, ForeignKey, Float,Enum
+from sqlalchemy import Column, Integer, String, TIMESTAMP, Numeric, ForeignKey, Float,Enum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped, mapped_column
 from core.models.base import Base
@@ -22,10 +22,17 @@ class TransactionAction(PyEnum):
 
 class WalletTransaction(Base):
     __tablename__ = "transactions"
+    # Таблица секционирована по месяцам (RANGE по timestamp), поэтому ключ первичного
+    # и уникального ограничений обязан включать timestamp
+    __table_args__ = (
+        Index("ix_transactions_wallet_id_timestamp", "wallet_id", "timestamp", "id"),
+        UniqueConstraint("transaction_hash", "timestamp", name="uq_transactions_transaction_hash_timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True, autoincrement=True)
     wallet_id: Mapped[int] = mapped_column(ForeignKey("tracked_wallets.id", ondelete='CASCADE'), nullable=False)
-    transaction_hash: Mapped[str] = mapped_column(String, nullable=False, unique=True)
+    transaction_hash: Mapped[str] = mapped_column(String, nullable=False)
     transaction_action: Mapped[TransactionAction] = mapped_column(Enum(TransactionAction),
                                                                   nullable=False)  # "buy" или "sell"
     status: Mapped[TransactionStatus] = mapped_column(Enum(TransactionStatus), nullable=False)
@@ -36,7 +43,7 @@ class WalletTransaction(Base):
     transfer_amount: Mapped[float] = mapped_column(Float)
     dex_name: Mapped[str] = mapped_column(String)
     price: Mapped[float] = mapped_column(Numeric(15,8), nullable=True)
-    timestamp: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP, server_default=func.now())
+    timestamp: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP, primary_key=True, server_default=func.now())
 
     tracked_wallet: Mapped["TrackedWallet"] = relationship("TrackedWallet", back_populates="transactions")
 
@@ -0,0 +1,84 @@
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, update
+
+from api.api_init_helper import ApiHelper
+from core.config import settings
+from core.models.bot_wallet import BotWallet
+from core.models.tracked_wallet import TrackedWallet
+
+logger = logging.getLogger(__name__)
+
+
+class BalanceCache:
+    """
+    Последние известные балансы SOL по адресам, чтобы сделки и API не ходили в RPC.
+    """
+
+    def __init__(self):
+        self._balances: dict[str, tuple[float, float]] = {}
+
+    def set_many(self, balances: dict[str, float]) -> None:
+        now = time.monotonic()
+        for address, balance in balances.items():
+            self._balances[address] = (balance, now)
+
+    def get(self, address: str, max_age: Optional[float] = None) -> Optional[float]:
+        entry = self._balances.get(address)
+        if not entry:
+            return None
+        balance, updated_at = entry
+        if max_age is not None and time.monotonic() - updated_at > max_age:
+            return None
+        return balance
+
+
+balance_cache = BalanceCache()
+
+
+class BalanceRefreshService:
+    def __init__(self, session_factory, api_helper: ApiHelper, cache: BalanceCache = balance_cache):
+        self.session_factory = session_factory
+        self.api_helper = api_helper
+        self.cache = cache
+
+    async def refresh_all_balances(self) -> int:
+        """
+        Обновляет sol_balance всех отслеживаемых кошельков и balance всех бот-кошельков
+        пачками getMultipleAccounts и одним bulk UPDATE на таблицу.
+        """
+        async with self.session_factory() as session:
+            tracked = (await session.execute(select(TrackedWallet.id, TrackedWallet.wallet_address))).all()
+            bots = (await session.execute(select(BotWallet.id, BotWallet.token_address))).all()
+
+        addresses = [row.wallet_address for row in tracked] + [row.token_address for row in bots]
+        if not addresses:
+            return 0
+
+        try:
+            balances = await self.api_helper.solana_api.get_balances(
+                addresses, chunk_size=settings.balance_refresh.chunk_size
+            )
+        except ValueError as e:
+            logger.error(f"Не удалось обновить балансы кошельков: {e}")
+            return 0
+        self.cache.set_many(balances)
+
+        now = datetime.utcnow()
+        tracked_rows = [{"id": row.id, "sol_balance": balances[row.wallet_address]}
+                        for row in tracked if row.wallet_address in balances]
+        bot_rows = [{"id": row.id, "balance": balances[row.token_address], "last_updated_at": now}
+                    for row in bots if row.token_address in balances]
+
+        async with self.session_factory() as session:
+            if tracked_rows:
+                await session.execute(update(TrackedWallet), tracked_rows)
+            if bot_rows:
+                await session.execute(update(BotWallet), bot_rows)
+            await session.commit()
+
+        logger.info(f"Балансы обновлены: {len(tracked_rows)} отслеживаемых, {len(bot_rows)} бот-кошельков")
+        return len(balances)
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import func, select, update
+
+from api.transaction_sender import LANDED_STATUSES, PendingTransaction, SendResult, TransactionSender
+from api.transaction_sender import transaction_sender
+from core.config import settings
+from core.dtomodels.parsed_transaction import ParsedTransaction
+from core.models.my_wallet_transaction import MyWalletTransaction, TransactionStatus
+
+logger = logging.getLogger(__name__)
+
+# Blockhash живёт ~150 блоков (около минуты), после этого неподтверждённая транзакция уже не попадёт в блок
+PENDING_EXPIRY = timedelta(minutes=3)
+
+
+class BotTransactionService:
+    """
+    Сделки бота: запись в статусе PENDING сразу после отправки и перевод в SUCCESS/FAILED
+    по результату подтверждения.
+    """
+
+    def __init__(self, session_factory, sender: TransactionSender = transaction_sender):
+        self.session_factory = session_factory
+        self.sender = sender
+        self._tracking: set[asyncio.Task] = set()
+
+    async def create_pending(self, wallet_id: int, pending: PendingTransaction, transaction_details: ParsedTransaction,
+                             tracked_wallet_id: Optional[int] = None) -> None:
+        async with self.session_factory() as session:
+            session.add(MyWalletTransaction(
+                wallet_id=wallet_id,
+                transaction_hash=pending.signature,
+                transaction_action=transaction_details.transaction_action,
+                status=TransactionStatus.PENDING,
+                token_address=transaction_details.token_address,
+                token_symbol=transaction_details.token_symbol,
+                # Обе колонки NOT NULL: сохраняем обе стороны сделки
+                buy_amount=transaction_details.buy_amount or 0.0,
+                sell_amount=transaction_details.sell_amount or 0.0,
+                price=transaction_details.price,
+                priority_fee=pending.priority_fee,
+                tracked_wallet_id=tracked_wallet_id,
+            ))
+            await session.commit()
+        logger.info(f"Сделка бота {pending.signature} сохранена в статусе PENDING")
+
+    def track(self, pending: PendingTransaction) -> asyncio.Task:
+        """
+        В фоне дожидается подтверждения и обновляет статус записи.
+        """
+        task = asyncio.create_task(self._apply_when_done(pending))
+        self._tracking.add(task)
+        task.add_done_callback(self._tracking.discard)
+        return task
+
+    async def _apply_when_done(self, pending: PendingTransaction) -> SendResult:
+        result = await pending.result
+        await self.apply_result(result)
+        return result
+
+    async def apply_result(self, result: SendResult) -> None:
+        async with self.session_factory() as session:
+            await session.execute(
+                update(MyWalletTransaction)
+                .where(MyWalletTransaction.transaction_hash == result.signature)
+                .values(
+                    status=TransactionStatus.SUCCESS if result.landed else TransactionStatus.FAILED,
+                    landed_slot=result.slot,
+                    landing_latency_ms=result.landing_latency_ms,
+                    error=result.error,
+                )
+            )
+            await session.commit()
+
+    async def reconcile_pending(self) -> int:
+        """
+        Добивает записи, зависшие в PENDING (например, после перезапуска): спрашивает статусы
+        с поиском по истории и помечает просроченные как FAILED.
+        """
+        async with self.session_factory() as session:
+            rows = (await session.execute(
+                select(MyWalletTransaction.id, MyWalletTransaction.transaction_hash,
+                       # timestamp ставит сервер (now()), поэтому и срок считаем по его часам
+                       (MyWalletTransaction.timestamp < func.now() - PENDING_EXPIRY).label("expired"))
+                .where(MyWalletTransaction.status == TransactionStatus.PENDING)
+            )).all()
+        rows = [row for row in rows if row.transaction_hash not in self.sender.pending_signatures]
+        if not rows:
+            return 0
+
+        statuses = await self.sender.fetch_statuses([row.transaction_hash for row in rows], search_history=True)
+        landed_statuses = LANDED_STATUSES[settings.sender.commitment]
+        updates = []
+        for row in rows:
+            status = statuses.get(row.transaction_hash)
+            if status and status.get("err"):
+                updates.append({"id": row.id, "status": TransactionStatus.FAILED,
+                                "landed_slot": status.get("slot"), "error": str(status["err"])})
+            elif status and status.get("confirmationStatus") in landed_statuses:
+                updates.append({"id": row.id, "status": TransactionStatus.SUCCESS, "landed_slot": status.get("slot")})
+            elif status:
+                # В блоке, но ещё не достиг нужного commitment: остаётся PENDING до следующей сверки
+                continue
+            elif row.expired:
+                updates.append({"id": row.id, "status": TransactionStatus.FAILED, "error": "not landed"})
+
+        if updates:
+            async with self.session_factory() as session:
+                await session.execute(update(MyWalletTransaction), updates)
+                await session.commit()
+            logger.info(f"Сверка зависших сделок бота: обновлено {len(updates)} из {len(rows)}")
+        return len(updates)
@@ -3,6 +3,7 @@ from sqlalchemy import select
 from api.api_init_helper import api_helper
 from core.models.user import User
 from core.models.bot_wallet import BotWallet
+from core.service.copy_sizing_service import copy_sizing_service
 from core.service.wallet_token_service import WalletTokenService
 from api.api_init_helper import api_helper
 import logging
@@ -47,6 +48,8 @@ class BotWalletService:
                 session.add(new_wallet)
                 await session.commit()
                 await session.refresh(new_wallet)
+                # Активный бот-кошелёк сменился: параметры размера сделок надо перечитать
+                copy_sizing_service.invalidate_user(user.id)
                 logger.info(
                     f"Добавлен новый кошелек: {wallet_data.token_address} для пользователя {new_wallet.user_id}")
                 return new_wallet
@@ -58,16 +61,9 @@ class BotWalletService:
     async def get_users_wallets(self, user: User) -> list[BotWallet] | None:
 
         try:
+            # Баланс берём из базы: его периодически обновляет BalanceRefreshService
             async with self.session_factory() as session:
                 result = await session.execute(select(BotWallet).filter(BotWallet.user_id == user.id))
-                wallets = result.scalars().all()
-                for wallet in wallets:
-                    balance = await api_helper.solana_api.get_balance(wallet.token_address)
-                    wallet.balance = balance
-                    session.add(wallet)
-
-                session.commit()
-
-                return wallets
+                return result.scalars().all()
         except HTTPException as e:
             raise HTTPException(status_code=e.status_code, detail=e.detail)
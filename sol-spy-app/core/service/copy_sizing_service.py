@@ -0,0 +1,173 @@
+import logging
+import math
+from typing import Callable, NamedTuple, Optional
+
+from sqlalchemy import select
+
+from core.config import settings
+from core.db_helper import db_helper
+from core.dtomodels.parsed_transaction import ParsedTransaction
+from core.models.bot_wallet import BotWallet
+from core.models.tracked_wallet import CopyMode, TrackedWallet
+from core.models.wallet_transaction import TransactionAction
+from core.service.balance_refresh_service import BalanceCache, balance_cache
+
+logger = logging.getLogger(__name__)
+
+
+class SizingParams(NamedTuple):
+    tracked_wallet_id: int
+    bot_wallet_id: int
+    bot_wallet_address: str
+    copy_mode: CopyMode
+    multiplier: float
+    fixed_amount: float
+    max_balance_pct: Optional[float]
+    max_trade_sol: Optional[float]
+    # Балансы из БД на момент загрузки: запасной вариант, если в BalanceCache ничего нет
+    bot_balance: float
+    tracked_balance: float
+
+
+class TradeSize(NamedTuple):
+    # Размер для CopyTradingService.execute_trade
+    percentage: float  # BUY — % баланса SOL бота, SELL — % его токенов
+    max_trade_amount: float  # SOL
+    amount: float  # BUY — SOL, SELL — доля позиции бота к продаже
+
+
+# Размер покупки в SOL по доле баланса, потраченной отслеживаемым кошельком, и балансу бота
+BuySizer = Callable[[float, float, SizingParams], float]
+
+
+def size_copy_percent(tracked_fraction: float, bot_balance: float, params: SizingParams) -> float:
+    return bot_balance * tracked_fraction
+
+
+def size_copy_xpercent(tracked_fraction: float, bot_balance: float, params: SizingParams) -> float:
+    return bot_balance * tracked_fraction * params.multiplier
+
+
+def size_copy_fix(tracked_fraction: float, bot_balance: float, params: SizingParams) -> float:
+    return params.fixed_amount
+
+
+BUY_SIZERS: dict[CopyMode, BuySizer] = {
+    CopyMode.COPY_PERCENT: size_copy_percent,
+    CopyMode.COPY_XPERCENT: size_copy_xpercent,
+    CopyMode.COPY_FIX: size_copy_fix,
+}
+
+
+class CopySizingService:
+    """
+    Размер копируемой сделки по режиму CopyMode отслеживаемого кошелька. Параметры подписчика
+    (режим, множитель, фиксированная сумма, ограничения) кешируются по (пользователь, кошелёк) и сбрасываются
+    при их изменении. Доля сделки берётся из балансов подписанта до транзакции, баланс бота — из BalanceCache,
+    так что расчёт размера не ходит в RPC.
+    """
+
+    def __init__(self, session_factory, balances: BalanceCache = balance_cache):
+        self.session_factory = session_factory
+        self.balances = balances
+        self._params: dict[tuple[int, str], SizingParams] = {}
+        # Токены отслеживаемого кошелька по его сигналам: если источник не дал баланс до продажи
+        self._holdings: dict[tuple[str, str], float] = {}
+
+    async def get_params(self, user_id: int, wallet_address: str) -> Optional[SizingParams]:
+        key = (user_id, wallet_address)
+        params = self._params.get(key)
+        if params is not None:
+            return params
+        async with self.session_factory() as session:
+            row = (await session.execute(
+                select(TrackedWallet, BotWallet)
+                .join(BotWallet, BotWallet.id == TrackedWallet.bot_wallet_id)
+                .filter(TrackedWallet.wallet_address == wallet_address,
+                        BotWallet.user_id == user_id, BotWallet.status == True)
+            )).first()
+        if row is None:
+            return None
+        tracked_wallet, bot_wallet = row
+        config = settings.copy_sizing
+        params = SizingParams(
+            tracked_wallet_id=tracked_wallet.id,
+            bot_wallet_id=bot_wallet.id,
+            bot_wallet_address=bot_wallet.token_address,
+            copy_mode=tracked_wallet.copy_mode or CopyMode(config.default_mode),
+            multiplier=tracked_wallet.copy_multiplier if tracked_wallet.copy_multiplier is not None
+            else config.multiplier,
+            fixed_amount=tracked_wallet.copy_fixed_amount if tracked_wallet.copy_fixed_amount is not None
+            else config.fixed_amount,
+            max_balance_pct=tracked_wallet.max_balance_pct if tracked_wallet.max_balance_pct is not None
+            else config.max_balance_pct,
+            max_trade_sol=tracked_wallet.max_trade_sol if tracked_wallet.max_trade_sol is not None
+            else config.max_trade_sol,
+            bot_balance=float(bot_wallet.balance or 0),
+            tracked_balance=tracked_wallet.sol_balance or 0.0,
+        )
+        self._params[key] = params
+        return params
+
+    def invalidate(self, wallet_address: str) -> None:
+        for key in [key for key in self._params if key[1] == wallet_address]:
+            del self._params[key]
+
+    def invalidate_user(self, user_id: int) -> None:
+        for key in [key for key in self._params if key[0] == user_id]:
+            del self._params[key]
+
+    def bot_balance(self, params: SizingParams) -> float:
+        balance = self.balances.get(params.bot_wallet_address, max_age=settings.copy_sizing.balance_max_age_seconds)
+        return params.bot_balance if balance is None else balance
+
+    def _sold_fraction(self, signal: ParsedTransaction, wallet_address: str) -> float:
+        key = (wallet_address, signal.token_address)
+        held = signal.token_balance_before or self._holdings.get(key)
+        if not held or held <= 0:
+            # Неизвестно, сколько было у кошелька: повторяем полный выход
+            self._holdings.pop(key, None)
+            return 1.0
+        remaining = held - signal.sell_amount
+        if remaining > 0:
+            self._holdings[key] = remaining
+        else:
+            self._holdings.pop(key, None)
+        return min(signal.sell_amount / held, 1.0)
+
+    def size(self, signal: ParsedTransaction, wallet_address: str, params: SizingParams) -> Optional[TradeSize]:
+        """
+        Размер сделки бота по сигналу отслеживаемого кошелька или None, если копировать нечего.
+        """
+        if signal.transaction_action == TransactionAction.SELL:
+            fraction = self._sold_fraction(signal, wallet_address)
+            logger.info(f"SELL: {wallet_address} продал {fraction:.2%} позиции {signal.token_address}")
+            # Выход не ограничиваем суммой: иначе на кошельке остаётся хвост позиции
+            return TradeSize(fraction * 100, math.inf, fraction)
+
+        key = (wallet_address, signal.token_address)
+        before = signal.token_balance_before if signal.token_balance_before is not None \
+            else self._holdings.get(key, 0.0)
+        self._holdings[key] = before + signal.buy_amount
+
+        spent = signal.sell_amount
+        tracked_balance = signal.sol_balance_before or self.balances.get(wallet_address) or params.tracked_balance
+        bot_balance = self.bot_balance(params)
+        if not spent or spent <= 0 or bot_balance <= 0:
+            return None
+        tracked_fraction = min(spent / tracked_balance, 1.0) if tracked_balance > 0 else 0.0
+
+        amount = BUY_SIZERS[params.copy_mode](tracked_fraction, bot_balance, params)
+        if params.max_balance_pct is not None:
+            amount = min(amount, bot_balance * params.max_balance_pct / 100)
+        if params.max_trade_sol is not None:
+            amount = min(amount, params.max_trade_sol)
+        amount = min(amount, bot_balance)
+        if amount <= 0:
+            return None
+        logger.info(f"BUY: {params.copy_mode.name}, {wallet_address} потратил {tracked_fraction:.2%} баланса, "
+                    f"покупка на {amount:.4f} SOL из {bot_balance:.4f} SOL")
+        return TradeSize(amount / bot_balance * 100, amount, amount)
+
+
+copy_sizing_service = CopySizingService(db_helper.session_factory)
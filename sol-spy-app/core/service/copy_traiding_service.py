@@ -1,13 +1,22 @@
 
-from typing import Dict
 
 from core.models.bot_wallet import BotWallet
 from core.models.tracked_wallet import FollowMode, TrackedWallet
-from core.models.my_wallet_transaction import TransactionAction, TransactionStatus, MyWalletTransaction
+from api.price_oracle import price_oracle
+from api.transaction_sender import PendingTransaction
+from core.dtomodels.parsed_transaction import ParsedTransaction
+from core.models.my_wallet_transaction import TransactionAction
+from core.config import settings
+from core.service.bot_transaction_service import BotTransactionService
+from core.service.copy_sizing_service import TradeSize, copy_sizing_service
+from core.service.quote_prefetch_service import quote_cache
+from core.service.trade_feed_service import trade_feed_service
 from core.service.wallet_token_service import WalletTokenService
 import base58
 import logging
+import math
 import time
+from typing import Optional
 
 import asyncio
 
@@ -15,9 +24,8 @@ from fastapi import HTTPException
 
 from solders.keypair import Keypair
 
-from sqlalchemy import select, func
+from sqlalchemy import select
 
-from solders.pubkey import Pubkey
 from core.models.user import User
 
 from urllib3.exceptions import DecodeError
@@ -34,11 +42,12 @@ class CopyTradingService:
     def __init__(self, session_factory, api_helper: ApiHelper,user: User):
         self.tracked_wallet_service = TrackedWalletService(session_factory=session_factory, api_heler=api_helper)
         self.wallet_token_service = WalletTokenService(session_factory=session_factory)
+        self.bot_transaction_service = BotTransactionService(session_factory=session_factory)
         self.api_helper = api_helper
         self.session_factory = session_factory
         self.user: User = user
-        self.token_balances = {}  # Для зберігання балансів токенів
         self.our_wallet_address = None  # Ініціалізація адреси гаманця
+        self._keypair: Optional[Keypair] = None
 
 
     async def _load_bot_wallet(self, user: User) -> Keypair:
@@ -57,230 +66,142 @@ class CopyTradingService:
             logger.error(f"Ошибка загрузки ключа: {e}")
             raise ValueError(f"Ошибка загрузки ключа: {e}")
 
-    async def get_wallet_balance(self, wallet_address: str) -> float:
+    async def _bot_keypair(self, bot_wallet_address: Optional[str] = None) -> Keypair:
+        # Ключ читается из БД один раз; перечитываем, если активный бот-кошелёк сменился
+        if self._keypair is None or (bot_wallet_address and str(self._keypair.pubkey()) != bot_wallet_address):
+            self._keypair = await self._load_bot_wallet(self.user)
+        return self._keypair
 
-        try:
-            pubkey = Pubkey.from_string(wallet_address)
-            balance_response = self.api_helper.solana_client.get_balance(pubkey)
-            balance_lamports = balance_response.value
-            balance_sol = balance_lamports / 1_000_000_000  # Конвертация из lamports в SOL
-            logger.info(f"Баланс кошелька {wallet_address}: {balance_sol} SOL")
-            return balance_sol
-        except Exception as e:
-            logger.error(f"Ошибка получения баланса кошелька {wallet_address}: {e}")
-            raise
-
-    async def execute_trade(self, token_address: str, tracked_percentage: float, action: str, price: float,
-                            max_trade_amount: float) -> str:
+    async def execute_trade(self, token_address: str, action: str, price: float, size: TradeSize,
+                            bot_wallet_address: Optional[str] = None,
+                            holding: Optional[tuple[int, int]] = None) -> PendingTransaction:
+        """
+        Отправляет своп бота по размеру из CopySizingService: покупка — на size.amount SOL, продажа — доля
+        size.amount от holding, (raw_amount, decimals) токена на кошельке бота. Если holding не передан,
+        он берётся из снимка QuoteCache, который обновляет prefetch_quotes_job. До отправки сделка
+        не ходит ни в RPC, ни в БД.
+        """
         start_time = time.time()
 
-        bot_keypair = await self._load_bot_wallet(self.user)
+        bot_keypair = await self._bot_keypair(bot_wallet_address)
         bot_wallet_address = str(bot_keypair.pubkey())
-        bot_balance = await self.get_wallet_balance(bot_wallet_address)
-        if bot_balance <= 0:
-            raise ValueError(f"Ваш баланс равен 0")
 
         # Расчёт bot_amount
         if action == TransactionAction.BUY:
-            bot_amount = await self._calculate_buy_amount(tracked_percentage, bot_balance)
-            # Ограничиваем bot_amount значением max_trade_amount
-            bot_amount = min(bot_amount, max_trade_amount)
-            logger.info(
-                f"BUY: Ограниченный объём сделки: {bot_amount:.4f} SOL (max_trade_amount: {max_trade_amount:.4f} SOL)")
+            # Баланс бота и ограничения уже учтены в size
+            bot_amount = size.amount
+            raw_amount = int(bot_amount * 1_000_000_000)
+            if raw_amount <= 0:
+                raise ValueError(f"Рассчитанный объём для покупки {bot_amount} некорректен")
+            logger.info(f"BUY: Объём сделки: {bot_amount:.4f} SOL ({size.percentage:.2f}% баланса)")
         else:  # SELL
-            # Получаем текущий баланс токенов нашего кошелька
-            wallet_token = await self.wallet_token_service.update_wallet_token_balance(
-                wallet_address=bot_wallet_address,
-                token_address=token_address
-            )
-            if not wallet_token or wallet_token.balance <= 0:
-                raise ValueError(f"Баланс токенов {token_address} равен 0 или не найден")
-
-            our_token_balance = wallet_token.balance
-            # Рассчитываем bot_amount как процент от нашего баланса токенов
-            bot_amount = (our_token_balance * tracked_percentage) / 100
-            if bot_amount <= 0:
-                raise ValueError(f"Рассчитанный объём для продажи {bot_amount} некорректен")
-
-            # Проверяем стоимость в SOL, чтобы не превысить max_trade_amount
-            bot_amount_in_sol = bot_amount * price
-            if bot_amount_in_sol > max_trade_amount:
-                bot_amount = max_trade_amount / price
-                logger.info(
-                    f"SELL: Ограниченный объём сделки: {bot_amount:.4f} токенов (эквивалент {max_trade_amount:.4f} SOL, превысил max_trade_amount)")
-            else:
-                logger.info(
-                    f"SELL: Объём сделки: {bot_amount:.4f} токенов ({tracked_percentage:.2f}% от {our_token_balance} токенов), эквивалент {bot_amount_in_sol:.4f} SOL")
+            holding = holding or quote_cache.holding(bot_wallet_address, token_address)
+            if holding is None:
+                raise ValueError(f"Токена {token_address} нет в снимке кошелька {bot_wallet_address}")
+            held_raw, decimals = holding
+            quote_cache.set_decimals(token_address, decimals)
+            raw_amount = int(held_raw * size.amount)
+            if raw_amount <= 0:
+                raise ValueError(f"Рассчитанный объём для продажи {raw_amount} некорректен")
+            bot_amount = raw_amount / 10 ** decimals
+
+            max_trade_amount = size.max_trade_amount
+            if max_trade_amount != math.inf:
+                # Цены из сигнала может не быть: берём последнюю из оракула
+                price = price or price_oracle.latest(token_address)
+                if not price:
+                    raise ValueError(f"Нет цены {token_address} для проверки max_trade_amount")
+                # Проверяем стоимость в SOL, чтобы не превысить max_trade_amount
+                if bot_amount * price > max_trade_amount:
+                    bot_amount = max_trade_amount / price
+                    raw_amount = int(bot_amount * 10 ** decimals)
+                    logger.info(
+                        f"SELL: Ограниченный объём сделки: {bot_amount:.4f} токенов (эквивалент {max_trade_amount:.4f} SOL, превысил max_trade_amount)")
+            logger.info(
+                f"SELL: Объём сделки: {bot_amount:.4f} токенов ({size.amount:.2%} от {held_raw / 10 ** decimals} токенов)")
 
-        # Виконання свопу через Jupiter API
+        # Виконання свопу: котировка из кеша исполняется через Jupiter, иначе — лучшая из площадок
         wsol = "So11111111111111111111111111111111111111112"
         input_mint = wsol if action == TransactionAction.BUY else token_address
         output_mint = token_address if action == TransactionAction.BUY else wsol
+        slippage_bps = settings.quote_prefetch.slippage_bps
 
         try:
-            # Використовуємо Jupiter API для виконання свопу
-            tx_signature = await self.api_helper.jupiter_api.execute_swap(
-                keypair=bot_keypair,  # Передаємо ключ
-                input_mint=input_mint,
-                output_mint=output_mint,
-                amount=bot_amount,  # Кількість у SOL або токенах
-                action=action,
-                slippage_bps=100  # Додаємо параметр ковзного спреду, якщо потрібно
-            )
+            cached = quote_cache.get(token_address, raw_amount, reference_price=price) \
+                if action == TransactionAction.SELL else None
+            if cached:
+                # Котировка продажи уже лежит в кеше: сразу собираем своп
+                logger.info(f"SELL: котировка из кеша, объём {raw_amount} -> {cached.raw_amount}")
+                pending = await self.api_helper.jupiter_api.execute_swap(
+                    keypair=bot_keypair,  # Передаємо ключ
+                    input_mint=input_mint,
+                    output_mint=output_mint,
+                    amount=cached.raw_amount,
+                    action=action,
+                    slippage_bps=slippage_bps,
+                    quote=cached.quote
+                )
+            else:
+                pending = await self.api_helper.quote_router.swap(
+                    bot_keypair, input_mint, output_mint, raw_amount, slippage_bps
+                )
+            if action == TransactionAction.SELL:
+                quote_cache.spend(bot_wallet_address, token_address, cached.raw_amount if cached else raw_amount)
             end_time = time.time()
             logger.info(
-                f"Trade executed: {action} {token_address} for {bot_amount} {'SOL' if action == TransactionAction.BUY else 'tokens'}, time: {end_time - start_time:.4f}s")
-            return tx_signature
+                f"Trade sent: {action} {token_address} for {bot_amount} {'SOL' if action == TransactionAction.BUY else 'tokens'}, time: {end_time - start_time:.4f}s")
+            return pending
         except Exception as e:
             logger.error(f"Ошибка выполнения сделки: {e}")
             raise
 
-    async def _calculate_buy_amount(self, tracked_percentage: float, bot_balance: float) -> float:
-
-        bot_amount = (tracked_percentage / 100) * bot_balance
-        logger.info(
-            f"BUY: Ваш кошелек: баланс {bot_balance:.4f} SOL, покупка на {tracked_percentage:.2f}% = {bot_amount:.4f} SOL")
-
-        min_amount = 0.01
-        if bot_amount < min_amount:
-            bot_amount = min_amount
-            logger.warning(f"Сумма для покупки ({bot_amount:.4f} SOL) меньше минимальной, установлено {min_amount} SOL")
-        if bot_amount > bot_balance:
-            raise ValueError(f"Недостаточно средств: требуется {bot_amount:.4f} SOL, доступно {bot_balance:.4f} SOL")
-        return bot_amount
-
-    async def _calculate_sell_amount(self, token_address: str, tracked_percentage: float) -> float:
-        """Рассчитывает сумму для продажи и проверяет ограничения."""
-        if token_address not in self.token_balances or self.token_balances[token_address] <= 0:
-            raise ValueError(f"SELL: Нет токенов {token_address} для продажи")
-        bot_token_balance = self.token_balances[token_address]
-        bot_amount = (tracked_percentage / 100) * bot_token_balance
-        logger.info(
-            f"SELL: Ваш кошелек: баланс токенов {bot_token_balance}, продажа на {tracked_percentage:.2f}% = {bot_amount} токенов")
-
-        if bot_amount > bot_token_balance:
-            raise ValueError(f"Недостаточно токенов: требуется {bot_amount}, доступно {bot_token_balance}")
-        return bot_amount
-
-    async def process_transaction(self, transaction_details: Dict, wallet_address: str):
+    async def process_transaction(self, transaction_details: ParsedTransaction, wallet_address: str):
         try:
-            if transaction_details["transaction_action"] in [TransactionAction.BUY, TransactionAction.SELL]:
-                token_address = transaction_details["token_address"]
-                action = transaction_details["transaction_action"]
-
-                # Получаем баланс SOL отслеживаемого кошелька
-                tracked_balance = await self.get_wallet_balance(wallet_address)
-                if tracked_balance <= 0:
-                    raise ValueError(f"Баланс отслеживаемого кошелька {wallet_address} равен 0")
-
-                # Получаем баланс нашего депозита (предполагается, что у нас есть метод для нашего кошелька)
-                our_deposit = await self.get_wallet_balance(
-                    self.our_wallet_address)  # Предполагаемый атрибут our_wallet_address
-                if our_deposit <= 0:
-                    raise ValueError(f"Баланс нашего депозита равен 0")
-
-                # Инициализация переменных
-                tracked_percentage = 0.0
-
-                if action == TransactionAction.BUY:
-                    # Для BUY: Сколько SOL потрачено на покупку
-                    tracked_amount = transaction_details["sell_amount"]  # SOL, потраченные на покупку
-                    tracked_percentage = (tracked_amount / tracked_balance) * 100
-                    logger.info(
-                        f"BUY: Отслеживаемый кошелек потратил {tracked_amount:.4f} SOL ({tracked_percentage:.2f}% от баланса {tracked_balance:.4f} SOL)")
-
-                    # Сохраняем количество купленных токенов в token_balances
-                    bought_amount = transaction_details["buy_amount"]
-                    if token_address in self.token_balances:
-                        self.token_balances[token_address] += bought_amount
-                    else:
-                        self.token_balances[token_address] = bought_amount
-                    logger.info(
-                        f"Токен {token_address}: куплено {bought_amount}, новый баланс токенов {self.token_balances[token_address]}")
-
-                elif action == TransactionAction.SELL:
-                    # Получаем текущий баланс токенов на отслеживаемом кошельке через WalletTokenService
-                    wallet_token = await self.wallet_token_service.update_wallet_token_balance(
-                        wallet_address=wallet_address,
-                        token_address=token_address
-                    )
-                    if not wallet_token:
-                        logger.warning(
-                            f"Не удалось получить баланс для {token_address}, токен-аккаунт не найден или ошибка")
-                        return
-
-                    current_tracked_balance = wallet_token.balance
-                    logger.info(
-                        f"Текущий баланс отслеживаемого кошелька для {token_address}: {current_tracked_balance}")
-
-                    # Рассчитываем ранее купленное количество (из self.token_balances)
-                    total_bought = self.token_balances.get(token_address, 0.0)
-                    if total_bought <= 0:
-                        logger.warning(f"SELL: Нет данных о купленных токенах для {token_address}, пропускаем")
-                        return
-
-                    # Рассчитываем проданное количество
-                    sold_amount = total_bought - current_tracked_balance
-                    if sold_amount <= 0:
-                        logger.warning(f"SELL: Отслеживаемый кошелёк не продал токены или баланс не изменился")
-                        return
-
-                    # Рассчитываем процент продажи
-                    tracked_percentage = (sold_amount / total_bought) * 100
-                    logger.info(
-                        f"SELL: Отслеживаемый кошелек продал {sold_amount} токенов ({tracked_percentage:.2f}% от купленных {total_bought})")
-
-                    # Обновляем баланс токенов после продажи
-                    self.token_balances[token_address] -= sold_amount
-                    if self.token_balances[token_address] <= 0:
-                        del self.token_balances[token_address]
-                    logger.info(
-                        f"Токен {token_address}: продано {sold_amount}, новый баланс токенов {self.token_balances.get(token_address, 0)}")
-
-                # Ограничиваем tracked_percentage значением 5%
-                max_allowed_percentage = min(tracked_percentage, 5.0)
-                logger.info(
-                    f"Ограниченный процент для сделки: {max_allowed_percentage:.2f}% (из {tracked_percentage:.2f}%)")
-
-                # Рассчитываем максимальную сумму для нашей сделки (не более 5% депозита)
-                max_trade_amount = (our_deposit * max_allowed_percentage) / 100
-                logger.info(
-                    f"Максимальная сумма сделки: {max_trade_amount:.4f} SOL (5% от депозита {our_deposit:.4f} SOL)")
-
-                # Выполняем сделку, передавая ограниченную сумму
-                tx_signature = await self.execute_trade(
+            if transaction_details.is_trade:
+                token_address = transaction_details.token_address
+                action = transaction_details.transaction_action
+
+                # Размер по CopyMode считается в памяти: параметры подписчика и балансы из кешей
+                params = await copy_sizing_service.get_params(self.user.id, wallet_address)
+                if params is None:
+                    logger.warning(f"Кошелёк {wallet_address} не привязан к активному бот-кошельку пользователя "
+                                   f"{self.user.id}, пропускаем")
+                    return
+                size = copy_sizing_service.size(transaction_details, wallet_address, params)
+                if size is None:
+                    logger.warning(f"{action.name}: нечего копировать по сделке {transaction_details.transaction_hash}")
+                    return
+
+                pending = await self.execute_trade(
                     token_address=token_address,
-                    tracked_percentage=max_allowed_percentage,  # Передаем ограниченный процент
                     action=action,
-                    price=transaction_details["price"],
-                    max_trade_amount=max_trade_amount,  # Передаем максимальную сумму
+                    price=transaction_details.price,
+                    size=size,
+                    bot_wallet_address=params.bot_wallet_address,
                 )
-                transaction_details["transaction_hash"] = tx_signature
-                await self.save_bot_transaction(transaction_details)
+                await self.save_bot_transaction(transaction_details, pending, wallet_address)
 
         except Exception as e:
             logger.error(f"Ошибка обработки транзакции: {e}")
             raise
 
-    async def save_bot_transaction(self, transaction_details: Dict):
+    async def save_bot_transaction(self, transaction_details: ParsedTransaction, pending: PendingTransaction,
+                                   tracked_wallet_address: Optional[str] = None):
+        """
+        Сохраняет сделку как PENDING и в фоне переводит её в SUCCESS/FAILED после подтверждения.
+        """
         try:
-            async with self.session_factory() as session:
-                new_transaction = MyWalletTransaction(
-                    transaction_hash=transaction_details["transaction_hash"],
-                    transaction_action=transaction_details["transaction_action"],
-                    status=TransactionStatus.SUCCESS,
-                    token_address=transaction_details["token_address"],
-                    token_symbol=transaction_details["token_symbol"],
-                    buy_amount=transaction_details["buy_amount"] if transaction_details[
-                                                                        "transaction_action"] == TransactionAction.BUY else None,
-                    sell_amount=transaction_details["sell_amount"] if transaction_details[
-                                                                          "transaction_action"] == TransactionAction.SELL else None,
-                    price=transaction_details["price"],
-                    timestamp=func.now()
-                )
-                session.add(new_transaction)
-                await session.commit()
-                logger.info(f"Transaction saved: {transaction_details['transaction_hash']}")
+            bot_wallet = await self.get_active_bot_wallet(self.user)
+            tracked_wallet_id = None
+            if tracked_wallet_address:
+                async with self.session_factory() as session:
+                    tracked_wallet_id = (await session.execute(
+                        select(TrackedWallet.id).filter(TrackedWallet.wallet_address == tracked_wallet_address,
+                                                        TrackedWallet.bot_wallet_id == bot_wallet.id)
+                    )).scalars().first()
+            await self.bot_transaction_service.create_pending(bot_wallet.id, pending, transaction_details,
+                                                              tracked_wallet_id)
+            self.bot_transaction_service.track(pending)
         except Exception as e:
             logger.error(f"Ошибка сохранения транзакции: {e}")
             raise
@@ -289,20 +210,24 @@ class CopyTradingService:
         """
         Запускает отслеживание кошелька с выполнением сделок.
         """
+        feed_queue = trade_feed_service.subscribe(wallet_address) if settings.bitquery_feed.enabled else None
         try:
             # Устанавливаем статус ACTIVE
             await self.tracked_wallet_service.update_wallet_status(wallet_address, FollowMode.COPY)
             logger.info(f"Запуск отслеживания кошелька {wallet_address} с интервалом {interval_seconds} секунд")
+            # Ключ бота загружаем заранее, чтобы первая копируемая сделка не ждала БД
+            await self._bot_keypair()
             while True:
-                new_transactions = await self.tracked_wallet_service.update_wallet_data(wallet_address)
+                new_transactions = await self._next_transactions(wallet_address, feed_queue, interval_seconds)
                 if new_transactions is None:
                     logger.info(f"За последнее время для кошелька {wallet_address} не найдено новых транзакций")
                     new_transactions = []
                 for tx in new_transactions:
-                    if tx.get("transaction_action") in [TransactionAction.BUY, TransactionAction.SELL]:
+                    if tx.is_trade:
                         await self.process_transaction(tx, wallet_address)
                 logger.info(f"Проверено транзакций: {len(new_transactions)} для кошелька {wallet_address}")
-                await asyncio.sleep(interval_seconds)
+                if not self._feed_active(feed_queue):
+                    await asyncio.sleep(interval_seconds)
         except asyncio.CancelledError:
             await self.tracked_wallet_service.update_wallet_status(wallet_address, FollowMode.MONITOR)
             logger.info(f"Отслеживание кошелька {wallet_address} остановлено")
@@ -310,6 +235,21 @@ class CopyTradingService:
             await self.tracked_wallet_service.update_wallet_status(wallet_address, FollowMode.MONITOR)
             logger.error(f"Ошибка отслеживания кошелька {wallet_address}: {e}")
             raise
+        finally:
+            if feed_queue is not None:
+                trade_feed_service.unsubscribe(wallet_address, feed_queue)
+
+    @staticmethod
+    def _feed_active(feed_queue) -> bool:
+        return feed_queue is not None and trade_feed_service.connected
+
+    async def _next_transactions(self, wallet_address: str, feed_queue, interval_seconds: int):
+        """
+        Новые сделки кошелька: из подписки Bitquery, если она подключена, иначе опросом RPC.
+        """
+        if self._feed_active(feed_queue):
+            return await trade_feed_service.next_transactions(feed_queue, interval_seconds)
+        return await self.tracked_wallet_service.update_wallet_data(wallet_address)
 
     async def get_is_tracking(self, wallet_address: str, user: User) -> bool:
         async with self.session_factory() as session:
@@ -333,6 +273,7 @@ class CopyTradingService:
         logger.info(
             f"Запуск пассивного отслеживания кошелька {wallet_address} с интервалом {interval_seconds} секунд")
 
+        feed_queue = trade_feed_service.subscribe(wallet_address) if settings.bitquery_feed.enabled else None
         try:
 
             while True:
@@ -343,13 +284,14 @@ class CopyTradingService:
                         f"Пассивное отслеживание кошелька {wallet_address} остановлено из-за is_tracking = False")
                     break
 
-                new_transactions = await self.tracked_wallet_service.update_wallet_data(wallet_address)
+                new_transactions = await self._next_transactions(wallet_address, feed_queue, interval_seconds)
 
                 if new_transactions is None:
                     logger.info(f"За последнее время для кошелька {wallet_address} не найдено новых транзакций")
                     new_transactions = []
                 logger.info(f"Проверено транзакций: {len(new_transactions)} для кошелька {wallet_address}")
-                await asyncio.sleep(interval_seconds)
+                if not self._feed_active(feed_queue):
+                    await asyncio.sleep(interval_seconds)
         except asyncio.CancelledError:
             await self.tracked_wallet_service.update_wallet_status(wallet_address, FollowMode.MONITOR)
             logger.info(f"Пассивное отслеживание кошелька {wallet_address} остановлено")
@@ -357,9 +299,12 @@ class CopyTradingService:
             await self.tracked_wallet_service.update_wallet_status(wallet_address, FollowMode.MONITOR)
             logger.error(f"Ошибка пассивного отслеживания кошелька {wallet_address}: {e}")
             raise
+        finally:
+            if feed_queue is not None:
+                trade_feed_service.unsubscribe(wallet_address, feed_queue)
 
 
-    async def get_active_user_wallet(self, user: User) -> str:
+    async def get_active_bot_wallet(self, user: User) -> BotWallet:
         try:
             async with self.session_factory() as session:
 
@@ -376,12 +321,18 @@ class CopyTradingService:
                         detail="Активний гаманець не знайдено"
                     )
 
-                logger.info(f"Активний гаманець для користувача {user.id}: {active_wallet.private_key}")
-                return active_wallet.private_key
+                return active_wallet
 
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Помилка при отриманні активного гаманця для користувача {user.id}: {e}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Помилка при отриманні активного гаманця: {str(e)}"
             )
+
+    async def get_active_user_wallet(self, user: User) -> str:
+        active_wallet = await self.get_active_bot_wallet(user)
+        logger.info(f"Активний гаманець для користувача {user.id}: {active_wallet.token_address}")
+        return active_wallet.private_key
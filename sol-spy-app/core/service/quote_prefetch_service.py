@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import select
+
+from api.api_init_helper import ApiHelper
+from core.config import settings
+from core.models.bot_wallet import BotWallet
+
+logger = logging.getLogger(__name__)
+
+WSOL = "So11111111111111111111111111111111111111112"
+
+
+class CachedQuote(NamedTuple):
+    quote: Dict
+    raw_amount: int
+    price: float  # SOL за токен по котировке
+    fetched_at: float
+
+
+def quote_price(quote: Dict, decimals: int) -> float:
+    return (int(quote["outAmount"]) / 1_000_000_000) / (int(quote["inAmount"]) / 10 ** decimals)
+
+
+class QuoteCache:
+    """
+    Заранее полученные котировки продажи удерживаемых токенов по ключу (mint, корзина объёма).
+    Корзины идут с шагом bucket_step в логарифмической шкале. Котировка из корзины используется
+    только если её объём не больше запрошенного: своп идёт ровно на объём котировки.
+    Здесь же лежат балансы токенов бот-кошельков из последнего снимка: по ним продажа считает объём без RPC.
+    """
+
+    def __init__(self, bucket_step: float = None):
+        self.bucket_step = bucket_step or settings.quote_prefetch.bucket_step
+        self._quotes: dict[tuple[str, int], CachedQuote] = {}
+        self._decimals: dict[str, int] = {}
+        # адрес бот-кошелька -> {mint: raw_amount}
+        self._holdings: dict[str, dict[str, int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._ages: deque = deque(maxlen=1000)
+
+    def bucket(self, raw_amount: int) -> int:
+        return int(math.floor(math.log(raw_amount) / math.log1p(self.bucket_step) + 1e-9))
+
+    def set_decimals(self, mint: str, decimals: int) -> None:
+        self._decimals[mint] = decimals
+
+    def set_holdings(self, address: str, holdings: dict[str, int]) -> None:
+        self._holdings[address] = holdings
+
+    def retain_wallets(self, addresses: set[str]) -> None:
+        for address in [address for address in self._holdings if address not in addresses]:
+            del self._holdings[address]
+
+    def holding(self, address: str, mint: str) -> Optional[tuple[int, int]]:
+        """
+        (raw_amount, decimals) токена на бот-кошельке по последнему снимку или None.
+        """
+        raw_amount = self._holdings.get(address, {}).get(mint)
+        decimals = self._decimals.get(mint)
+        if not raw_amount or decimals is None:
+            return None
+        return raw_amount, decimals
+
+    def spend(self, address: str, mint: str, raw_amount: int) -> None:
+        """
+        Списывает отправленную продажу, чтобы следующая до нового снимка не считалась от старого баланса.
+        """
+        holdings = self._holdings.get(address)
+        if holdings and mint in holdings:
+            remaining = holdings[mint] - raw_amount
+            if remaining > 0:
+                holdings[mint] = remaining
+            else:
+                del holdings[mint]
+
+    def to_raw(self, mint: str, amount: float) -> Optional[int]:
+        decimals = self._decimals.get(mint)
+        return int(amount * 10 ** decimals) if decimals is not None else None
+
+    def put(self, mint: str, quote: Dict) -> CachedQuote:
+        raw_amount = int(quote["inAmount"])
+        cached = CachedQuote(quote, raw_amount, quote_price(quote, self._decimals.get(mint, 0)), time.monotonic())
+        self._quotes[(mint, self.bucket(raw_amount))] = cached
+        return cached
+
+    def peek(self, mint: str, raw_amount: int) -> Optional[CachedQuote]:
+        """
+        Котировка из корзины raw_amount без проверок свежести и учёта попаданий.
+        """
+        return self._quotes.get((mint, self.bucket(raw_amount)))
+
+    def invalidate(self, mint: str, keep: frozenset[int] = frozenset()) -> None:
+        for key in [key for key in self._quotes if key[0] == mint and key[1] not in keep]:
+            del self._quotes[key]
+
+    def retain(self, mints: set[str]) -> None:
+        for key in [key for key in self._quotes if key[0] not in mints]:
+            del self._quotes[key]
+
+    def get(self, mint: str, raw_amount: int, reference_price: Optional[float] = None,
+            max_age: Optional[float] = None) -> Optional[CachedQuote]:
+        """
+        Свежая котировка для корзины raw_amount или None. Котировка считается устаревшей по возрасту
+        и если reference_price (цена из сигнала) ушла дальше price_move_threshold.
+        """
+        config = settings.quote_prefetch
+        max_age = config.max_age_seconds if max_age is None else max_age
+        entry = self._quotes.get((mint, self.bucket(raw_amount))) if raw_amount > 0 else None
+        if entry and entry.raw_amount <= raw_amount:
+            age = time.monotonic() - entry.fetched_at
+            moved = reference_price and entry.price and \
+                abs(reference_price - entry.price) / entry.price > config.price_move_threshold
+            if moved:
+                logger.info(f"Цена {mint} ушла от котировки: {entry.price} -> {reference_price}, сбрасываем кеш")
+                self.invalidate(mint)
+            if age <= max_age and not moved:
+                self.hits += 1
+                self._ages.append(age)
+                return entry
+        self.misses += 1
+        return None
+
+    def stats(self) -> dict:
+        ages = sorted(self._ages)
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._quotes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+            "age_p50_ms": round(ages[len(ages) // 2] * 1000, 1) if ages else None,
+            "age_p95_ms": round(ages[min(len(ages) - 1, int(0.95 * len(ages)))] * 1000, 1) if ages else None,
+        }
+
+
+quote_cache = QuoteCache()
+
+
+class QuotePrefetchService:
+    def __init__(self, session_factory, api_helper: ApiHelper, cache: QuoteCache = quote_cache):
+        self.session_factory = session_factory
+        self.api_helper = api_helper
+        self.cache = cache
+
+    @staticmethod
+    def _prefetch_amounts(raw_amount: int) -> set[int]:
+        return {int(raw_amount * fraction) for fraction in settings.quote_prefetch.sell_fractions
+                if int(raw_amount * fraction) > 0}
+
+    async def prefetch_all(self) -> int:
+        """
+        Обновляет котировки продажи для всех токенов на активных бот-кошельках.
+        """
+        async with self.session_factory() as session:
+            addresses = (await session.execute(
+                select(BotWallet.token_address).where(BotWallet.status == True)
+            )).scalars().all()
+
+        portfolios = await asyncio.gather(*[
+            self.api_helper.helius_api.get_wallet_portfolio(address) for address in addresses
+        ])
+        holdings: dict[str, int] = {}
+        for address, portfolio in zip(addresses, portfolios):
+            if portfolio is None:
+                # Снимок не получен: оставляем прошлые балансы кошелька
+                continue
+            wallet_holdings = {}
+            for mint, token in portfolio.items():
+                if mint == WSOL or not token["raw_amount"]:
+                    continue
+                self.cache.set_decimals(mint, token["decimals"])
+                wallet_holdings[mint] = token["raw_amount"]
+                holdings[mint] = max(holdings.get(mint, 0), token["raw_amount"])
+            self.cache.set_holdings(address, wallet_holdings)
+        self.cache.retain(set(holdings))
+        self.cache.retain_wallets(set(addresses))
+
+        semaphore = asyncio.Semaphore(settings.quote_prefetch.concurrency)
+
+        async def fetch(mint: str, amount: int) -> Optional[Dict]:
+            async with semaphore:
+                try:
+                    return await self.api_helper.jupiter_api.get_swap_quote_for_sell(
+                        mint, WSOL, amount, settings.quote_prefetch.slippage_bps
+                    )
+                except Exception as e:
+                    logger.warning(f"Не удалось получить котировку продажи {amount} {mint}: {e}")
+                    return None
+
+        pairs = [(mint, amount) for mint, raw_amount in holdings.items() for amount in self._prefetch_amounts(raw_amount)]
+        quotes = await asyncio.gather(*[fetch(mint, amount) for mint, amount in pairs])
+
+        stored = 0
+        refreshed: dict[str, set[int]] = {}
+        moved: set[str] = set()
+        for (mint, _), quote in zip(pairs, quotes):
+            if not quote or "outAmount" not in quote:
+                continue
+            # Сравниваем с той же корзиной из прошлого прохода: соседние корзины отличаются на влияние объёма
+            previous = self.cache.peek(mint, int(quote["inAmount"]))
+            cached = self.cache.put(mint, quote)
+            if previous and previous.price and abs(cached.price - previous.price) / previous.price > \
+                    settings.quote_prefetch.price_move_threshold:
+                moved.add(mint)
+            refreshed.setdefault(mint, set()).add(self.cache.bucket(cached.raw_amount))
+            stored += 1
+        for mint in moved:
+            # Цена сдвинулась: корзины этого токена, не обновлённые в этом проходе, сбрасываем
+            self.cache.invalidate(mint, keep=frozenset(refreshed[mint]))
+        logger.info(f"Котировки продажи обновлены: {stored} из {len(pairs)} по {len(holdings)} токенам")
+        return stored
@@ -0,0 +1,299 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from api.amm_engine import AmmQuoteEngine, SolPools, amm_engine
+from api.api_init_helper import ApiHelper, api_helper
+from api.price_oracle import PriceOracle, price_oracle
+from core.config import settings
+from core.db_helper import db_helper
+from core.dtomodels.parsed_transaction import ParsedTransaction
+from core.models.bot_wallet import BotWallet
+from core.models.my_wallet_transaction import MyWalletTransaction, TransactionAction, TransactionStatus
+from core.models.tracked_wallet import TrackedWallet
+from core.models.user import User
+from core.service.copy_sizing_service import TradeSize
+from core.service.copy_traiding_service import CopyTradingService
+
+logger = logging.getLogger(__name__)
+
+WSOL = "So11111111111111111111111111111111111111112"
+
+
+class Position(NamedTuple):
+    bot_wallet_id: int
+    bot_wallet_address: str
+    user_id: int
+    mint: str
+    balance: float  # токены на кошельке
+    raw_balance: int
+    decimals: int
+    entry_price: float  # SOL за токен, средняя по последней серии покупок
+    stop_price: float  # nan — порог не задан
+    take_price: float
+    tracked_wallet_id: Optional[int]
+
+
+def entry_prices(rows) -> dict[tuple[int, str], tuple[float, Optional[int]]]:
+    """
+    Цена входа по успешным сделкам бота, упорядоченным по времени: средняя взвешенная по последней
+    серии покупок (продажа закрывает серию) и отслеживаемый кошелёк последней покупки.
+    """
+    lots: dict[tuple[int, str], list] = {}
+    for wallet_id, mint, action, amount, price, tracked_wallet_id in rows:
+        key = (wallet_id, mint)
+        lot = lots.setdefault(key, [0.0, 0.0, None, False])
+        if action == TransactionAction.SELL:
+            lot[3] = True
+            continue
+        if not amount or not price or amount <= 0 or price <= 0:
+            continue
+        if lot[3]:
+            lot[:] = [0.0, 0.0, None, False]
+        lot[0] += price * amount
+        lot[1] += amount
+        lot[2] = tracked_wallet_id or lot[2]
+    return {key: (cost / amount, tracked_wallet_id)
+            for key, (cost, amount, tracked_wallet_id, _) in lots.items() if amount > 0}
+
+
+class RiskMonitorService:
+    """
+    Stop-loss и take-profit по открытым позициям бот-кошельков. Позиции (баланс, цена входа, пороги)
+    держатся в памяти колонками NumPy и перечитываются раз в sync_seconds. Каждый тик переоценивает
+    все позиции одним векторным проходом по ценам из AmmQuoteEngine и PriceOracle — сам тик в сеть не ходит,
+    резервы пулов пачками обновляет refresh_amm_reserves_job. Сработавшие позиции продаются через execute_trade.
+    """
+
+    def __init__(self, session_factory, api_helper: ApiHelper, engine: AmmQuoteEngine = amm_engine,
+                 oracle: PriceOracle = price_oracle):
+        self.session_factory = session_factory
+        self.api_helper = api_helper
+        self.engine = engine
+        self.oracle = oracle
+        self._positions: list[Position] = []
+        self._mints: list[str] = []
+        self._mint_index = np.empty(0, dtype=np.intp)
+        self._layout: SolPools = engine.sol_pools([])
+        self._stop = np.empty(0)
+        self._take = np.empty(0)
+        self._users: dict[int, User] = {}
+        # Продавец на пользователя: ключ бота загружается из БД один раз
+        self._traders: dict[int, CopyTradingService] = {}
+        # (bot_wallet_id, mint) -> время отправки продажи
+        self._exiting: dict[tuple[int, str], float] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.ticks = 0
+        self.exits = 0
+        self.priced = 0
+        self._tick_ms: deque = deque(maxlen=1000)
+
+    @staticmethod
+    def _limits(tracked_wallet: Optional[TrackedWallet]) -> tuple[Optional[float], Optional[float]]:
+        config = settings.risk_monitor
+        stop_loss, take_profit = config.stop_loss_pct, config.take_profit_pct
+        if tracked_wallet is not None:
+            if tracked_wallet.copy_mode is not None:
+                stop_loss = config.copy_mode_stop_loss_pct.get(tracked_wallet.copy_mode.value, stop_loss)
+                take_profit = config.copy_mode_take_profit_pct.get(tracked_wallet.copy_mode.value, take_profit)
+            if tracked_wallet.stop_loss_pct is not None:
+                stop_loss = tracked_wallet.stop_loss_pct
+            if tracked_wallet.take_profit_pct is not None:
+                take_profit = tracked_wallet.take_profit_pct
+        return stop_loss, take_profit
+
+    async def sync(self) -> int:
+        """
+        Перечитывает позиции: балансы активных бот-кошельков, цены входа из сделок бота и пороги.
+        """
+        async with self.session_factory() as session:
+            bot_wallets = (await session.execute(
+                select(BotWallet).filter(BotWallet.status == True, BotWallet.user_id.is_not(None))
+            )).scalars().all()
+            users = (await session.execute(
+                select(User).filter(User.id.in_({wallet.user_id for wallet in bot_wallets}))
+            )).scalars().all() if bot_wallets else []
+
+        portfolios = await asyncio.gather(*[
+            self.api_helper.helius_api.get_wallet_portfolio(wallet.token_address) for wallet in bot_wallets
+        ])
+        holdings: dict[tuple[int, str], dict] = {}
+        for wallet, portfolio in zip(bot_wallets, portfolios):
+            for mint, token in (portfolio or {}).items():
+                if mint != WSOL and token["raw_amount"] > 0:
+                    holdings[(wallet.id, mint)] = token
+
+        entries, tracked_wallets = {}, {}
+        if holdings:
+            async with self.session_factory() as session:
+                rows = (await session.execute(
+                    select(MyWalletTransaction.wallet_id, MyWalletTransaction.token_address,
+                           MyWalletTransaction.transaction_action, MyWalletTransaction.buy_amount,
+                           MyWalletTransaction.price, MyWalletTransaction.tracked_wallet_id)
+                    .filter(MyWalletTransaction.wallet_id.in_({wallet_id for wallet_id, _ in holdings}),
+                            MyWalletTransaction.token_address.in_({mint for _, mint in holdings}),
+                            MyWalletTransaction.status == TransactionStatus.SUCCESS)
+                    .order_by(MyWalletTransaction.timestamp, MyWalletTransaction.id)
+                )).all()
+                entries = entry_prices(rows)
+                tracked_ids = {tracked_wallet_id for _, tracked_wallet_id in entries.values() if tracked_wallet_id}
+                if tracked_ids:
+                    tracked_wallets = {wallet.id: wallet for wallet in (await session.execute(
+                        select(TrackedWallet).filter(TrackedWallet.id.in_(tracked_ids))
+                    )).scalars().all()}
+
+        wallets = {wallet.id: wallet for wallet in bot_wallets}
+        positions = []
+        for key, token in holdings.items():
+            if key not in entries:
+                # Токен пришёл не покупкой бота: цены входа нет
+                continue
+            entry_price, tracked_wallet_id = entries[key]
+            stop_loss, take_profit = self._limits(tracked_wallets.get(tracked_wallet_id))
+            if stop_loss is None and take_profit is None:
+                continue
+            positions.append(Position(
+                bot_wallet_id=key[0],
+                bot_wallet_address=wallets[key[0]].token_address,
+                user_id=wallets[key[0]].user_id,
+                mint=key[1],
+                balance=token["balance"],
+                raw_balance=token["raw_amount"],
+                decimals=token["decimals"],
+                entry_price=entry_price,
+                stop_price=entry_price * (1 - stop_loss / 100) if stop_loss is not None else math.nan,
+                take_price=entry_price * (1 + take_profit / 100) if take_profit is not None else math.nan,
+                tracked_wallet_id=tracked_wallet_id,
+            ))
+
+        mints = list(dict.fromkeys(position.mint for position in positions))
+        mint_ids = {mint: index for index, mint in enumerate(mints)}
+        self._positions = positions
+        self._mints = mints
+        self._mint_index = np.fromiter((mint_ids[position.mint] for position in positions), dtype=np.intp,
+                                       count=len(positions))
+        self._stop = np.fromiter((position.stop_price for position in positions), dtype=np.float64,
+                                 count=len(positions))
+        self._take = np.fromiter((position.take_price for position in positions), dtype=np.float64,
+                                 count=len(positions))
+        self._users = {user.id: user for user in users}
+        self._traders = {user_id: trader for user_id, trader in self._traders.items() if user_id in self._users}
+        self._exiting = {key: sent_at for key, sent_at in self._exiting.items() if key in holdings}
+
+        # Пулы новых токенов ищем здесь, а не в тике: поиск — это getProgramAccounts
+        semaphore = asyncio.Semaphore(settings.risk_monitor.track_concurrency)
+
+        async def track(mint: str) -> None:
+            async with semaphore:
+                try:
+                    await self.engine.track_mint(mint)
+                except Exception as e:
+                    logger.warning(f"Не удалось найти пулы {mint}: {e}")
+
+        await asyncio.gather(*[track(mint) for mint in mints])
+        self._layout = self.engine.sol_pools(mints)
+        logger.info(f"Монитор рисков: {len(positions)} позиций по {len(mints)} токенам")
+        return len(positions)
+
+    def _prices(self) -> np.ndarray:
+        """
+        Цены всех токенов позиций: по резервам пулов одной векторной операцией,
+        для токенов без свежего пула — последняя цена из оракула.
+        """
+        prices = self.engine.spot_prices(self._layout)
+        max_age = settings.risk_monitor.price_max_age_seconds
+        for index in np.flatnonzero(np.isnan(prices)):
+            prices[index] = self.oracle.latest(self._mints[index], max_age=max_age) or math.nan
+        return prices
+
+    def check(self) -> list[tuple[Position, float]]:
+        """
+        Переоценка всех позиций: цена каждого токена берётся один раз, сравнение с порогами — векторное.
+        """
+        if not self._positions:
+            return []
+        prices = self._prices()
+        self.priced = int(np.count_nonzero(~np.isnan(prices)))
+        current = prices[self._mint_index]
+        # nan в цене или пороге даёт False в обоих сравнениях
+        hit = (current <= self._stop) | (current >= self._take)
+        return [(self._positions[index], float(current[index])) for index in np.flatnonzero(hit)]
+
+    async def tick(self) -> int:
+        started = time.perf_counter()
+        now = time.monotonic()
+        triggered = 0
+        for position, price in self.check():
+            key = (position.bot_wallet_id, position.mint)
+            sent_at = self._exiting.get(key)
+            if sent_at is not None and now - sent_at < settings.risk_monitor.exit_retry_seconds:
+                continue
+            self._exiting[key] = now
+            task = asyncio.create_task(self._exit(position, price))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            triggered += 1
+        self.ticks += 1
+        self._tick_ms.append((time.perf_counter() - started) * 1000)
+        return triggered
+
+    async def _exit(self, position: Position, price: float) -> None:
+        reason = "stop-loss" if price <= position.stop_price else "take-profit"
+        logger.info(f"Монитор рисков: {reason} {position.mint} на кошельке {position.bot_wallet_id}, "
+                    f"цена {price:.10f} SOL, вход {position.entry_price:.10f} SOL")
+        user = self._users.get(position.user_id)
+        if user is None:
+            return
+        service = self._traders.get(position.user_id)
+        if service is None:
+            service = self._traders[position.user_id] = CopyTradingService(self.session_factory, self.api_helper, user)
+        percentage = settings.risk_monitor.sell_percentage
+        try:
+            # Баланс и decimals уже есть в позиции: продажа не перечитывает их перед свопом
+            pending = await service.execute_trade(
+                token_address=position.mint,
+                action=TransactionAction.SELL,
+                price=price,
+                size=TradeSize(percentage, math.inf, percentage / 100),
+                bot_wallet_address=position.bot_wallet_address,
+                holding=(position.raw_balance, position.decimals),
+            )
+            amount = position.balance * percentage / 100
+            await service.save_bot_transaction(ParsedTransaction(
+                transaction_hash=pending.signature,
+                transaction_action=TransactionAction.SELL,
+                token_address=position.mint,
+                buy_amount=amount * price,
+                sell_amount=amount,
+                price=price,
+            ), pending)
+            self.exits += 1
+        except Exception as e:
+            logger.error(f"Монитор рисков: не удалось продать {position.mint} ({reason}): {e}")
+
+    def stats(self) -> dict:
+        tick_ms = sorted(self._tick_ms)
+        return {
+            "positions": len(self._positions),
+            "mints": len(self._mints),
+            "priced_mints": self.priced,
+            "ticks": self.ticks,
+            "exits": self.exits,
+            "exiting": len(self._exiting),
+            "tick_p50_ms": round(tick_ms[len(tick_ms) // 2], 3) if tick_ms else None,
+            "tick_p99_ms": round(tick_ms[min(len(tick_ms) - 1, int(0.99 * len(tick_ms)))], 3) if tick_ms else None,
+        }
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+
+risk_monitor_service = RiskMonitorService(db_helper.session_factory, api_helper)
@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+import base58
+import numpy as np
+from solders.address_lookup_table_account import AddressLookupTableAccount
+from solders.instruction import Instruction
+from solders.keypair import Keypair
+from solders.transaction import VersionedTransaction
+from sqlalchemy import select, update
+
+from api.api_init_helper import ApiHelper, api_helper
+from api.pool_layouts import WSOL
+from api.priority_fee import PriorityFeeEstimator, priority_fee_estimator
+from api.program_log_feed import CREATE, LiquidityEvent, ProgramLogFeed
+from api.swap_builder import BlockhashCache, assemble_message, blockhash_cache
+from api.transaction_sender import PendingTransaction, TransactionSender, transaction_sender
+from core.config import settings
+from core.db_helper import db_helper
+from core.dtomodels.parsed_transaction import ParsedTransaction
+from core.models.bot_wallet import BotWallet
+from core.models.my_wallet_transaction import TransactionAction
+from core.models.sniper_target import SniperTarget, Status
+from core.service.bot_transaction_service import BotTransactionService
+
+logger = logging.getLogger(__name__)
+
+
+class ArmedBuy(NamedTuple):
+    instructions: list[Instruction]
+    lookup_tables: list[AddressLookupTableAccount]
+    priority_fee: int
+    out_amount: int
+    armed_at: float
+
+
+class TargetState:
+    """
+    Цель в памяти: всё, что нужно, чтобы по событию подписать покупку без единого await.
+    """
+    __slots__ = ("id", "mint", "symbol", "liquidity_threshold", "lamports", "bot_wallet_id", "keypair", "decimals",
+                 "liquidity", "armed", "arming", "fired")
+
+    def __init__(self, target: SniperTarget, keypair: Keypair):
+        self.id = target.id
+        self.mint = target.token_address
+        self.symbol = target.symbol
+        self.liquidity_threshold = target.liquidity_threshold
+        self.lamports = int(target.max_buy_amount * 1_000_000_000)
+        self.bot_wallet_id = target.bot_wallet_id
+        self.keypair = keypair
+        self.decimals: Optional[int] = None
+        self.liquidity = 0.0
+        self.armed: Optional[ArmedBuy] = None
+        self.arming = False
+        self.fired = False
+
+
+def load_keypair(private_key: str) -> Keypair:
+    private_key_bytes = base58.b58decode(private_key.strip())
+    if len(private_key_bytes) != 64:
+        raise ValueError("Ожидается 64 байта")
+    return Keypair.from_bytes(private_key_bytes)
+
+
+class SniperService:
+    """
+    Снайпер по SniperTarget: подписка на логи программ по минтам целей, пороги ликвидности
+    проверяются в памяти. Покупка заготавливается заранее (инструкции Jupiter, lookup tables,
+    priority fee) и по событию собирается с закешированным blockhash и подписывается синхронно
+    в обработчике сообщения; в сеть её отправляет TransactionSender. Если заготовки ещё нет
+    (пул только что появился), покупка идёт обычным путём через QuoteRouter.
+    """
+
+    def __init__(self, session_factory, api_helper: ApiHelper, feed: ProgramLogFeed = None,
+                 sender: TransactionSender = None, blockhashes: BlockhashCache = None,
+                 fee_estimator: PriorityFeeEstimator = None):
+        self.session_factory = session_factory
+        self.api_helper = api_helper
+        self.feed = feed or ProgramLogFeed(self.on_event)
+        self.sender = sender or transaction_sender
+        self.blockhashes = blockhashes or blockhash_cache
+        self.fee_estimator = fee_estimator or priority_fee_estimator
+        self.bot_transaction_service = BotTransactionService(session_factory, self.sender)
+        self._targets: dict[str, TargetState] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._latencies: deque = deque(maxlen=settings.sniper.latency_window)
+        self._stats = {"events": 0, "fired_prebuilt": 0, "fired_fallback": 0, "armed": 0, "arm_failures": 0}
+
+    async def add_target(self, user_id: int, token_address: str, liquidity_threshold: float,
+                         max_buy_amount: float) -> SniperTarget:
+        async with self.session_factory() as session:
+            bot_wallet = (await session.execute(
+                select(BotWallet).filter(BotWallet.user_id == user_id, BotWallet.status == True)
+            )).scalars().first()
+            if not bot_wallet:
+                raise ValueError("Активный бот-кошелёк не найден")
+            existing = (await session.execute(
+                select(SniperTarget).filter(SniperTarget.token_address == token_address)
+            )).scalar_one_or_none()
+            if existing:
+                raise ValueError(f"Токен {token_address} уже в списке целей")
+            metadata = await self.api_helper.helius_api.get_token_metadata(token_address)
+            target = SniperTarget(
+                token_address=token_address,
+                name=metadata["name"][:100],
+                symbol=metadata["symbol"][:20],
+                liquidity_threshold=liquidity_threshold,
+                max_buy_amount=max_buy_amount,
+                status=Status.WAITING,
+                bot_wallet_id=bot_wallet.id,
+            )
+            session.add(target)
+            await session.commit()
+            await session.refresh(target)
+        if settings.sniper.enabled:
+            self._spawn(self.sync())
+        return target
+
+    async def get_targets(self, user_id: int) -> list[SniperTarget]:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(SniperTarget).join(BotWallet, BotWallet.id == SniperTarget.bot_wallet_id)
+                .filter(BotWallet.user_id == user_id)
+                .order_by(SniperTarget.created_at.desc())
+            )
+            return list(result.scalars().all())
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def sync(self) -> None:
+        """
+        Сверяет цели в памяти с базой, обновляет подписку и пересобирает устаревшие заготовки покупок.
+        """
+        async with self.session_factory() as session:
+            rows = (await session.execute(
+                select(SniperTarget, BotWallet.private_key)
+                .join(BotWallet, BotWallet.id == SniperTarget.bot_wallet_id)
+                .filter(SniperTarget.status == Status.WAITING)
+            )).all()
+            waiting_ids = [target.id for target, _ in rows]
+            if waiting_ids:
+                await session.execute(
+                    update(SniperTarget).where(SniperTarget.id.in_(waiting_ids))
+                    .values(last_checked_at=datetime.utcnow())
+                )
+                await session.commit()
+
+        targets = {}
+        for target, private_key in rows:
+            state = self._targets.get(target.token_address)
+            if state is None or state.id != target.id:
+                try:
+                    state = TargetState(target, load_keypair(private_key))
+                except ValueError as e:
+                    logger.error(f"Цель {target.token_address}: не удалось загрузить ключ бот-кошелька: {e}")
+                    continue
+            state.liquidity_threshold = target.liquidity_threshold
+            targets[target.token_address] = state
+        # Сработавшие цели держим до записи результата, чтобы повторное событие их не купило
+        targets.update({mint: state for mint, state in self._targets.items() if state.fired})
+        self._targets = targets
+
+        self.feed.set_mints(mint for mint, state in targets.items() if not state.fired)
+        if targets:
+            self.feed.start()
+
+        unknown = [state.mint for state in targets.values() if state.decimals is None]
+        if unknown:
+            metadata = await self.api_helper.helius_api.get_tokens_metadata(unknown)
+            for mint, info in metadata.items():
+                targets[mint].decimals = info["decimals"]
+
+        now = time.monotonic()
+        stale = [state for state in targets.values()
+                 if not state.fired and not state.arming
+                 and (state.armed is None or now - state.armed.armed_at > settings.sniper.rearm_seconds)]
+        await asyncio.gather(*[self._arm(state) for state in stale])
+
+    async def _arm(self, state: TargetState) -> None:
+        state.arming = True
+        try:
+            jupiter = self.api_helper.jupiter_api
+            quote = await jupiter.venue_quote(WSOL, state.mint, state.lamports, settings.sniper.slippage_bps)
+            (instructions, tables), priority_fee = await asyncio.gather(
+                jupiter.prepare_swap(state.keypair.pubkey(), quote.quote),
+                self.fee_estimator.estimate(quote.accounts, settings.sniper.fee_percentile),
+            )
+            state.armed = ArmedBuy(instructions, tables, priority_fee, quote.out_amount, time.monotonic())
+            self._stats["armed"] += 1
+        except Exception as e:
+            # До появления пула маршрута нет — это нормальное состояние ожидающей цели
+            self._stats["arm_failures"] += 1
+            logger.debug(f"Цель {state.mint}: покупка не заготовлена: {e}")
+        finally:
+            state.arming = False
+
+    def _prebuilt_transaction(self, state: TargetState) -> Optional[tuple[VersionedTransaction, int]]:
+        blockhash = self.blockhashes.peek()
+        if state.armed is None or blockhash is None:
+            return None
+        message = assemble_message(state.keypair.pubkey(), state.armed.instructions, blockhash.blockhash,
+                                   state.armed.lookup_tables, state.armed.priority_fee,
+                                   settings.sniper.compute_unit_limit)
+        return VersionedTransaction(message, [state.keypair]), blockhash.last_valid_block_height
+
+    def on_event(self, event: LiquidityEvent) -> None:
+        """
+        Вызывается из цикла чтения подписки: решение и подпись покупки без await.
+        """
+        state = self._targets.get(event.mint)
+        if state is None or state.fired:
+            return
+        self._stats["events"] += 1
+        state.liquidity = event.sol_liquidity
+        if state.liquidity < state.liquidity_threshold:
+            if event.kind == CREATE and not state.arming:
+                # Пул только появился: заготовка под него нужна до того, как ликвидность дойдёт до порога
+                self._spawn(self._arm(state))
+            return
+
+        state.fired = True
+        prebuilt = self._prebuilt_transaction(state)
+        if prebuilt is None:
+            self._stats["fired_fallback"] += 1
+            logger.info(f"Снайпер {event.mint}: ликвидность {event.sol_liquidity} SOL, заготовки нет — покупка через "
+                        f"QuoteRouter")
+            self._spawn(self._buy_fallback(state, event))
+            return
+        transaction, last_valid_block_height = prebuilt
+        latency = time.perf_counter() - event.received_at
+        self._latencies.append(latency)
+        self._stats["fired_prebuilt"] += 1
+        self._spawn(self._send(state, event, transaction, last_valid_block_height))
+        logger.info(f"Снайпер {event.mint}: {event.kind} на {event.venue}, ликвидность {event.sol_liquidity} SOL "
+                    f"(порог {state.liquidity_threshold}), покупка подписана за {latency * 1000:.2f} мс")
+
+    async def _send(self, state: TargetState, event: LiquidityEvent, transaction: VersionedTransaction,
+                    last_valid_block_height: int) -> None:
+        try:
+            pending = await self.sender.send(transaction, last_valid_block_height, state.armed.priority_fee)
+        except Exception as e:
+            await self._finish(state, None, str(e))
+            return
+        await self._record(state, event, pending, state.armed.out_amount)
+
+    async def _buy_fallback(self, state: TargetState, event: LiquidityEvent) -> None:
+        try:
+            pending = await self.api_helper.quote_router.swap(
+                state.keypair, WSOL, state.mint, state.lamports, settings.sniper.slippage_bps)
+        except Exception as e:
+            await self._finish(state, None, str(e))
+            return
+        await self._record(state, event, pending, state.armed.out_amount if state.armed else 0)
+
+    async def _record(self, state: TargetState, event: LiquidityEvent, pending: PendingTransaction,
+                      out_amount: int) -> None:
+        sol_amount = state.lamports / 1_000_000_000
+        token_amount = out_amount / 10 ** (state.decimals if state.decimals is not None else 6)
+        details = ParsedTransaction(pending.signature, TransactionAction.BUY, state.mint, state.symbol,
+                                    buy_amount=token_amount, sell_amount=sol_amount, dex_name=event.venue,
+                                    price=sol_amount / token_amount if token_amount else 0.0)
+        try:
+            await self.bot_transaction_service.create_pending(state.bot_wallet_id, pending, details)
+            self.bot_transaction_service.track(pending)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить покупку снайпера {pending.signature}: {e}")
+        result = await pending.result
+        await self._finish(state, pending.signature, result.error if not result.landed else None)
+
+    async def _finish(self, state: TargetState, signature: Optional[str], error: Optional[str]) -> None:
+        status = Status.FAILED if error else Status.BOUGHT
+        async with self.session_factory() as session:
+            await session.execute(
+                update(SniperTarget).where(SniperTarget.id == state.id)
+                .values(status=status, buy_signature=signature, error=error, last_checked_at=datetime.utcnow())
+            )
+            await session.commit()
+        self._targets.pop(state.mint, None)
+        self.feed.set_mints(mint for mint, target in self._targets.items() if not target.fired)
+        logger.info(f"Снайпер {state.mint}: {status.value}, подпись {signature}, ошибка {error}")
+
+    def stats(self) -> dict:
+        stats = {**self._stats, "targets": len(self._targets),
+                 "armed_targets": sum(state.armed is not None for state in self._targets.values()),
+                 "feed": self.feed.stats()}
+        if self._latencies:
+            latencies = np.fromiter(self._latencies, dtype=np.float64) * 1000
+            stats["detect_to_send_ms"] = {
+                "samples": len(latencies),
+                "p50": round(float(np.percentile(latencies, 50)), 3),
+                "p99": round(float(np.percentile(latencies, 99)), 3),
+                "max": round(float(latencies.max()), 3),
+            }
+        return stats
+
+    async def stop(self) -> None:
+        await self.feed.stop()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+
+sniper_service = SniperService(db_helper.session_factory, api_helper)
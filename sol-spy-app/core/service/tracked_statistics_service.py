@@ -1,69 +1,70 @@
-from datetime import datetime, timedelta, timezone
+import asyncio
+from datetime import timedelta
 from typing import List, Optional
 
-from sqlalchemy import select
+from sqlalchemy import case, func, select
 
+from core.dao.partitions import utc_now
 from core.models.bot_wallet import BotWallet
 from core.models.tracked_wallet import TrackedWallet
 from core.models.tracked_statistics import TrackedStatistics
 import logging
-from core.models.wallet_transaction import WalletTransaction, TransactionAction
+from core.models.wallet_transaction import TransactionAction, WalletTransaction
+from core.service.transaction_archive_service import TransactionArchiveService
 
 logger = logging.getLogger(__name__)
 
 
 class TrackedStatisticsService:
-    def __init__(self, session_factory):
+    def __init__(self, session_factory, archive: TransactionArchiveService = None):
         self.session_factory = session_factory
-
-    async def count_deals(self, wallet: TrackedWallet):
-        try:
-            current_time = datetime.now(timezone.utc)
-            one_hour_ago = current_time - timedelta(hours=1)
-            async with self.session_factory() as session:
-                transactions = (
-                    session.query(WalletTransaction)
-                    .filter(WalletTransaction.wallet_id == wallet.id)
-                    .filter(WalletTransaction.timestamp >= one_hour_ago)
-                    .all()
-                )
-
-                deal_count = sum(
-                    1 for tx in transactions if tx.transaction_action == TransactionAction.BUY.value
-                )
-                return deal_count
-        except Exception as e:
-            session.rollback()
-            raise Exception(f"Помилка при створенні статистики: {str(e)}")
+        self.archive = archive or TransactionArchiveService(session_factory)
 
     async def create_statistics_for_all_wallets(self):
-
+        """
+        Почасовая статистика кошельков. earned_sol считается по всей истории сделок: архивные месяцы —
+        по итогам, записанным при выгрузке, живые секции — одним агрегатом в базе; net_sol_increase
+        и deal_count — за последний час.
+        """
+        hour_ago = utc_now() - timedelta(hours=1)
+        # Получено SOL на продажах минус потрачено на покупках
+        sol_flow = case(
+            (WalletTransaction.transaction_action == TransactionAction.SELL,
+             func.coalesce(WalletTransaction.buy_amount, 0.0)),
+            (WalletTransaction.transaction_action == TransactionAction.BUY,
+             -func.coalesce(WalletTransaction.sell_amount, 0.0)),
+            else_=0.0,
+        )
+        last_hour = WalletTransaction.timestamp >= hour_ago
+        query = (
+            select(
+                TrackedWallet.id,
+                func.coalesce(func.sum(sol_flow), 0.0),
+                func.coalesce(func.sum(sol_flow).filter(last_hour), 0.0),
+                func.count(WalletTransaction.id).filter(
+                    last_hour, WalletTransaction.transaction_action == TransactionAction.BUY),
+            )
+            .outerjoin(WalletTransaction, WalletTransaction.wallet_id == TrackedWallet.id)
+            .group_by(TrackedWallet.id)
+        )
         async with self.session_factory() as session:
-            try:
-
-                # Отримуємо всі tracked_wallets
-                wallets = session.query(TrackedWallet).all()
-
-                for wallet in wallets:
-                    deal_count = await self.count_deals(wallet)
-
-                    average_weekly_deals = deal_count * 7 * 24
-                    net_sol_increase = 0
-
-                    # Створюємо новий запис статистики для цього гаманця
-                    new_stat = TrackedStatistics(
-                        tracked_wallet_id=wallet.id,
-                        deal_count=deal_count,
-                        earned_sol=0,
-                        average_weekly_deals=average_weekly_deals,
-                        net_sol_increase=net_sol_increase
-                    )
-                    session.add(new_stat)
-
-                session.commit()
-            except Exception as e:
-                session.rollback()
-                raise Exception(f"Помилка при створенні статистики: {str(e)}")
+            rows = (await session.execute(query)).all()
+        archived = await asyncio.to_thread(self.archive.archived_net_sol)
+
+        statistics = [
+            TrackedStatistics(
+                tracked_wallet_id=wallet_id,
+                deal_count=deal_count,
+                earned_sol=archived.get(wallet_id, 0.0) + live_net_sol,
+                average_weekly_deals=deal_count * 7 * 24,
+                net_sol_increase=hour_net_sol,
+            )
+            for wallet_id, live_net_sol, hour_net_sol, deal_count in rows
+        ]
+        async with self.session_factory() as session:
+            session.add_all(statistics)
+            await session.commit()
+        logger.info(f"Статистика создана для {len(statistics)} кошельков")
 
     async def get_statistics_for_bot_wallet(self, user, wallet_address: str):
         async with self.session_factory() as session:
@@ -1,21 +1,29 @@
+import base64
 import logging
 import sys
 
-from typing import TYPE_CHECKING
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Iterable, Optional
 
 from solders.rpc.responses import RpcConfirmedTransactionStatusWithSignature
-from sqlalchemy import func, delete
+from sqlalchemy import func, delete, tuple_
+from sqlalchemy.dialects.postgresql import insert
 
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 
 from api.api_init_helper import ApiHelper
+from core.config import settings
+from core.dao.partitions import add_months, ensure_transactions_partitions, month_start, utc_now
+from core.dtomodels.parsed_transaction import ParsedTransaction
 from core.models.bot_wallet import BotWallet
 from core.models.tracked_wallet import TrackedWallet
-from core.models.tracked_wallet import FollowMode
-from core.models.wallet_transaction import WalletTransaction, TransactionStatus
+from core.models.tracked_wallet import CopyMode, FollowMode
+from core.models.wallet_backfill import WalletBackfill
+from core.models.wallet_transaction import WalletTransaction, TransactionAction
 from core.db_helper import db_helper
 from core.models.user import User
+from core.service.copy_sizing_service import copy_sizing_service
 
 if TYPE_CHECKING:
     from core.models.wallet_transaction import WalletTransaction
@@ -24,6 +32,39 @@ logger = logging.getLogger(__name__)
 
 logger.debug(f"Python Path: {sys.path}")
 
+TRANSACTION_EXPORT_COLUMNS = (
+    "id", "wallet_id", "transaction_hash", "transaction_action", "status", "token_address", "token_symbol",
+    "buy_amount", "sell_amount", "transfer_amount", "dex_name", "price", "timestamp",
+)
+
+
+def encode_transaction_cursor(timestamp: datetime, transaction_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{transaction_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_transaction_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, transaction_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(transaction_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
+
+
+def _transaction_filters(wallet_id: int, action: Optional[TransactionAction], token_address: Optional[str],
+                         start: Optional[datetime], end: Optional[datetime]) -> list:
+    filters = [WalletTransaction.wallet_id == wallet_id]
+    if action:
+        filters.append(WalletTransaction.transaction_action == action)
+    if token_address:
+        filters.append(WalletTransaction.token_address == token_address)
+    if start:
+        filters.append(WalletTransaction.timestamp >= start)
+    if end:
+        filters.append(WalletTransaction.timestamp < end)
+    return filters
+
 
 class TrackedWalletService:
     def __init__(self, session_factory, api_heler: ApiHelper):
@@ -68,6 +109,10 @@ class TrackedWalletService:
             # Добавляем кошелёк в сессию
             try:
                 session.add(new_wallet)
+                if settings.wallet_backfill.enabled:
+                    # История загрузится в фоне: WalletBackfillService подхватит чекпоинт из очереди
+                    await session.flush()
+                    session.add(WalletBackfill(wallet_id=new_wallet.id))
                 await session.commit()
             except IntegrityError:
                 await session.rollback()
@@ -87,20 +132,62 @@ class TrackedWalletService:
 
         return tracked_wallets
 
+    @staticmethod
+    async def _store_transactions(session, tracked_wallet: TrackedWallet,
+                                  transactions: Iterable[ParsedTransaction]) -> list[ParsedTransaction]:
+        """
+        Записывает новые транзакции кошелька одним INSERT и возвращает их для копирования.
+        Общий путь для опроса и для потока сделок.
+        """
+        transactions = {transaction.transaction_hash: transaction for transaction in transactions}
+        if not transactions:
+            return []
+        result = await session.execute(
+            select(WalletTransaction.transaction_hash).filter(
+                WalletTransaction.transaction_hash.in_(list(transactions)))
+        )
+        for transaction_hash in result.scalars().all():
+            logger.info(f"Транзакция {transaction_hash} уже существует в БД, пропускаем.")
+            transactions.pop(transaction_hash, None)
+
+        # timestamp — время блока: старые месяцы уже выгружены в архив, а для остальных прошлых
+        # месяцев секции может не быть (задача воркера создаёт только текущую и следующую)
+        current_month = month_start(utc_now())
+        cutoff = add_months(current_month, -settings.archive.retention_months)
+        new_transactions = []
+        for transaction in transactions.values():
+            if transaction.timestamp and month_start(transaction.timestamp) < cutoff:
+                logger.info(f"Транзакция {transaction.transaction_hash} старше срока хранения, пропускаем.")
+                continue
+            new_transactions.append(transaction)
+        if not new_transactions:
+            return []
+
+        oldest = min(transaction.timestamp or utc_now() for transaction in new_transactions)
+        if month_start(oldest) < current_month:
+            await ensure_transactions_partitions(await session.connection(), oldest, current_month)
+        # Ту же транзакцию может параллельно записать живое отслеживание или бэкфилл:
+        # возвращаем только строки, которые вставил именно этот INSERT
+        result = await session.execute(
+            insert(WalletTransaction).on_conflict_do_nothing().returning(WalletTransaction.transaction_hash),
+            ParsedTransaction.to_rows(new_transactions, tracked_wallet.id))
+        inserted = set(result.scalars().all())
+        new_transactions = [transaction for transaction in new_transactions if transaction.transaction_hash in inserted]
+        logger.info(f"Добавлено новых транзакций: {len(new_transactions)}")
+        return new_transactions
+
     async def update_wallet_data(self, wallet_address: str):
 
-        # Получаем данные о кошельке из Solana API
-        balance = await self.api_helper.solana_api.get_balance(wallet_address)
+        # Баланс SOL обновляет BalanceRefreshService пачкой для всех кошельков
         transactions = await self.api_helper.solana_api.get_wallet_transactions(wallet_address, limit=5)
-        print(transactions[0].signature)
         added_transactions = []
+        parsed_transactions = []
 
         # Получаем кошелек из базы данных
         async with self.session_factory() as session:
             result = await session.execute(
                 select(TrackedWallet).filter(TrackedWallet.wallet_address == wallet_address))
             tracked_wallet = result.scalar_one_or_none()
-            print(tracked_wallet.id)
 
             if tracked_wallet.follow_mode != FollowMode.COPY and tracked_wallet.follow_mode != FollowMode.MONITOR:
                 print(
@@ -108,7 +195,6 @@ class TrackedWalletService:
                 return
             if tracked_wallet:
                 # Обновляем данные в сущности
-                tracked_wallet.sol_balance = balance
                 tracked_wallet.last_activity_at = func.now()
 
                 if transactions:
@@ -122,54 +208,23 @@ class TrackedWalletService:
                         try:
                             # Проверяем, существует ли уже транзакция в базе данных
                             result = await session.execute(
-                                select(WalletTransaction).filter(
+                                select(WalletTransaction.id).filter(
                                     WalletTransaction.transaction_hash == str(transaction.signature))
                             )
-                            existing_transaction = result.scalar_one_or_none()
-
-                            # Если транзакция уже есть в БД, используем её данные
-                            if existing_transaction:
+                            if result.first():
                                 logger.info(
                                     f"Транзакция {transaction.signature} уже существует в БД, пропускаем вызов Bitquery.")
                                 continue  # Пропускаем вызов get_transaction_info
-                            else:
-                                transaction_details = await self.api_helper.helius_api.get_transaction_info(
-                                    str(transaction.signature))
-
-                                # Добавляем новую транзакцию в БД
-                                new_transaction = WalletTransaction(
-                                    wallet_id=tracked_wallet.id,
-                                    transaction_hash=transaction_details["transaction_hash"],
-                                    transaction_action=transaction_details["transaction_type"],
-                                    status=TransactionStatus.SUCCESS,
-                                    token_address=transaction_details["token_address"],
-                                    token_symbol=transaction_details["token_symbol"],
-                                    buy_amount=transaction_details["buy_amount"],
-                                    sell_amount=transaction_details["sell_amount"],
-                                    transfer_amount=transaction_details["transfer_amount"],
-                                    dex_name=transaction_details["dex_name"],
-                                    timestamp=func.now()
-                                )
-                                session.add(new_transaction)
-                                logger.info(f"Добавлена новая транзакция: {transaction_details['transaction_hash']}")
-                                # Добавляем транзакцию в список возвращаемых данных
-                                added_transactions.append({
-                                    "transaction_hash": transaction_details["transaction_hash"],
-                                    "transaction_action": transaction_details["transaction_type"],
-                                    "token_address": transaction_details["token_address"],
-                                    "token_symbol": transaction_details["token_symbol"],
-                                    "buy_amount": transaction_details["buy_amount"],
-                                    "sell_amount": transaction_details["sell_amount"],
-                                    "transfer_amount": transaction_details["transfer_amount"],
-                                    "dex_name": transaction_details["dex_name"],
-                                    "timestamp": func.now()
-                                })
+
+                            parsed_transactions.append(await self.api_helper.helius_api.get_transaction_info(
+                                str(transaction.signature)))
 
                         except Exception as e:
                             logger.error(f"Ошибка при обработке транзакции для кошелька {wallet_address}: {e}")
 
                 # Сохраняем все изменения в одной транзакции
                 try:
+                    added_transactions = await self._store_transactions(session, tracked_wallet, parsed_transactions)
                     await session.commit()
                     logger.info(f"Данные для кошелька {wallet_address} обновлены, транзакции обработаны.")
                 except Exception as e:
@@ -179,6 +234,25 @@ class TrackedWalletService:
 
         return added_transactions
 
+    async def ingest_transactions(self, wallet_address: str,
+                                  transactions: list[ParsedTransaction]) -> list[ParsedTransaction]:
+        """
+        Сохраняет уже разобранные транзакции кошелька (например, из подписки Bitquery) тем же путём,
+        что и опрос, и возвращает новые.
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(TrackedWallet).filter(TrackedWallet.wallet_address == wallet_address))
+            tracked_wallet = result.scalars().first()
+            if not tracked_wallet:
+                logger.warning(f"Кошелёк {wallet_address} не отслеживается, сделки из потока пропущены")
+                return []
+
+            tracked_wallet.last_activity_at = func.now()
+            added_transactions = await self._store_transactions(session, tracked_wallet, transactions)
+            await session.commit()
+        return added_transactions
+
     async def get_wallet_by_address(self, wallet_address: str) -> TrackedWallet:
 
         async with self.session_factory() as session:
@@ -213,17 +287,68 @@ class TrackedWalletService:
             await session.commit()
         print(f"Статус кошелька {wallet_address} успешно обновлён на {follow_mode.name}.")
 
-    async def get_wallet_transactions(self, wallet_address: str) -> list[WalletTransaction]:
+    async def get_wallet_transactions(
+            self,
+            wallet_address: str,
+            limit: int = 100,
+            cursor: Optional[str] = None,
+            action: Optional[TransactionAction] = None,
+            token_address: Optional[str] = None,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+    ) -> tuple[list[WalletTransaction], Optional[str]]:
+        """
+        Возвращает страницу транзакций (новые первыми) и курсор следующей страницы.
+        Пагинация по ключу (timestamp, id), без OFFSET.
+        """
         tracked_wallet = await self.get_wallet_by_address(wallet_address)
+        filters = _transaction_filters(tracked_wallet.id, action, token_address, start, end)
+        if cursor:
+            cursor_timestamp, cursor_id = decode_transaction_cursor(cursor)
+            filters.append(
+                tuple_(WalletTransaction.timestamp, WalletTransaction.id) < tuple_(cursor_timestamp, cursor_id)
+            )
+
         async with self.session_factory() as session:
             result = await session.execute(
-                select(WalletTransaction).filter(WalletTransaction.wallet_id == tracked_wallet.id)
+                select(WalletTransaction)
+                .filter(*filters)
+                .order_by(WalletTransaction.timestamp.desc(), WalletTransaction.id.desc())
+                .limit(limit + 1)
             )
-            wallet_transactions = result.scalars().all()
+            wallet_transactions = list(result.scalars().all())
+
+        next_cursor = None
+        if len(wallet_transactions) > limit:
+            wallet_transactions = wallet_transactions[:limit]
+            last = wallet_transactions[-1]
+            next_cursor = encode_transaction_cursor(last.timestamp, last.id)
+        return wallet_transactions, next_cursor
+
+    async def stream_wallet_transactions(
+            self,
+            wallet_id: int,
+            action: Optional[TransactionAction] = None,
+            token_address: Optional[str] = None,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            batch_size: int = 500,
+    ) -> AsyncIterator[dict]:
+        """
+        Отдаёт транзакции кошелька построчно через серверный курсор, не загружая их все в память.
+        """
+        filters = _transaction_filters(wallet_id, action, token_address, start, end)
+        columns = [getattr(WalletTransaction, name) for name in TRANSACTION_EXPORT_COLUMNS]
 
-            if not wallet_transactions:
-                raise ValueError(f"немає трензацій для цього адреса або нема адреса")
-            return wallet_transactions
+        async with self.session_factory() as session:
+            result = await session.stream(
+                select(*columns)
+                .filter(*filters)
+                .order_by(WalletTransaction.timestamp.desc(), WalletTransaction.id.desc())
+                .execution_options(yield_per=batch_size)
+            )
+            async for row in result.mappings():
+                yield dict(row)
 
     async def stop_tracking(self, wallet_address: str, user: User) -> None:
 
@@ -261,6 +386,60 @@ class TrackedWalletService:
                 "невдалось зупинити трекінг"
             )
 
+    async def update_risk_limits(self, wallet_address: str, user: User, stop_loss_pct: Optional[float],
+                                 take_profit_pct: Optional[float]) -> None:
+        """
+        Пороги stop-loss/take-profit для позиций, открытых по сделкам кошелька; None — порог по умолчанию.
+        Монитор рисков подхватит их при следующей синхронизации позиций.
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(TrackedWallet)
+                .filter(
+                    TrackedWallet.wallet_address == wallet_address,
+                    TrackedWallet.bot_wallet_id.in_(
+                        select(BotWallet.id).filter(BotWallet.user_id == user.id)
+                    )
+                )
+            )
+            tracked_wallet = result.scalars().first()
+            if not tracked_wallet:
+                raise ValueError(f"Кошелёк {wallet_address} не найден у пользователя")
+            tracked_wallet.stop_loss_pct = stop_loss_pct
+            tracked_wallet.take_profit_pct = take_profit_pct
+            await session.commit()
+        logger.info(f"Пороги кошелька {wallet_address}: stop-loss {stop_loss_pct}%, take-profit {take_profit_pct}%")
+
+    async def update_copy_settings(self, wallet_address: str, user: User, copy_mode: Optional[CopyMode],
+                                   copy_multiplier: Optional[float], copy_fixed_amount: Optional[float],
+                                   max_trade_sol: Optional[float], max_balance_pct: Optional[float]) -> None:
+        """
+        Режим и ограничения размера копируемых сделок; None — значение по умолчанию из настроек.
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(TrackedWallet)
+                .filter(
+                    TrackedWallet.wallet_address == wallet_address,
+                    TrackedWallet.bot_wallet_id.in_(
+                        select(BotWallet.id).filter(BotWallet.user_id == user.id)
+                    )
+                )
+            )
+            tracked_wallets = result.scalars().all()
+            if not tracked_wallets:
+                raise ValueError(f"Кошелёк {wallet_address} не найден у пользователя")
+            for tracked_wallet in tracked_wallets:
+                tracked_wallet.copy_mode = copy_mode
+                tracked_wallet.copy_multiplier = copy_multiplier
+                tracked_wallet.copy_fixed_amount = copy_fixed_amount
+                tracked_wallet.max_trade_sol = max_trade_sol
+                tracked_wallet.max_balance_pct = max_balance_pct
+            await session.commit()
+        copy_sizing_service.invalidate(wallet_address)
+        logger.info(f"Настройки копирования кошелька {wallet_address}: {copy_mode}, множитель {copy_multiplier}, "
+                    f"сумма {copy_fixed_amount}, лимиты {max_trade_sol} SOL / {max_balance_pct}%")
+
     async def start_tracking(self, wallet_address: str, user: User) -> None:
 
         try:
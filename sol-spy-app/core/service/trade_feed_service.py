@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from typing import Optional
+
+from api.api_init_helper import ApiHelper, api_helper
+from api.bitquery_feed import BitqueryTradeFeed
+from core.db_helper import db_helper
+from core.dtomodels.parsed_transaction import ParsedTransaction
+from core.service.tracked_wallet_service import TrackedWalletService
+
+logger = logging.getLogger(__name__)
+
+
+class TradeFeedService:
+    """
+    Раздаёт сделки из подписки Bitquery циклам отслеживания. Циклы подписываются на свой кошелёк,
+    сделки сохраняются тем же путём, что и при опросе, и новые попадают в очередь слушателя.
+    Пока подписка не подключена, циклы продолжают опрашивать RPC.
+    """
+
+    def __init__(self, session_factory, api_helper: ApiHelper, feed: BitqueryTradeFeed = None):
+        self.tracked_wallet_service = TrackedWalletService(session_factory=session_factory, api_heler=api_helper)
+        self.feed = feed or BitqueryTradeFeed()
+        self._listeners: dict[str, set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.feed.connected
+
+    def subscribe(self, wallet_address: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._listeners.setdefault(wallet_address, set()).add(queue)
+        self.feed.set_wallets(self._listeners)
+        self.feed.start()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, wallet_address: str, queue: asyncio.Queue) -> None:
+        listeners = self._listeners.get(wallet_address, set())
+        listeners.discard(queue)
+        if not listeners:
+            self._listeners.pop(wallet_address, None)
+        self.feed.set_wallets(self._listeners)
+
+    async def run(self) -> None:
+        while True:
+            trade = await self.feed.queue.get()
+            try:
+                added = await self.tracked_wallet_service.ingest_transactions(
+                    trade.wallet_address, [trade.transaction])
+            except Exception as e:
+                logger.error(f"Не удалось сохранить сделку {trade.transaction.transaction_hash} из потока: {e}")
+                continue
+            for queue in self._listeners.get(trade.wallet_address, ()):
+                for transaction in added:
+                    queue.put_nowait(transaction)
+
+    @staticmethod
+    async def next_transactions(queue: asyncio.Queue, timeout: float) -> list[ParsedTransaction]:
+        """
+        Ждёт первую сделку не дольше timeout и забирает всё, что накопилось.
+        """
+        try:
+            transactions = [await asyncio.wait_for(queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while not queue.empty():
+            transactions.append(queue.get_nowait())
+        return transactions
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.feed.stop()
+
+
+trade_feed_service = TradeFeedService(db_helper.session_factory, api_helper)
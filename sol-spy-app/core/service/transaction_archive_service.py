@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, time, timezone
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select, text
+
+from core.config import settings
+from core.dao.partitions import (Partition, add_months, ensure_transactions_partitions, list_transactions_partitions,
+                                 month_start, partition_month)
+from core.models.wallet_transaction import WalletTransaction, TransactionAction, TransactionStatus
+from core.service.tracked_wallet_service import TRANSACTION_EXPORT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+INT_COLUMNS = ("id", "wallet_id")
+FLOAT_COLUMNS = ("buy_amount", "sell_amount", "transfer_amount", "price")
+ENUM_COLUMNS = {"transaction_action": TransactionAction, "status": TransactionStatus}
+
+
+def _column_array(column: str, values: list) -> np.ndarray:
+    if column in INT_COLUMNS:
+        return np.array(values, dtype=np.int64)
+    if column in FLOAT_COLUMNS:
+        return np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+    if column == "timestamp":
+        return np.array(values, dtype="datetime64[us]")
+    if column in ENUM_COLUMNS:
+        return np.array([value.name if value is not None else "" for value in values], dtype=str)
+    return np.array(["" if value is None else value for value in values], dtype=str)
+
+
+def net_sol_by_wallet(arrays: dict) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Чистый поток SOL по кошелькам: получено на продажах минус потрачено на покупках.
+    """
+    action = arrays["transaction_action"]
+    flow = np.where(action == TransactionAction.SELL.name, np.nan_to_num(arrays["buy_amount"]),
+                    np.where(action == TransactionAction.BUY.name, -np.nan_to_num(arrays["sell_amount"]), 0.0))
+    wallet_ids, index = np.unique(arrays["wallet_id"], return_inverse=True)
+    return wallet_ids, np.bincount(index, weights=flow, minlength=len(wallet_ids))
+
+
+def _row_value(column: str, value):
+    if column in INT_COLUMNS:
+        return int(value)
+    if column in FLOAT_COLUMNS:
+        return None if np.isnan(value) else float(value)
+    if column == "timestamp":
+        return value.astype("datetime64[us]").astype(datetime)
+    if column in ENUM_COLUMNS:
+        return ENUM_COLUMNS[column][str(value)] if value else None
+    return str(value) or None
+
+
+class TransactionArchiveService:
+    """
+    Обслуживает месячные секции transactions: создаёт будущие, выгружает старые
+    в сжатые колоночные .npz файлы и читает архив вместе с живыми данными.
+    """
+
+    def __init__(self, session_factory, archive_dir: str = None, retention_months: int = None):
+        self.session_factory = session_factory
+        self.archive_dir = archive_dir or settings.archive.dir
+        self.retention_months = retention_months if retention_months is not None else settings.archive.retention_months
+        # (путь, mtime) -> {wallet_id: net_sol}: архив месяца после выгрузки не меняется
+        self._net_sol_by_month: dict[tuple[str, float], dict[int, float]] = {}
+
+    def archive_path(self, month: date) -> str:
+        return os.path.join(self.archive_dir, f"transactions_{month:%Y_%m}.npz")
+
+    async def ensure_partitions(self, months_ahead: int = 1) -> None:
+        today = datetime.now(timezone.utc)
+        async with self.session_factory() as session:
+            conn = await session.connection()
+            await ensure_transactions_partitions(conn, today, add_months(month_start(today), months_ahead))
+            await session.commit()
+
+    async def archive_old_partitions(self) -> list[str]:
+        """
+        Выгружает секции старше retention_months на диск и отсоединяет их от таблицы.
+        """
+        cutoff = add_months(month_start(datetime.now(timezone.utc)), -self.retention_months)
+        async with self.session_factory() as session:
+            partitions = await list_transactions_partitions(await session.connection())
+
+        archived = []
+        for partition in partitions:
+            if partition.month >= cutoff:
+                continue
+            try:
+                await self._archive_partition(partition)
+                archived.append(partition.name)
+            except Exception as e:
+                logger.error(f"Ошибка архивации секции {partition.name}: {e}", exc_info=True)
+        if archived:
+            logger.info(f"Заархивированы секции transactions: {archived}")
+        return archived
+
+    async def _archive_partition(self, partition: Partition) -> None:
+        columns = {column: [] for column in TRANSACTION_EXPORT_COLUMNS}
+        async with self.session_factory() as session:
+            result = await session.stream(
+                select(*[getattr(WalletTransaction, column) for column in TRANSACTION_EXPORT_COLUMNS])
+                .where(WalletTransaction.timestamp >= partition.month)
+                .where(WalletTransaction.timestamp < add_months(partition.month, 1))
+                .execution_options(yield_per=5000)
+            )
+            async for row in result:
+                for column, value in zip(TRANSACTION_EXPORT_COLUMNS, row):
+                    columns[column].append(value)
+
+        row_count = len(columns["id"])
+        path = self.archive_path(partition.month)
+        await asyncio.to_thread(self._write_archive, path, columns)
+
+        async with self.session_factory() as session:
+            await session.execute(text(f"ALTER TABLE transactions DETACH PARTITION {partition.name}"))
+            await session.execute(text(f"DROP TABLE {partition.name}"))
+            await session.commit()
+        logger.info(f"Секция {partition.name}: {row_count} строк выгружено в {path}")
+
+    @staticmethod
+    def _write_archive(path: str, columns: dict) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = {column: _column_array(column, values) for column, values in columns.items()}
+        # Итог месяца по кошелькам пишем рядом с колонками, чтобы статистика не разбирала строки
+        summary_wallet_id, summary_net_sol = net_sol_by_wallet(arrays)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez_compressed(file, **arrays, summary_wallet_id=summary_wallet_id, summary_net_sol=summary_net_sol)
+        # Проверяем, что файл читается и количество строк совпадает, до удаления секции из базы
+        with np.load(tmp_path) as archive:
+            if len(archive["id"]) != len(arrays["id"]):
+                raise ValueError(f"Архив {tmp_path} повреждён")
+        os.replace(tmp_path, path)
+
+    def _archived_months(self, start: Optional[datetime], end: Optional[datetime]) -> list[date]:
+        if not os.path.isdir(self.archive_dir):
+            return []
+        months = []
+        for file_name in os.listdir(self.archive_dir):
+            if not file_name.endswith(".npz"):
+                continue
+            month = partition_month(file_name[:-len(".npz")])
+            if not month:
+                continue
+            if start and datetime.combine(add_months(month, 1), time()) <= start:
+                continue
+            if end and datetime.combine(month, time()) >= end:
+                continue
+            months.append(month)
+        return sorted(months)
+
+    def load_archived(self, wallet_id: Optional[int] = None, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> list[dict]:
+        rows = []
+        for month in self._archived_months(start, end):
+            with np.load(self.archive_path(month)) as archive:
+                arrays = {column: archive[column] for column in TRANSACTION_EXPORT_COLUMNS}
+            mask = np.ones(len(arrays["id"]), dtype=bool)
+            if wallet_id is not None:
+                mask &= arrays["wallet_id"] == wallet_id
+            if start:
+                mask &= arrays["timestamp"] >= np.datetime64(start, "us")
+            if end:
+                mask &= arrays["timestamp"] < np.datetime64(end, "us")
+            selected = {column: values[mask] for column, values in arrays.items()}
+            for index in range(int(mask.sum())):
+                rows.append({column: _row_value(column, selected[column][index]) for column in selected})
+        return rows
+
+    @staticmethod
+    def _read_net_sol(path: str) -> dict[int, float]:
+        with np.load(path) as archive:
+            if "summary_wallet_id" in archive.files:
+                wallet_ids, net_sol = archive["summary_wallet_id"], archive["summary_net_sol"]
+            else:
+                # Архив записан до появления итогов: считаем по колонкам
+                wallet_ids, net_sol = net_sol_by_wallet({
+                    column: archive[column]
+                    for column in ("wallet_id", "transaction_action", "buy_amount", "sell_amount")
+                })
+        return dict(zip(wallet_ids.tolist(), net_sol.tolist()))
+
+    def archived_net_sol(self) -> dict[int, float]:
+        """
+        Чистый поток SOL по кошелькам за все архивные месяцы. Каждый файл читается один раз.
+        """
+        totals: dict[int, float] = {}
+        for month in self._archived_months(None, None):
+            path = self.archive_path(month)
+            key = (path, os.path.getmtime(path))
+            if key not in self._net_sol_by_month:
+                self._net_sol_by_month[key] = self._read_net_sol(path)
+            for wallet_id, net_sol in self._net_sol_by_month[key].items():
+                totals[wallet_id] = totals.get(wallet_id, 0.0) + net_sol
+        return totals
+
+    async def get_transactions(self, wallet_id: int, start: Optional[datetime] = None,
+                               end: Optional[datetime] = None) -> list[dict]:
+        """
+        История транзакций кошелька по возрастанию времени из архива и из базы —
+        для пересчёта PnL в TrackedStatisticsService не важно, где лежат данные.
+        """
+        archived = await asyncio.to_thread(self.load_archived, wallet_id, start, end)
+
+        query = select(*[getattr(WalletTransaction, column) for column in TRANSACTION_EXPORT_COLUMNS]).where(
+            WalletTransaction.wallet_id == wallet_id
+        )
+        if start:
+            query = query.where(WalletTransaction.timestamp >= start)
+        if end:
+            query = query.where(WalletTransaction.timestamp < end)
+        async with self.session_factory() as session:
+            result = await session.execute(query.order_by(WalletTransaction.timestamp, WalletTransaction.id))
+            live = [dict(row) for row in result.mappings().all()]
+
+        seen = {row["transaction_hash"] for row in live}
+        rows = [row for row in archived if row["transaction_hash"] not in seen] + live
+        rows.sort(key=lambda row: (row["timestamp"], row["id"]))
+        return rows
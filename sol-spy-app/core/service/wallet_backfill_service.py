@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select
+
+from api.api_init_helper import ApiHelper, api_helper
+from core.config import settings
+from core.db_helper import db_helper
+from core.models.tracked_wallet import TrackedWallet
+from core.models.wallet_backfill import BackfillStatus, WalletBackfill
+from core.models.wallet_transaction import WalletTransaction
+from core.service.tracked_wallet_service import TrackedWalletService
+
+logger = logging.getLogger(__name__)
+
+
+class WalletBackfillService:
+    """
+    Загрузка истории новых отслеживаемых кошельков: страницы getSignaturesForAddress от новых к старым
+    с курсором before, параллельный разбор транзакций фоновыми запросами (живое отслеживание
+    в приоритете у лимитера RPC) и запись пачкой вместе с чекпоинтом в одной транзакции БД.
+    Глубина — depth_days от постановки в очередь или max_signatures подписей.
+    """
+
+    def __init__(self, session_factory, api_helper: ApiHelper):
+        self.session_factory = session_factory
+        self.api_helper = api_helper
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    async def resume_pending(self) -> None:
+        """
+        Запускает бэкфиллы из очереди, в том числе прерванные перезапуском, не больше max_wallets одновременно.
+        """
+        self._tasks = {wallet_id: task for wallet_id, task in self._tasks.items() if not task.done()}
+        free = settings.wallet_backfill.max_wallets - len(self._tasks)
+        if free <= 0:
+            return
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(WalletBackfill.wallet_id)
+                .filter(WalletBackfill.status.in_([BackfillStatus.PENDING, BackfillStatus.RUNNING]))
+                .order_by(WalletBackfill.created_at)
+            )
+            wallet_ids = [wallet_id for wallet_id in result.scalars().all() if wallet_id not in self._tasks]
+        for wallet_id in wallet_ids[:free]:
+            self._tasks[wallet_id] = asyncio.create_task(self.run(wallet_id))
+
+    async def run(self, wallet_id: int) -> None:
+        try:
+            await self._backfill(wallet_id)
+        except Exception as e:
+            logger.error(f"Бэкфилл кошелька {wallet_id} прерван: {e}")
+            async with self.session_factory() as session:
+                backfill = await session.get(WalletBackfill, wallet_id)
+                if backfill:
+                    backfill.attempts += 1
+                    backfill.error = str(e)
+                    backfill.updated_at = datetime.utcnow()
+                    # Курсор сохранён, следующий запуск продолжит с той же страницы
+                    backfill.status = BackfillStatus.FAILED \
+                        if backfill.attempts >= settings.wallet_backfill.max_attempts else BackfillStatus.PENDING
+                    await session.commit()
+
+    async def _backfill(self, wallet_id: int) -> None:
+        config = settings.wallet_backfill
+        async with self.session_factory() as session:
+            backfill = await session.get(WalletBackfill, wallet_id)
+            tracked_wallet = await session.get(TrackedWallet, wallet_id)
+            if not backfill or not tracked_wallet:
+                return
+            backfill.status = BackfillStatus.RUNNING
+            await session.commit()
+            wallet_address = tracked_wallet.wallet_address
+            cutoff = (backfill.created_at or datetime.utcnow()) - timedelta(days=config.depth_days)
+            before, seen = backfill.before_signature, backfill.signatures_seen
+        logger.info(f"Бэкфилл кошелька {wallet_address}: с {before or 'последней подписи'}, до {cutoff}")
+
+        while seen < config.max_signatures:
+            page = await self.api_helper.solana_api.get_signatures_page(
+                wallet_address, before=before, limit=min(config.page_size, config.max_signatures - seen),
+                background=True)
+            reached_depth = not page
+            signatures = []
+            for status in page:
+                if status.block_time and datetime.utcfromtimestamp(status.block_time) < cutoff:
+                    reached_depth = True
+                    break
+                signatures.append(status)
+            if signatures:
+                stored = await self._store_page(wallet_id, signatures)
+                before = str(signatures[-1].signature)
+                seen += len(signatures)
+                logger.info(f"Бэкфилл {wallet_address}: обработано {seen} подписей, на странице новых {stored}")
+            if reached_depth:
+                break
+
+        async with self.session_factory() as session:
+            backfill = await session.get(WalletBackfill, wallet_id)
+            backfill.status = BackfillStatus.DONE
+            backfill.error = None
+            backfill.finished_at = backfill.updated_at = datetime.utcnow()
+            await session.commit()
+        logger.info(f"Бэкфилл кошелька {wallet_address} завершён: {seen} подписей")
+
+    async def _store_page(self, wallet_id: int, signatures: list) -> int:
+        hashes = [str(status.signature) for status in signatures]
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(WalletTransaction.transaction_hash).filter(WalletTransaction.transaction_hash.in_(hashes)))
+            existing = set(result.scalars().all())
+
+        # Упавшие транзакции ничего не перевели, их разбор — лишние кредиты
+        parsed = await self.api_helper.helius_api.get_transactions_info(
+            [str(status.signature) for status in signatures
+             if status.err is None and str(status.signature) not in existing],
+            background=True, concurrency=settings.wallet_backfill.concurrency)
+
+        async with self.session_factory() as session:
+            backfill = await session.get(WalletBackfill, wallet_id)
+            tracked_wallet = await session.get(TrackedWallet, wallet_id)
+            added = await TrackedWalletService._store_transactions(session, tracked_wallet, parsed)
+            backfill.before_signature = hashes[-1]
+            backfill.signatures_seen += len(signatures)
+            backfill.transactions_stored += len(added)
+            if signatures[-1].block_time:
+                backfill.oldest_block_time = datetime.utcfromtimestamp(signatures[-1].block_time)
+            backfill.updated_at = datetime.utcnow()
+            await session.commit()
+        return len(added)
+
+    async def get_progress(self, wallet_address: str) -> Optional[WalletBackfill]:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(WalletBackfill).join(TrackedWallet, TrackedWallet.id == WalletBackfill.wallet_id)
+                .filter(TrackedWallet.wallet_address == wallet_address)
+            )
+            return result.scalars().first()
+
+    async def stop(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+
+wallet_backfill_service = WalletBackfillService(db_helper.session_factory, api_helper)
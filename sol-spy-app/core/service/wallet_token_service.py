@@ -1,11 +1,14 @@
+import asyncio
 from asyncio.log import logger
 
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 from typing import Optional
 
 from core.models.tracked_wallet import TrackedWallet
 from core.models.wallet_token import WalletToken
 from api.helius_api import HeliusApi
+from core.config import settings
 from core.db_helper import db_helper
 
 
@@ -18,70 +21,109 @@ class WalletTokenService:
         self.session_factory = session_factory
 
 
+    async def get_wallet_tokens(self, wallet_id: int) -> list[WalletToken]:
+        async with self.session_factory() as session:
+            result = await session.execute(select(WalletToken).filter(WalletToken.wallet_id == wallet_id))
+            return list(result.scalars().all())
+
+    async def get_wallet_token(self, wallet_id: int, token_address: str) -> Optional[WalletToken]:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(WalletToken).filter(
+                    WalletToken.wallet_id == wallet_id,
+                    WalletToken.token_address == token_address
+                )
+            )
+            return result.scalar_one_or_none()
+
+    async def snapshot_wallet_portfolio(self, wallet_id: int, wallet_address: str) -> Optional[int]:
+        """
+        Сверяет все токены кошелька из сети с wallet_tokens и одним upsert применяет
+        только изменившиеся балансы. Возвращает число изменённых строк или None при ошибке RPC.
+        """
+        portfolio = await self.helius_api.get_wallet_portfolio(wallet_address)
+        if portfolio is None:
+            return None
+
+        tokens = {token.token_address: token for token in await self.get_wallet_tokens(wallet_id)}
+        # Символы новых токенов — одной пачкой getMultipleAccounts вместо запроса на каждый
+        unnamed = [mint for mint in portfolio if mint not in tokens or not tokens[mint].token_symbol]
+        metadata = await self.helius_api.get_tokens_metadata(unnamed) if unnamed else {}
+
+        def symbol(mint: str) -> Optional[str]:
+            if mint in metadata:
+                return metadata[mint]["symbol"]
+            return tokens[mint].token_symbol if mint in tokens else None
+
+        changes = [
+            {"wallet_id": wallet_id, "token_address": mint, "balance": data["balance"], "token_symbol": symbol(mint)}
+            for mint, data in portfolio.items()
+            if mint in metadata or tokens.get(mint) is None or tokens[mint].balance != data["balance"]
+        ]
+        # Токены, которых больше нет на кошельке, обнуляем
+        changes.extend(
+            {"wallet_id": wallet_id, "token_address": mint, "balance": 0.0, "token_symbol": token.token_symbol}
+            for mint, token in tokens.items()
+            if mint not in portfolio and token.balance
+        )
+        if not changes:
+            return 0
+
+        statement = insert(WalletToken).values(changes)
+        statement = statement.on_conflict_do_update(
+            index_elements=[WalletToken.wallet_id, WalletToken.token_address],
+            set_={"balance": statement.excluded.balance, "token_symbol": statement.excluded.token_symbol},
+        )
+        async with self.session_factory() as session:
+            await session.execute(statement)
+            await session.commit()
+        logger.info(f"Портфель кошелька {wallet_address}: изменено {len(changes)} токенов из {len(portfolio)}")
+        return len(changes)
+
+    async def snapshot_all_wallets(self, concurrency: int = None) -> int:
+        concurrency = concurrency or settings.portfolio_snapshot.concurrency
+        async with self.session_factory() as session:
+            wallets = (await session.execute(select(TrackedWallet.id, TrackedWallet.wallet_address))).all()
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def snapshot(wallet) -> Optional[int]:
+            async with semaphore:
+                try:
+                    return await self.snapshot_wallet_portfolio(wallet.id, wallet.wallet_address)
+                except Exception as e:
+                    logger.error(f"Ошибка снимка портфеля кошелька {wallet.wallet_address}: {e}")
+                    return None
+
+        results = await asyncio.gather(*[snapshot(wallet) for wallet in wallets])
+        return sum(result for result in results if result)
+
     async def update_wallet_token_balance(self, wallet_address: str, token_address: str) -> Optional[WalletToken]:
         try:
-            # 1. Создаём сессию через db_helper
             async with self.session_factory() as session:
-                # 2. Проверяем, существует ли кошелёк в таблице tracked_wallets
                 result = await session.execute(
                     select(TrackedWallet).filter(TrackedWallet.wallet_address == wallet_address)
                 )
                 existing_wallet = result.scalar_one_or_none()
 
-                if not existing_wallet:
-                    logger.error(f"Кошелёк с адресом {wallet_address} не найден в tracked_wallets")
-                    return None
-
-                wallet_id = existing_wallet.id
-
-                # 3. Получаем данные о балансе токена через Helius API
-                token_data = await self.helius_api.get_token_balance(wallet_address, token_address)
-                logger.info(f"Получены данные о токене {token_address} для кошелька {wallet_address}: {token_data}")
-
-                if not token_data:
-                    logger.error(f"Не удалось получить данные о токене {token_address} для кошелька {wallet_address}")
-                    return None
+            if not existing_wallet:
+                logger.error(f"Кошелёк с адресом {wallet_address} не найден в tracked_wallets")
+                return None
 
-                # 4. Извлекаем необходимые поля
-                balance = token_data.get("balance", 0.0)
-                token_symbol = token_data.get("symbol", None)
+            if await self.snapshot_wallet_portfolio(existing_wallet.id, wallet_address) is None:
+                logger.error(f"Не удалось получить данные о токене {token_address} для кошелька {wallet_address}")
+                return None
 
-                # 5. Ищем существующую запись в базе данных
-                wallet_token = await session.execute(
-                    select(WalletToken).filter(
-                        WalletToken.wallet_id == wallet_id,
-                        WalletToken.token_address == token_address
-                    )
-                )
-                wallet_token = wallet_token.scalar_one_or_none()
-
-                if wallet_token:
-                    # 6. Если запись существует, обновляем её
-                    wallet_token.balance = balance
-                    wallet_token.token_symbol = token_symbol if token_symbol else wallet_token.token_symbol
-                    logger.info(
-                        f"Обновлена запись в wallet_tokens: wallet_id={wallet_id}, token_address={token_address}, balance={balance}")
-                else:
-                    # 7. Если записи нет, создаём новую
-                    wallet_token = WalletToken(
-                        wallet_id=wallet_id,
-                        token_address=token_address,
-                        token_symbol=token_symbol,
-                        balance=balance
-                    )
+            wallet_token = await self.get_wallet_token(existing_wallet.id, token_address)
+            if wallet_token and not wallet_token.token_symbol:
+                metadata = await self.helius_api.get_token_metadata(token_address)
+                async with self.session_factory() as session:
+                    wallet_token.token_symbol = metadata.get("symbol")
                     session.add(wallet_token)
-                    logger.info(
-                        f"Создана новая запись в wallet_tokens: wallet_id={wallet_id}, token_address={token_address}, balance={balance}")
-
-                # 8. Коммитим изменения
-                await session.commit()
-                await session.refresh(wallet_token)
-                return wallet_token
+                    await session.commit()
+            return wallet_token
 
         except Exception as e:
             logger.error(
                 f"Ошибка при обновлении баланса токена {token_address} для кошелька {wallet_address}: {str(e)}")
-            # Откатываем изменения в случае ошибки
-            async with db_helper.session_factory() as session:
-                await session.rollback()
-            return None
\ No newline at end of file
+            return None
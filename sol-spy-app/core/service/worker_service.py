@@ -1,15 +1,33 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
+from api.amm_engine import amm_engine
+from api.api_init_helper import api_helper
+from api.rpc_router import rpc_router
+from api.swap_builder import blockhash_cache, lookup_table_cache
+from core.config import settings
 from core.db_helper import db_helper
 from core.models.tracked_statistics import TrackedStatistics
+from core.service.balance_refresh_service import BalanceRefreshService
+from core.service.bot_transaction_service import BotTransactionService
+from core.service.quote_prefetch_service import QuotePrefetchService
+from core.service.risk_monitor_service import risk_monitor_service
 from core.service.tracked_statistics_service import TrackedStatisticsService
+from core.service.transaction_archive_service import TransactionArchiveService
+from core.service.sniper_service import sniper_service
+from core.service.wallet_backfill_service import wallet_backfill_service
+from core.service.wallet_token_service import WalletTokenService
 
 
 class WorkerService:
     def __init__(self, scheduler: AsyncIOScheduler):
         self.scheduler = scheduler
         self.tracked_statistics = TrackedStatisticsService(db_helper.session_factory)
+        self.transaction_archive = TransactionArchiveService(db_helper.session_factory)
+        self.balance_refresh = BalanceRefreshService(db_helper.session_factory, api_helper)
+        self.wallet_tokens = WalletTokenService(db_helper.session_factory)
+        self.bot_transactions = BotTransactionService(db_helper.session_factory)
+        self.quote_prefetch = QuotePrefetchService(db_helper.session_factory, api_helper)
 
     def setup_jobs(self):
         self.scheduler.add_job(
@@ -18,6 +36,107 @@ class WorkerService:
             id="check_expired_subscriptions_job",
             replace_existing=True
         )
+        self.scheduler.add_job(
+            self.transaction_archive.ensure_partitions,
+            trigger=IntervalTrigger(hours=24, timezone="UTC"),
+            id="ensure_transactions_partitions_job",
+            replace_existing=True
+        )
+        self.scheduler.add_job(
+            self.transaction_archive.archive_old_partitions,
+            trigger=IntervalTrigger(hours=24, timezone="UTC"),
+            id="archive_transactions_partitions_job",
+            replace_existing=True
+        )
+        self.scheduler.add_job(
+            self.balance_refresh.refresh_all_balances,
+            trigger=IntervalTrigger(seconds=settings.balance_refresh.interval_seconds, timezone="UTC"),
+            id="refresh_wallet_balances_job",
+            replace_existing=True,
+            max_instances=1
+        )
+        self.scheduler.add_job(
+            rpc_router.refresh_slots,
+            trigger=IntervalTrigger(seconds=settings.rpc.slot_refresh_seconds, timezone="UTC"),
+            id="refresh_rpc_slots_job",
+            replace_existing=True,
+            max_instances=1
+        )
+        self.scheduler.add_job(
+            blockhash_cache.refresh,
+            trigger=IntervalTrigger(seconds=settings.swap_builder.blockhash_refresh_seconds, timezone="UTC"),
+            id="refresh_blockhash_job",
+            replace_existing=True,
+            max_instances=1
+        )
+        self.scheduler.add_job(
+            lookup_table_cache.refresh,
+            trigger=IntervalTrigger(seconds=settings.swap_builder.lookup_table_refresh_seconds, timezone="UTC"),
+            id="refresh_lookup_tables_job",
+            replace_existing=True,
+            max_instances=1
+        )
+        self.scheduler.add_job(
+            amm_engine.refresh,
+            trigger=IntervalTrigger(seconds=settings.amm_engine.refresh_seconds, timezone="UTC"),
+            id="refresh_amm_reserves_job",
+            replace_existing=True,
+            max_instances=1
+        )
+        self.scheduler.add_job(
+            self.quote_prefetch.prefetch_all,
+            trigger=IntervalTrigger(seconds=settings.quote_prefetch.interval_seconds, timezone="UTC"),
+            id="prefetch_sell_quotes_job",
+            replace_existing=True,
+            max_instances=1
+        )
+        self.scheduler.add_job(
+            self.bot_transactions.reconcile_pending,
+            trigger=IntervalTrigger(seconds=settings.sender.reconcile_interval_seconds, timezone="UTC"),
+            id="reconcile_bot_transactions_job",
+            replace_existing=True,
+            max_instances=1
+        )
+        self.scheduler.add_job(
+            self.wallet_tokens.snapshot_all_wallets,
+            trigger=IntervalTrigger(seconds=settings.portfolio_snapshot.interval_seconds, timezone="UTC"),
+            id="snapshot_wallet_portfolios_job",
+            replace_existing=True,
+            max_instances=1
+        )
+        if settings.wallet_backfill.enabled:
+            self.scheduler.add_job(
+                wallet_backfill_service.resume_pending,
+                trigger=IntervalTrigger(seconds=settings.wallet_backfill.interval_seconds, timezone="UTC"),
+                id="resume_wallet_backfills_job",
+                replace_existing=True,
+                max_instances=1
+            )
+
+        if settings.sniper.enabled:
+            self.scheduler.add_job(
+                sniper_service.sync,
+                trigger=IntervalTrigger(seconds=settings.sniper.sync_seconds, timezone="UTC"),
+                id="sync_sniper_targets_job",
+                replace_existing=True,
+                max_instances=1
+            )
+
+        if settings.risk_monitor.enabled:
+            self.scheduler.add_job(
+                risk_monitor_service.sync,
+                trigger=IntervalTrigger(seconds=settings.risk_monitor.sync_seconds, timezone="UTC"),
+                id="sync_risk_positions_job",
+                replace_existing=True,
+                max_instances=1
+            )
+            self.scheduler.add_job(
+                risk_monitor_service.tick,
+                trigger=IntervalTrigger(seconds=settings.risk_monitor.tick_seconds, timezone="UTC"),
+                id="check_risk_limits_job",
+                replace_existing=True,
+                max_instances=1
+            )
 
     async def start(self):
 
@@ -4,14 +4,18 @@ from contextlib import asynccontextmanager
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+from api.decode_executor import decode_executor, loop_lag_monitor
 from api.helius_api import HeliusApi
+from api.transaction_cache import transaction_cache
 from api.jupiter_api import JupiterAPI
 from api.routers import bot_wallet_route
+from api.routers import sniper_route
 from api.routers import tracked_wallet_route
 from api.routers import copy_traiding_route
 from api.routers import tracked_statistics_route
 from api.routers import user_route
 from core.config import settings
+from core.dao.migrations import run_migrations
 from core.db_helper import db_helper
 import uvicorn
 from fastapi import FastAPI
@@ -19,8 +23,13 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from api import router as api_router
 from core.service.tracked_statistics_service import TrackedStatisticsService
+from core.service.trade_feed_service import trade_feed_service
+from core.service.risk_monitor_service import risk_monitor_service
+from core.service.sniper_service import sniper_service
+from core.service.wallet_backfill_service import wallet_backfill_service
 from core.service.worker_service import WorkerService
 from api.api_init_helper import api_helper
+from api.rpc_router import rpc_router
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -32,8 +41,10 @@ worker_service = WorkerService(scheduler)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Application started")
+    await run_migrations()
     worker_service.setup_jobs()
     await worker_service.start()
+    loop_lag_monitor.start()
     input_mint="So11111111111111111111111111111111111111112"
     output_mint="Exms4qnKb7GtnPXom1Z4fWn1MnyX46jkcmAy3RWxpump"
     hh= await api_helper.jupiter_api.get_swap_quote_for_buy(input_mint,output_mint,5)
@@ -47,6 +58,14 @@ async def lifespan(app: FastAPI):
     yield
     # shutdown
     print("dispose engine")
+    await trade_feed_service.stop()
+    await sniper_service.stop()
+    await risk_monitor_service.stop()
+    await wallet_backfill_service.stop()
+    await loop_lag_monitor.stop()
+    decode_executor.shutdown()
+    await rpc_router.close()
+    await transaction_cache.close()
     await db_helper.dispose()
 
 
@@ -77,6 +96,7 @@ main_app.include_router(user_route.router, prefix=settings.api.prefix)
 main_app.include_router(bot_wallet_route.router, prefix=settings.api.prefix)
 
 main_app.include_router(tracked_statistics_route.router, prefix=settings.api.prefix)
+main_app.include_router(sniper_route.router, prefix=settings.api.prefix)
 
 if __name__ == '__main__':
     uvicorn.run('main:main_app',
@@ -0,0 +1,140 @@
+"""
+Задержка event loop при бэкфилле: разбор в event loop против DecodeExecutor. Нагрузка синтетическая —
+HeliusApi.get_transactions_info страницами тянет большие ответы getTransaction (jsonParsed) с локальной
+заглушки RPC в отдельном процессе, пока LoopLagMonitor меряет, насколько опаздывает loop. Ответ — фикстура
+из tests/fixtures/transactions, раздутая логами до --size-kib. Результаты разбора в обоих режимах сверяются.
+
+Запуск из sol-spy-app: python -m tests.bench_decode_executor [--transactions 1000] [--size-kib 170] [--workers 2]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import time
+
+from api.decode_executor import LoopLagMonitor, decode_executor
+from api.helius_api import HeliusApi
+from api.rpc_router import RpcEndpoint, RpcRouter
+from core.config import settings
+from tests.stubs import TRANSACTION_FIXTURES, StubRpc
+
+FIXTURE = TRANSACTION_FIXTURES / "raydium_amm_v4_buy.json"
+
+
+def transaction_body(size_kib: int) -> bytes:
+    with open(FIXTURE, encoding="utf-8") as f:
+        result = json.load(f)["result"]
+    # Большие бэкфилл-ответы раздуты в основном логами программ и списками аккаунтов
+    line = "Program log: " + "x" * 240
+    base = len(json.dumps(result))
+    result["meta"]["logMessages"] += [line] * max(0, (size_kib * 1024 - base) // (len(line) + 4))
+    return json.dumps({"jsonrpc": "2.0", "id": 1, "result": result}).encode()
+
+
+def serve_rpc(port: int, size_kib: int) -> None:
+    """
+    Заглушка RPC в отдельном процессе: её отдача ответов не должна попадать в замер задержки loop.
+    """
+    async def serve() -> None:
+        rpc = StubRpc()
+        rpc.results["getTransaction"] = transaction_body(size_kib)
+        await rpc.start(port)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_server(url: str, router: RpcRouter) -> None:
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            await router.request_raw("getTransaction", ["warmup"], hedge=False)
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Заглушка RPC не поднялась на {url}")
+            await asyncio.sleep(0.1)
+
+
+async def backfill(api: HeliusApi, signatures: list[str], page: int) -> tuple[list, float]:
+    started = time.perf_counter()
+    transactions = []
+    for i in range(0, len(signatures), page):
+        transactions += await api.get_transactions_info(signatures[i:i + page], background=True)
+    return transactions, time.perf_counter() - started
+
+
+async def measure(api: HeliusApi, signatures: list[str], page: int, interval: float) -> tuple[list, float, dict]:
+    monitor = LoopLagMonitor(interval=interval, window=1_000_000)
+    monitor.start()
+    await asyncio.sleep(interval * 5)
+    transactions, elapsed = await backfill(api, signatures, page)
+    # Даём монитору проснуться: иначе задержка от последней пачки не попадёт в выборку
+    await asyncio.sleep(interval * 5)
+    await monitor.stop()
+    return transactions, elapsed, monitor.stats()
+
+
+async def run(args) -> None:
+    settings.transaction_cache.enabled = False
+    settings.rpc.hedge_reads = False
+    port = args.port or free_port()
+    url = f"http://127.0.0.1:{port}/"
+    server = multiprocessing.Process(target=serve_rpc, args=(port, args.size_kib), daemon=True)
+    server.start()
+    router = RpcRouter([RpcEndpoint("stub", url, 1_000_000)])
+    try:
+        await wait_for_server(url, router)
+        api = HeliusApi(api_token="stub", router=router)
+        signatures = [f"{index:012d}".ljust(88, "x") for index in range(args.transactions)]
+        size_kib = len(transaction_body(args.size_kib)) // 1024
+        print(f"CPU: {os.cpu_count()}, транзакций: {args.transactions} по {size_kib} KiB, страница {args.page}, "
+              f"замер задержки каждые {args.interval * 1000:.0f} мс")
+
+        idle = LoopLagMonitor(interval=args.interval, window=1_000_000)
+        idle.start()
+        await asyncio.sleep(1)
+        await idle.stop()
+        print(f"{'без нагрузки':>22}: задержка {idle.stats()}")
+
+        results = {}
+        for name, workers in (("в event loop", 0), (f"пул из {args.workers}", args.workers)):
+            decode_executor.shutdown()
+            decode_executor.workers = workers
+            transactions, elapsed, lag = await measure(api, signatures, args.page, args.interval)
+            results[name] = transactions
+            print(f"{name:>22}: {len(transactions) / elapsed:7.1f} tx/s, задержка loop mean {lag['mean_ms']} мс, "
+                  f"p99 {lag['p99_ms']} мс, max {lag['max_ms']} мс")
+        decode_executor.shutdown()
+
+        inline, pooled = results.values()
+        assert inline == pooled, "разбор в пуле расходится с разбором в event loop"
+        assert all(transaction.transaction_action.name == "BUY" for transaction in inline), inline[:3]
+        print(f"Результаты совпадают: {decode_executor.stats()}")
+    finally:
+        await router.close()
+        server.terminate()
+        server.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Задержка event loop при бэкфилле: event loop против пула")
+    parser.add_argument("--transactions", type=int, default=1000)
+    parser.add_argument("--size-kib", type=int, default=170)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--interval", type=float, default=0.01, help="период замера задержки, с")
+    parser.add_argument("--port", type=int)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
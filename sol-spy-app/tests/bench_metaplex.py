@@ -0,0 +1,57 @@
+"""
+Замер decode_metadata и decode_token_info на корпусе аккаунтов. Корпус по умолчанию синтетический, как
+в tests/test_metaplex.py; реальные аккаунты можно передать через --corpus: JSON-список base64-строк
+или сохранённый ответ getMultipleAccounts (encoding base64) — каждый из них сначала разбирается.
+
+Запуск из sol-spy-app: python -m tests.bench_metaplex [--accounts 5000] [--corpus file.json]
+"""
+import argparse
+import base64
+import json
+import time
+
+from api.metaplex import decode_metadata, decode_token_info
+from tests.test_metaplex import build_corpus
+
+
+def load_corpus(path: str) -> list[bytes]:
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    if isinstance(payload, dict):
+        payload = [account["data"][0] for account in payload["result"]["value"] if account]
+    return [base64.b64decode(item) for item in payload]
+
+
+def throughput(function, items: list, seconds: float) -> float:
+    done, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        for item in items:
+            function(item)
+        done += len(items)
+    return done / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Замер decode_metadata")
+    parser.add_argument("--accounts", type=int, default=5000, help="размер синтетического корпуса")
+    parser.add_argument("--corpus", help="JSON с base64-аккаунтами Metadata")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if args.corpus:
+        buffers = load_corpus(args.corpus)
+        for data in buffers:
+            decode_metadata(data)
+        print(f"Корпус {args.corpus}: {len(buffers)} аккаунтов разобраны")
+    else:
+        buffers = [data for data, _ in build_corpus(args.accounts)]
+
+    rate = throughput(decode_metadata, buffers, args.seconds)
+    print(f"decode_metadata: {rate:,.0f} аккаунтов/с ({1e6 / rate:.2f} мкс/аккаунт), корпус {len(buffers)}")
+    payloads = [("mint", base64.b64encode(data).decode(), None) for data in buffers]
+    rate = throughput(decode_token_info, payloads, args.seconds)
+    print(f"decode_token_info (base64 + разбор): {rate:,.0f} аккаунтов/с ({1e6 / rate:.2f} мкс/аккаунт)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Сравнение ParsedTransaction со словарями, которые раньше ходили между парсером, записью в БД и циклом
+копирования: память на удержание пачки транзакций, пиковые аллокации пути "разбор -> строки INSERT ->
+новые транзакции для копирования" и время этого пути.
+
+Запуск из sol-spy-app: python -m tests.bench_parsed_transaction [--count 100000]
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from core.dtomodels.parsed_transaction import ParsedTransaction
+from core.models.wallet_transaction import TransactionAction, TransactionStatus
+
+MINT = "7GCihgDB8fe6KNjn2MYtkzZcRjQy3t9GHdC8uHYmW2hr"
+BLOCK_TIME = datetime(2025, 3, 1, 12, 0, 0)
+
+
+def signature(index: int) -> str:
+    # Длина как у base58-подписи Solana (87-88 символов)
+    return f"{index:012d}".ljust(88, "x")
+
+
+def parse_dict(index: int) -> dict:
+    # Как helius_api.get_transaction_info до ParsedTransaction
+    return {
+        "transaction_type": "BUY",
+        "token_address": MINT,
+        "token_symbol": "TOKEN",
+        "buy_amount": 1234.5 + index,
+        "sell_amount": 0.25,
+        "transfer_amount": 0.0,
+        "dex_name": "Raydium",
+        "transaction_hash": signature(index),
+    }
+
+
+def parse_slotted(index: int) -> ParsedTransaction:
+    # Как transaction_classifier: основные поля позиционно, остальные по имени
+    return ParsedTransaction(signature(index), TransactionAction.BUY, MINT, "TOKEN", 1234.5 + index, 0.25,
+                             dex_name="Raydium", price=0.25 / (1234.5 + index), timestamp=BLOCK_TIME)
+
+
+def pipeline_dict(count: int) -> list[dict]:
+    """
+    Старый путь: словарь парсера, словарь полей для строки и копия словаря для цикла копирования.
+    """
+    added = []
+    rows = []
+    for index in range(count):
+        details = parse_dict(index)
+        rows.append({
+            "wallet_id": 1,
+            "transaction_hash": details["transaction_hash"],
+            "transaction_action": details["transaction_type"],
+            "status": TransactionStatus.SUCCESS,
+            "token_address": details["token_address"],
+            "token_symbol": details["token_symbol"],
+            "buy_amount": details["buy_amount"],
+            "sell_amount": details["sell_amount"],
+            "transfer_amount": details["transfer_amount"],
+            "dex_name": details["dex_name"],
+            "timestamp": BLOCK_TIME,
+        })
+        added.append({
+            "transaction_hash": details["transaction_hash"],
+            "transaction_action": details["transaction_type"],
+            "token_address": details["token_address"],
+            "token_symbol": details["token_symbol"],
+            "buy_amount": details["buy_amount"],
+            "sell_amount": details["sell_amount"],
+            "transfer_amount": details["transfer_amount"],
+            "dex_name": details["dex_name"],
+            "timestamp": BLOCK_TIME,
+        })
+    del rows
+    return added
+
+
+def pipeline_slotted(count: int) -> list[ParsedTransaction]:
+    """
+    Новый путь: один ParsedTransaction, строки INSERT из to_rows, тот же объект уходит в цикл копирования.
+    """
+    parsed = [parse_slotted(index) for index in range(count)]
+    rows = ParsedTransaction.to_rows(parsed, 1)
+    del rows
+    return parsed
+
+
+def retained_bytes(factory, count: int) -> int:
+    """
+    Байты, удерживаемые count объектами вместе с их строками и числами.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(index) for index in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return after - before
+
+
+def peak_bytes(pipeline, count: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = pipeline(count)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return peak
+
+
+def best_time(pipeline, count: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        pipeline(count)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Python {sys.version.split()[0]}, транзакций: {args.count}")
+    print(f"sys.getsizeof: dict {sys.getsizeof(parse_dict(0))} B, "
+          f"ParsedTransaction {sys.getsizeof(parse_slotted(0))} B")
+    results = {}
+    for name, factory, pipeline in (("dict", parse_dict, pipeline_dict),
+                                    ("ParsedTransaction", parse_slotted, pipeline_slotted)):
+        retained = retained_bytes(factory, args.count)
+        peak = peak_bytes(pipeline, args.count)
+        elapsed = best_time(pipeline, args.count, args.repeat)
+        results[name] = (retained, peak, elapsed)
+        print(f"{name:>18}: удержание {retained / args.count:7.1f} B/транзакцию, "
+              f"пик пути {peak / 2 ** 20:7.1f} MiB, путь {elapsed * 1e6 / args.count:6.2f} мкс/транзакцию")
+
+    old, new = results["dict"], results["ParsedTransaction"]
+    print(f"ParsedTransaction/dict: удержание {new[0] / old[0]:.2f}, пик {new[1] / old[1]:.2f}, "
+          f"время {new[2] / old[2]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
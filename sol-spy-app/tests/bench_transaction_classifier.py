@@ -0,0 +1,84 @@
+"""
+Замер classify_transaction на ответах getTransaction (jsonParsed) из tests/fixtures/transactions: пропускная
+способность разбора уже разобранного JSON и пути DecodeExecutor (тело ответа JSON-RPC -> ParsedTransaction).
+Верность разбора проверяет tests/test_transaction_classifier.py.
+
+Запуск из sol-spy-app:
+    python -m tests.bench_transaction_classifier [--seconds 2]
+    python -m tests.bench_transaction_classifier record <подпись> <имя> --rpc <url> — записать новую фикстуру
+"""
+import argparse
+import json
+import sys
+import time
+import urllib.request
+
+from api.transaction_classifier import classify_payload, classify_transaction
+from tests.stubs import TRANSACTION_FIXTURES, load_transaction_fixtures
+from tests.test_transaction_classifier import actual_fields
+
+
+def throughput(function, items: list, seconds: float) -> float:
+    done, started = 0, time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for item in items:
+            function(item)
+        done += len(items)
+    return done / (time.perf_counter() - started)
+
+
+def bench(args) -> None:
+    fixtures = load_transaction_fixtures()
+    if not fixtures:
+        sys.exit(f"Нет фикстур в {TRANSACTION_FIXTURES}")
+    parsed_items = [(fixture["signature"], fixture["result"]) for fixture in fixtures]
+    payloads = [(fixture["signature"], json.dumps({"jsonrpc": "2.0", "id": 1, "result": fixture["result"]}).encode(),
+                 False) for fixture in fixtures]
+    rate = throughput(lambda item: classify_transaction(item[0], item[1], oracle=None), parsed_items, args.seconds)
+    print(f"classify_transaction: {rate:,.0f} tx/s ({1e6 / rate:.1f} мкс/tx), фикстур: {len(fixtures)}")
+    rate = throughput(classify_payload, payloads, args.seconds)
+    print(f"classify_payload (json.loads + разбор + сжатие для кэша): {rate:,.0f} tx/s ({1e6 / rate:.1f} мкс/tx)")
+
+
+def record(args) -> None:
+    """
+    Сохраняет ответ getTransaction как фикстуру; expected — текущий разбор, его нужно проверить вручную.
+    """
+    request = urllib.request.Request(args.rpc, method="POST", headers={"Content-Type": "application/json"},
+                                     data=json.dumps({"jsonrpc": "2.0", "id": 1, "method": "getTransaction",
+                                                      "params": [args.signature, {
+                                                          "encoding": "jsonParsed", "commitment": "finalized",
+                                                          "maxSupportedTransactionVersion": 0}]}).encode())
+    with urllib.request.urlopen(request, timeout=30) as response:
+        result = json.load(response).get("result")
+    if not result:
+        sys.exit(f"Транзакция {args.signature} не найдена")
+    parsed = classify_transaction(args.signature, result, oracle=None)
+    expected = {field: value for field, value in actual_fields(parsed).items() if value is not None}
+    path = TRANSACTION_FIXTURES / f"{args.name}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"description": args.description or args.name, "signature": args.signature, "expected": expected,
+                   "result": result}, f, indent=1, ensure_ascii=False)
+        f.write("\n")
+    print(f"Записано {path}: {expected}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Фикстуры и замер classify_transaction")
+    parser.add_argument("--seconds", type=float, default=2.0, help="длительность каждого замера")
+    commands = parser.add_subparsers(dest="command")
+    recorder = commands.add_parser("record", help="записать ответ getTransaction как фикстуру")
+    recorder.add_argument("signature")
+    recorder.add_argument("name")
+    recorder.add_argument("--rpc", required=True)
+    recorder.add_argument("--description")
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args)
+    else:
+        bench(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Общие заглушки для проверок и замеров: aiohttp-сервер на свободном порту, Solana JSON-RPC поверх него
+и записанные ответы getTransaction из fixtures/transactions.
+"""
+import asyncio
+import json
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from aiohttp import web
+
+TRANSACTION_FIXTURES = Path(__file__).parent / "fixtures" / "transactions"
+
+
+def load_transaction_fixtures() -> list[dict]:
+    """
+    Ответы getTransaction (jsonParsed) с ожидаемым разбором; name — имя файла без расширения.
+    """
+    fixtures = []
+    for path in sorted(TRANSACTION_FIXTURES.glob("*.json")):
+        with open(path, encoding="utf-8") as f:
+            fixture = json.load(f)
+        fixture["name"] = path.stem
+        fixtures.append(fixture)
+    return fixtures
+
+
+class StubServer:
+    """
+    aiohttp-приложение на 127.0.0.1; маршруты добавляются в self.app до start().
+    """
+
+    def __init__(self):
+        self.app = web.Application()
+        self.url = ""
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self, port: int = 0) -> None:
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+
+class StubRpc(StubServer):
+    """
+    Заглушка Solana JSON-RPC на POST /. results задаёт ответ по методу: значение поля result, функция
+    от params или готовое тело ответа байтами. Остальные методы отвечают {"node": name, "method": method},
+    getSlot — текущим slot. delay, http_status и error меняют поведение на лету.
+    """
+
+    def __init__(self, name: str = "stub", slot: int = 1000):
+        super().__init__()
+        self.name = name
+        self.slot = slot
+        self.results: dict[str, Any] = {}
+        self.calls: Counter = Counter()
+        self.delay = 0.0
+        self.http_status = 200
+        self.error: Optional[dict] = None
+        self.app.router.add_post("/", self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        method = payload["method"]
+        self.calls[method] += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.http_status != 200:
+            return web.Response(status=self.http_status, text="stub failure")
+        if self.error is not None:
+            return web.json_response({"jsonrpc": "2.0", "id": payload["id"], "error": self.error})
+        result = self.results.get(method)
+        if isinstance(result, bytes):
+            return web.Response(body=result, content_type="application/json")
+        if callable(result):
+            result = result(payload["params"])
+        elif method not in self.results:
+            result = self.slot if method == "getSlot" else {"node": self.name, "method": method}
+        return web.json_response({"jsonrpc": "2.0", "id": payload["id"], "result": result})
+
+    def reset(self) -> None:
+        self.delay, self.http_status, self.error = 0.0, 200, None
+        self.calls.clear()
+
+
+async def wait_until(predicate: Callable[[], bool], timeout: float = 5.0, what: str = "") -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError(f"не дождались: {what}")
+        await asyncio.sleep(0.005)
@@ -0,0 +1,222 @@
+"""
+BitqueryTradeFeed на локальной заглушке GraphQL over WebSocket (протокол graphql-transport-ws): одна подписка
+на все кошельки, разбор ног DEXTrades, пропуск ног без SOL, отсечение повторов по подписи, пересоздание подписки
+при смене кошельков, переподключение после обрыва и вытеснение старых сделок из заполненной очереди.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+import pytest
+from aiohttp import WSMsgType, web
+from solders.keypair import Keypair
+
+from api.bitquery_api import SOL_MINT
+from api.bitquery_feed import BitqueryTradeFeed
+from core.config import settings
+from core.models.wallet_transaction import TransactionAction
+from tests.stubs import StubServer, wait_until
+
+
+class StubBitquery(StubServer):
+    """
+    Заглушка потокового API Bitquery: принимает подписки и по команде отдаёт сделки всем активным.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.subscriptions: asyncio.Queue[list[str]] = asyncio.Queue()
+        self._active: dict[str, tuple[web.WebSocketResponse, web.Request]] = {}
+        self.app.router.add_get("/graphql", self.websocket)
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws{self.url[len('http'):]}/graphql"
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(protocols=("graphql-transport-ws",))
+        await ws.prepare(request)
+        async for raw in ws:
+            if raw.type != WSMsgType.TEXT:
+                continue
+            message = json.loads(raw.data)
+            kind = message.get("type")
+            if kind == "connection_init":
+                await ws.send_json({"type": "connection_ack"})
+            elif kind == "ping":
+                await ws.send_json({"type": "pong"})
+            elif kind == "subscribe":
+                self._active[message["id"]] = (ws, request)
+                await self.subscriptions.put(sorted(message["payload"]["variables"]["wallets"]))
+            elif kind == "complete":
+                self._active.pop(message["id"], None)
+        for key in [key for key, (active, _) in self._active.items() if active is ws]:
+            del self._active[key]
+        return ws
+
+    async def push(self, *dex_trades: dict) -> None:
+        payload = {"data": {"Solana": {"DEXTrades": list(dex_trades)}}}
+        for subscription_id, (ws, _) in list(self._active.items()):
+            await ws.send_json({"type": "next", "id": subscription_id, "payload": payload})
+
+    async def drop(self) -> None:
+        # Обрыв без закрывающего рукопожатия, как при падении сети
+        for _, request in list(self._active.values()):
+            request.transport.abort()
+
+
+def dex_trade(signature: str, signer: str, action: str, mint: str, token_amount: float, sol_amount: float,
+              other_mint: Optional[str] = None) -> dict:
+    """
+    Нога DEXTrades: buy — отдали SOL, sell — получили SOL; other_mint — нога без SOL.
+    """
+    sol = {"MintAddress": other_mint or SOL_MINT, "Symbol": "OTHER" if other_mint else "WSOL"}
+    token = {"MintAddress": mint, "Symbol": "TKN"}
+    buy, sell = ((token, token_amount), (sol, sol_amount)) if action == "buy" else \
+        ((sol, sol_amount), (token, token_amount))
+    return {
+        "Block": {"Time": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")},
+        "Transaction": {"Signature": signature, "Signer": signer},
+        "Trade": {
+            "Buy": {"Amount": str(buy[1]), "Currency": buy[0]},
+            "Sell": {"Amount": str(sell[1]), "Currency": sell[0]},
+            "Dex": {"ProtocolName": "raydium_amm", "ProtocolFamily": "Raydium"},
+        },
+    }
+
+
+def new_signature() -> str:
+    return str(Keypair().sign_message(b"stub"))
+
+
+def new_address() -> str:
+    return str(Keypair().pubkey())
+
+
+def drain(feed: BitqueryTradeFeed) -> list:
+    trades = []
+    while not feed.queue.empty():
+        trades.append(feed.queue.get_nowait())
+    return trades
+
+
+@pytest.fixture(autouse=True)
+def feed_settings(monkeypatch):
+    monkeypatch.setattr(settings.bitquery_feed, "reconnect_min_delay", 0.05)
+
+
+def with_server(check) -> None:
+    async def run() -> None:
+        server = StubBitquery()
+        await server.start()
+        try:
+            await check(server)
+        finally:
+            await server.stop()
+
+    asyncio.run(run())
+
+
+def test_stream():
+    async def check(server: StubBitquery) -> None:
+        w1, w2, w3 = (new_address() for _ in range(3))
+        mint, other = new_address(), new_address()
+        feed = BitqueryTradeFeed(url=server.ws_url, maxsize=100)
+        feed.set_wallets([w1, w2])
+        feed.start()
+        try:
+            assert await asyncio.wait_for(server.subscriptions.get(), 5) == sorted([w1, w2])
+            await wait_until(lambda: feed.connected, what="connected")
+
+            s1, s2, s3, s4 = (new_signature() for _ in range(4))
+            await server.push(
+                dex_trade(s1, w1, "buy", mint, 1000.0, 0.5),
+                dex_trade(s2, w2, "sell", mint, 400.0, 0.25),
+                dex_trade(s3, w1, "buy", mint, 10.0, 3.0, other_mint=other),  # нога без SOL
+                dex_trade(s1, w1, "buy", mint, 1000.0, 0.5),  # повтор
+                # Маршрут: сначала нога без SOL, затем с SOL — сделка берётся со второй
+                dex_trade(s4, w2, "buy", other, 5.0, 20.0, other_mint=mint),
+                dex_trade(s4, w2, "buy", mint, 20.0, 0.1),
+            )
+            await wait_until(lambda: feed.stats()["received"] == 6, what="6 ног")
+            trades = drain(feed)
+            assert [trade.transaction.transaction_hash for trade in trades] == [s1, s2, s4], trades
+            buy, sell, routed = (trade.transaction for trade in trades)
+            assert trades[0].wallet_address == w1 and buy.transaction_action == TransactionAction.BUY
+            assert (buy.token_address, buy.buy_amount, buy.sell_amount) == (mint, 1000.0, 0.5), buy
+            assert abs(buy.price - 0.0005) < 1e-12, buy.price
+            assert trades[1].wallet_address == w2 and sell.transaction_action == TransactionAction.SELL
+            assert (sell.sell_amount, sell.buy_amount) == (400.0, 0.25), sell
+            assert routed.token_address == mint and routed.sell_amount == 0.1, routed
+            assert feed.stats()["duplicates"] == 1, feed.stats()
+
+            # Смена кошельков пересоздаёт подписку
+            feed.set_wallets([w1, w2, w3])
+            assert await asyncio.wait_for(server.subscriptions.get(), 5) == sorted([w1, w2, w3])
+
+            # Обрыв: переподключение, повтор старой подписи после него отсекается
+            await wait_until(lambda: feed.connected, what="connected после смены кошельков")
+            await server.drop()
+            wallets = await asyncio.wait_for(server.subscriptions.get(), 5)
+            assert wallets == sorted([w1, w2, w3]) and feed.stats()["reconnects"] == 1, feed.stats()
+            s5 = new_signature()
+            received = feed.stats()["received"]
+            await server.push(dex_trade(s1, w1, "buy", mint, 1000.0, 0.5), dex_trade(s5, w3, "sell", mint, 7.0, 0.01))
+            await wait_until(lambda: feed.stats()["received"] == received + 2, what="сделки после переподключения")
+            assert [trade.transaction.transaction_hash for trade in drain(feed)] == [s5]
+            assert feed.stats()["duplicates"] == 2
+        finally:
+            await feed.stop()
+
+    with_server(check)
+
+
+def test_bounded_queue_drops_oldest():
+    async def check(server: StubBitquery) -> None:
+        wallet, mint = new_address(), new_address()
+        feed = BitqueryTradeFeed(url=server.ws_url, maxsize=3)
+        feed.set_wallets([wallet])
+        feed.start()
+        try:
+            await asyncio.wait_for(server.subscriptions.get(), 5)
+            await wait_until(lambda: feed.connected, what="connected")
+            signatures = [new_signature() for _ in range(5)]
+            await server.push(*[dex_trade(signature, wallet, "buy", mint, 1.0, 0.01) for signature in signatures])
+            await wait_until(lambda: feed.stats()["received"] == 5, what="5 сделок")
+            assert [trade.transaction.transaction_hash for trade in drain(feed)] == signatures[2:]
+            assert feed.stats()["dropped"] == 2, feed.stats()
+        finally:
+            await feed.stop()
+
+    with_server(check)
+
+
+@pytest.mark.skipif(not os.getenv("TEST_INGEST_WALLET"), reason="нужна база и адрес из tracked_wallets")
+def test_ingest():
+    """
+    Сделка проходит через TradeFeedService в БД и к подписчику цикла отслеживания.
+    """
+    wallet = os.environ["TEST_INGEST_WALLET"]
+
+    async def check(server: StubBitquery) -> None:
+        import main  # noqa: F401  настраивает мапперы моделей
+        from api.api_init_helper import api_helper
+        from core.db_helper import db_helper
+        from core.service.trade_feed_service import TradeFeedService
+
+        service = TradeFeedService(db_helper.session_factory, api_helper, BitqueryTradeFeed(url=server.ws_url))
+        queue = service.subscribe(wallet)
+        try:
+            await asyncio.wait_for(server.subscriptions.get(), 5)
+            await wait_until(lambda: service.connected, what="connected")
+            signature = new_signature()
+            await server.push(dex_trade(signature, wallet, "buy", new_address(), 123.0, 0.2))
+            transactions = await service.next_transactions(queue, 5)
+            assert [transaction.transaction_hash for transaction in transactions] == [signature], transactions
+        finally:
+            await service.stop()
+            await service.feed.stop()
+
+    with_server(check)
@@ -0,0 +1,139 @@
+"""
+Фаззинг decode_metadata: на любых данных декодер либо возвращает верный результат, либо бросает
+MetadataDecodeError. Корпус синтетический: аккаунты с дополнением нулями до лимитов Metaplex и без него
+(как у токенов Pump.fun), с Unicode в именах.
+"""
+import base64
+import random
+import struct
+
+import pytest
+from solders.keypair import Keypair
+
+from api.metaplex import (MAX_NAME_LENGTH, MAX_SYMBOL_LENGTH, MAX_URI_LENGTH, METADATA_DATA, METADATA_V1_KEY,
+                          MetadataDecodeError, decode_metadata, decode_token_info)
+
+# После seller_fee_basis_points у настоящих аккаунтов идут creators, collection, uses и т.д.
+TAIL_SIZE = 679 - METADATA_DATA - (4 + MAX_NAME_LENGTH) - (4 + MAX_SYMBOL_LENGTH) - (4 + MAX_URI_LENGTH) - 2
+WORDS = ["Solana", "Pepe", "Cat", "Dog", "Moon", "AI", "Trump", "Bonk", "🚀", "币", "Жаба", "Ñandú"]
+SEED = 47
+
+
+def borsh_string(value: str, pad_to: int = 0) -> bytes:
+    raw = value.encode("utf-8")
+    raw += b"\x00" * max(0, pad_to - len(raw))
+    return struct.pack("<I", len(raw)) + raw
+
+
+def build_account(rng: random.Random, padded: bool) -> tuple[bytes, dict]:
+    name = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+    while len(name.encode()) > MAX_NAME_LENGTH:
+        name = name[:-1]
+    symbol = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(rng.randint(2, 8)))
+    uri = f"https://ipfs.io/ipfs/Qm{''.join(rng.choice('abcdef0123456789') for _ in range(rng.randint(20, 44)))}"
+    fee = rng.randint(0, 10_000)
+    authority, mint = bytes(Keypair().pubkey()), bytes(Keypair().pubkey())
+    data = (bytes([METADATA_V1_KEY]) + authority + mint
+            + borsh_string(name, MAX_NAME_LENGTH if padded else 0)
+            + borsh_string(symbol, MAX_SYMBOL_LENGTH if padded else 0)
+            + borsh_string(uri, MAX_URI_LENGTH if padded else 0)
+            + struct.pack("<H", fee))
+    expected = {"name": name, "symbol": symbol, "uri": uri, "seller_fee_basis_points": fee,
+                "mint": mint, "update_authority": authority, "fee_end": len(data)}
+    return data + bytes(rng.getrandbits(8) for _ in range(TAIL_SIZE if padded else rng.randint(0, 40))), expected
+
+
+def build_corpus(count: int, seed: int = SEED) -> list[tuple[bytes, dict]]:
+    rng = random.Random(seed)
+    return [build_account(rng, padded=index % 2 == 0) for index in range(count)]
+
+
+def fee_end(data: bytes) -> int:
+    # Конец seller_fee_basis_points: минимальная длина буфера, на которой разбор ещё успешен
+    offset = METADATA_DATA
+    for _ in range(3):
+        offset += 4 + struct.unpack_from("<I", data, offset)[0]
+    return offset + 2
+
+
+def decode_or_error(data: bytes):
+    try:
+        return decode_metadata(data)
+    except MetadataDecodeError:
+        return None
+
+
+@pytest.fixture(scope="module")
+def corpus() -> list[tuple[bytes, dict]]:
+    return build_corpus(500)
+
+
+@pytest.fixture(scope="module")
+def sample(corpus) -> list[bytes]:
+    return [data for data, _ in corpus[:50]]
+
+
+def test_corpus_decodes(corpus):
+    for data, expected in corpus:
+        metadata = decode_metadata(data)
+        assert metadata.name == expected["name"].strip(), (metadata.name, expected["name"])
+        assert metadata.symbol == expected["symbol"] and metadata.uri == expected["uri"]
+        assert metadata.seller_fee_basis_points == expected["seller_fee_basis_points"]
+        assert bytes(metadata.mint) == expected["mint"]
+        assert bytes(metadata.update_authority) == expected["update_authority"]
+        assert fee_end(data) == expected["fee_end"]
+
+
+def test_truncated(sample):
+    for data in sample:
+        full = decode_metadata(data)
+        minimum = fee_end(data)
+        for length in range(len(data)):
+            result = decode_or_error(data[:length])
+            assert (result is None) == (length < minimum), f"обрезка до {length} из {len(data)}: {result}"
+            assert result is None or result == full
+
+
+def test_oversized_lengths(sample):
+    for data in sample:
+        offset = METADATA_DATA
+        for max_length in (MAX_NAME_LENGTH, MAX_SYMBOL_LENGTH, MAX_URI_LENGTH):
+            length = struct.unpack_from("<I", data, offset)[0]
+            for bad in (max_length * 4 + 1, len(data), len(data) - offset - 3, 0xFFFFFFFF):
+                if bad <= max_length * 4 and offset + 4 + bad <= len(data):
+                    # Длина в пределах лимита и буфера: поля съезжают, но читать за концом нельзя
+                    continue
+                mutated = bytearray(data)
+                struct.pack_into("<I", mutated, offset, bad)
+                assert decode_or_error(bytes(mutated)) is None, f"длина {bad} на смещении {offset} принята"
+            offset += 4 + length
+
+
+def test_wrong_key(sample):
+    for data in sample:
+        for key in range(256):
+            if key != METADATA_V1_KEY:
+                assert decode_or_error(bytes([key]) + data[1:]) is None, f"key {key} принят"
+
+
+def test_mutations(corpus):
+    """
+    Случайные перевороты битов и мусор: допустимы только успешный разбор или MetadataDecodeError.
+    decode_token_info (путь DecodeExecutor) не должен бросать ничего.
+    """
+    rng = random.Random(SEED)
+    buffers = [data for data, _ in corpus]
+    for index in range(20_000):
+        if index % 10 == 0:
+            data = bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 700)))
+            if data:
+                data = bytes([METADATA_V1_KEY]) + data[1:]
+        else:
+            mutated = bytearray(rng.choice(buffers))
+            for _ in range(rng.randint(1, 8)):
+                position = rng.randrange(len(mutated))
+                mutated[position] ^= 1 << rng.randrange(8)
+            data = bytes(mutated)
+        decode_or_error(data)
+        info = decode_token_info(("mint", base64.b64encode(data).decode(), None))
+        assert set(info) == {"symbol", "name", "decimals"}
@@ -0,0 +1,244 @@
+"""
+QuoteRouter на локальных заглушках площадок: Jupiter (/quote, /swap-instructions), Raydium Trade API
+(compute/swap-base-in, transaction/swap-base-in) и Solana RPC для оценки комиссии, симуляции, blockhash и отправки.
+Клиенты JupiterAPI и RaydiumAPI настоящие, меняются только адреса.
+"""
+import asyncio
+import base64
+import time
+
+import pytest
+from aiohttp import web
+from solders.hash import Hash
+from solders.keypair import Keypair
+from solders.message import MessageV0
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solders.system_program import TransferParams, transfer
+from solders.transaction import VersionedTransaction
+
+from api.compute_budget import ComputeUnitEstimator
+from api.jupiter_api import JupiterAPI
+from api.priority_fee import PriorityFeeEstimator
+from api.quote_router import WSOL, NoQuoteError, QuoteRouter
+from api.raydium_api import RaydiumAPI
+from api.rpc_router import RpcEndpoint, RpcRouter
+from api.swap_builder import BlockhashCache, LookupTableCache
+from api.transaction_sender import TransactionSender
+from core.config import settings
+from tests.stubs import StubRpc, StubServer
+
+MINT = str(Keypair().pubkey())
+BLOCKHASH = Hash.new_unique()
+PRIORITY_FEE = 10_000  # micro-lamports/CU в ответе getRecentPrioritizationFees
+AMOUNT = 100_000_000
+
+
+class StubVenue:
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = str(Keypair().pubkey())
+        self.out_amount = 1_000_000
+        self.platform_fee = 0
+        self.delay = 0.0
+        self.quote_fails = False
+        self.swap_fails = False
+        self.swaps = 0
+
+
+def swap_instruction(wallet: str):
+    return transfer(TransferParams(from_pubkey=Pubkey.from_string(wallet), to_pubkey=Pubkey.new_unique(), lamports=1))
+
+
+class StubVenues(StubServer):
+    """
+    Jupiter на /jupiter и Raydium на /raydium.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.jupiter = StubVenue("jupiter")
+        self.raydium = StubVenue("raydium")
+        self.app.router.add_get("/jupiter/quote", self.jupiter_quote)
+        self.app.router.add_post("/jupiter/swap-instructions", self.jupiter_swap_instructions)
+        self.app.router.add_get("/raydium/compute/swap-base-in", self.raydium_quote)
+        self.app.router.add_post("/raydium/transaction/swap-base-in", self.raydium_swap)
+
+    async def jupiter_quote(self, request: web.Request) -> web.Response:
+        venue = self.jupiter
+        await asyncio.sleep(venue.delay)
+        if venue.quote_fails:
+            return web.json_response({"error": "No routes found"}, status=400)
+        query = request.query
+        return web.json_response({
+            "inputMint": query["inputMint"], "outputMint": query["outputMint"], "inAmount": query["amount"],
+            "outAmount": str(venue.out_amount), "platformFee": {"amount": str(venue.platform_fee), "feeBps": 0},
+            "routePlan": [{"swapInfo": {"ammKey": venue.pool}, "percent": 100}],
+        })
+
+    async def jupiter_swap_instructions(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        if self.jupiter.swap_fails:
+            return web.json_response({"error": "stub failure"}, status=500)
+        self.jupiter.swaps += 1
+        instruction = swap_instruction(payload["userPublicKey"])
+        return web.json_response({
+            "swapInstruction": {
+                "programId": str(instruction.program_id),
+                "data": base64.b64encode(bytes(instruction.data)).decode(),
+                "accounts": [{"pubkey": str(meta.pubkey), "isSigner": meta.is_signer, "isWritable": meta.is_writable}
+                             for meta in instruction.accounts],
+            },
+            "addressLookupTableAddresses": [],
+        })
+
+    async def raydium_quote(self, request: web.Request) -> web.Response:
+        venue = self.raydium
+        await asyncio.sleep(venue.delay)
+        if venue.quote_fails:
+            return web.json_response({"success": False, "msg": "ROUTE_NOT_FOUND"})
+        query = request.query
+        return web.json_response({"success": True, "data": {
+            "inputMint": query["inputMint"], "outputMint": query["outputMint"], "inputAmount": query["amount"],
+            "outputAmount": str(venue.out_amount), "routePlan": [{"poolId": venue.pool}],
+        }})
+
+    async def raydium_swap(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        if self.raydium.swap_fails:
+            return web.json_response({"success": False, "msg": "stub failure"}, status=500)
+        self.raydium.swaps += 1
+        wallet = Pubkey.from_string(payload["wallet"])
+        # Raydium отдаёт готовую транзакцию со своим blockhash, клиент подменяет его на закешированный
+        message = MessageV0.try_compile(wallet, [swap_instruction(payload["wallet"])], [], Hash.default())
+        transaction = VersionedTransaction.populate(message, [Signature.default()])
+        return web.json_response({"success": True, "data": [
+            {"transaction": base64.b64encode(bytes(transaction)).decode()}]})
+
+
+def stub_rpc(sent: list[VersionedTransaction]) -> StubRpc:
+    def send_transaction(params: list) -> str:
+        transaction = VersionedTransaction.from_bytes(base64.b64decode(params[0]))
+        sent.append(transaction)
+        return str(transaction.signatures[0])
+
+    rpc = StubRpc()
+    rpc.results.update({
+        "getRecentPrioritizationFees": [{"slot": slot, "prioritizationFee": PRIORITY_FEE} for slot in range(150)],
+        "getLatestBlockhash": {"context": {"slot": 1},
+                               "value": {"blockhash": str(BLOCKHASH), "lastValidBlockHeight": 1150}},
+        "simulateTransaction": {"context": {"slot": 1}, "value": {"err": None, "unitsConsumed": 120_000, "logs": []}},
+        "sendTransaction": send_transaction,
+        "getSignatureStatuses": lambda params: {"context": {"slot": 2}, "value": [
+            {"slot": 2, "confirmations": 1, "err": None, "confirmationStatus": "confirmed"} for _ in params[0]]},
+        "getBlockHeight": 1000,
+    })
+    return rpc
+
+
+@pytest.fixture(autouse=True)
+def router_settings(monkeypatch):
+    monkeypatch.setattr(settings.quote_router, "venues", ["jupiter", "raydium"])
+    monkeypatch.setattr(settings.swap_builder, "mode", "instructions")
+    monkeypatch.setattr(settings.sender, "poll_interval", 0.05)
+
+
+def with_router(check) -> None:
+    async def run() -> None:
+        venues, sent = StubVenues(), []
+        rpc_server = stub_rpc(sent)
+        await asyncio.gather(venues.start(), rpc_server.start())
+        rpc = RpcRouter([RpcEndpoint("stub", rpc_server.url, 1000)])
+        sender = TransactionSender(rpc)
+        fee_estimator = PriorityFeeEstimator(rpc)
+        cu_estimator = ComputeUnitEstimator(rpc)
+        blockhashes = BlockhashCache(rpc)
+        jupiter = JupiterAPI(sender, fee_estimator, cu_estimator, blockhashes, LookupTableCache(rpc),
+                             jupiter_api_endpoint=f"{venues.url}/jupiter")
+        raydium = RaydiumAPI(sender, fee_estimator, cu_estimator, blockhashes,
+                             raydium_api_endpoint=f"{venues.url}/raydium")
+        router = QuoteRouter({"jupiter": jupiter, "raydium": raydium}, fee_estimator)
+        try:
+            await check(router, venues, sent)
+        finally:
+            await rpc.close()
+            for client in (jupiter, raydium):
+                if client._session is not None:
+                    await client._session.close()
+            await asyncio.gather(venues.stop(), rpc_server.stop())
+
+    asyncio.run(run())
+
+
+def test_best_net_out_amount():
+    async def check(router: QuoteRouter, venues: StubVenues, sent: list) -> None:
+        # У Jupiter выход больше, но после комиссии площадки меньше
+        venues.jupiter.out_amount, venues.jupiter.platform_fee = 1_000_000, 30_000
+        venues.raydium.out_amount = 980_000
+        quotes = await router.quotes(WSOL, MINT, AMOUNT, 100)
+        assert [quote.venue for quote in quotes] == ["raydium", "jupiter"], quotes
+
+        # Равный выход без комиссии площадки: решает стоимость исполнения по оценке CU
+        venues.jupiter.platform_fee = 0
+        venues.raydium.out_amount = 1_000_000
+        quotes = await router.quotes(WSOL, MINT, AMOUNT, 100)
+        units = settings.quote_router.compute_units
+        assert [quote.venue for quote in quotes] == \
+            (["raydium", "jupiter"] if units["raydium"] < units["jupiter"] else ["jupiter", "raydium"]), quotes
+        for quote in quotes:
+            lamports = 5000 + PRIORITY_FEE * units[quote.venue] // 1_000_000
+            assert quote.network_fee == lamports * quote.out_amount // quote.in_amount, quote
+
+    with_router(check)
+
+
+def test_late_quote_is_dropped():
+    deadline_ms = 200
+
+    async def check(router: QuoteRouter, venues: StubVenues, sent: list) -> None:
+        # Лучшая котировка приходит после дедлайна и не должна учитываться
+        venues.raydium.out_amount, venues.raydium.delay = 2_000_000, 1.0
+        started = time.monotonic()
+        quote = await router.best_quote(WSOL, MINT, AMOUNT, 100, deadline_ms=deadline_ms)
+        elapsed = (time.monotonic() - started) * 1000
+        assert quote.venue == "jupiter", quote
+        assert elapsed < deadline_ms + 150, f"ожидание {elapsed:.0f} мс при дедлайне {deadline_ms} мс"
+        assert router.stats()["raydium"]["late"] == 1, router.stats()
+
+    with_router(check)
+
+
+def test_quote_errors():
+    async def check(router: QuoteRouter, venues: StubVenues, sent: list) -> None:
+        venues.raydium.quote_fails = True
+        quote = await router.best_quote(WSOL, MINT, AMOUNT, 100)
+        assert quote.venue == "jupiter" and router.stats()["raydium"]["errors"] == 1, router.stats()
+
+        venues.jupiter.quote_fails = True
+        with pytest.raises(NoQuoteError):
+            await router.swap(Keypair(), WSOL, MINT, AMOUNT, 100)
+
+    with_router(check)
+
+
+def test_execution_falls_back_to_next_venue():
+    async def check(router: QuoteRouter, venues: StubVenues, sent: list) -> None:
+        keypair = Keypair()
+        venues.raydium.out_amount = 1_100_000
+        pending = await router.swap(keypair, WSOL, MINT, AMOUNT, 100)
+        assert venues.raydium.swaps == 1 and venues.jupiter.swaps == 0
+        assert sent[-1].message.account_keys[0] == keypair.pubkey()
+        assert sent[-1].message.recent_blockhash == BLOCKHASH, "blockhash Raydium не заменён на закешированный"
+        assert str(sent[-1].signatures[0]) == pending.signature
+        assert (await asyncio.wait_for(pending.result, 5)).landed
+
+        # Сборка на лучшей площадке упала: исполняется следующая котировка
+        venues.raydium.swap_fails = True
+        pending = await router.swap(keypair, WSOL, MINT, AMOUNT, 100)
+        assert venues.jupiter.swaps == 1, "не было перехода на jupiter"
+        assert sent[-1].message.recent_blockhash == BLOCKHASH
+        assert (await asyncio.wait_for(pending.result, 5)).landed
+        stats = router.stats()
+        assert stats["raydium"]["wins"] == 1 and stats["jupiter"]["wins"] == 1, stats
+
+    with_router(check)
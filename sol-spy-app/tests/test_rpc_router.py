@@ -0,0 +1,146 @@
+"""
+RpcRouter на локальных заглушках JSON-RPC: переключение при HTTP-ошибке и повторяемых кодах, отсутствие повтора
+на обычной ошибке JSON-RPC, отключение ноды после серии ошибок, hedged-чтение при медленной ноде, исключение
+отстающей по слоту ноды, broadcast и лимит запросов.
+"""
+import asyncio
+import time
+
+import pytest
+
+from api.rpc_router import RpcEndpoint, RpcError, RpcResponseError, RpcRouter
+from core.config import settings
+from tests.stubs import StubRpc
+
+
+@pytest.fixture(autouse=True)
+def rpc_settings(monkeypatch):
+    monkeypatch.setattr(settings.rpc, "cooldown_seconds", 60)
+
+
+def with_nodes(check, names: tuple[str, ...] = ("a", "b"), rate: float = 1000) -> None:
+    async def run() -> None:
+        nodes = [StubRpc(name) for name in names]
+        await asyncio.gather(*(node.start() for node in nodes))
+        router = RpcRouter([RpcEndpoint(node.name, node.url, rate) for node in nodes])
+        try:
+            await check(router, *nodes)
+        finally:
+            await router.close()
+            await asyncio.gather(*(node.stop() for node in nodes))
+
+    asyncio.run(run())
+
+
+def test_failover_and_disable():
+    async def check(router: RpcRouter, a: StubRpc, b: StubRpc) -> None:
+        a.http_status = 500
+        result = await router.request("getBalance", ["x"], hedge=False)
+        assert result["node"] == "b", result
+        assert a.calls["getBalance"] == 1 and b.calls["getBalance"] == 1
+        assert router.ranked("getBalance")[0].name == "b", "нода с ошибками осталась первой"
+
+        # Пока b тоже лежит, запросы доходят до a и набирают ей серию ошибок
+        b.http_status = 500
+        for _ in range(settings.rpc.max_consecutive_errors - 1):
+            with pytest.raises(RpcError):
+                await router.request("getBalance", ["x"], hedge=False)
+        node_a, node_b = router.endpoints
+        assert not node_a.available, "нода a не отключена после серии ошибок"
+        assert node_b.available, "нода b отключена раньше времени"
+        b.http_status = 200
+        result = await router.request("getBalance", ["x"], hedge=False)
+        assert result["node"] == "b" and router.ranked("getBalance")[-1] is node_a
+
+    with_nodes(check)
+
+
+def test_retryable_rpc_code_goes_to_next_node():
+    async def check(router: RpcRouter, a: StubRpc, b: StubRpc) -> None:
+        a.error = {"code": -32005, "message": "Node is behind"}
+        result = await router.request("getAccountInfo", ["x"], hedge=False)
+        assert result["node"] == "b", result
+
+    with_nodes(check)
+
+
+def test_rpc_error_is_not_retried():
+    async def check(router: RpcRouter, a: StubRpc, b: StubRpc) -> None:
+        a.error = {"code": -32602, "message": "Invalid params"}
+        with pytest.raises(RpcResponseError) as error:
+            await router.request("getAccountInfo", ["x"], hedge=False)
+        assert error.value.code == -32602
+        assert b.calls["getAccountInfo"] == 0, "на неповторяемой ошибке запрос ушёл на вторую ноду"
+        assert router.endpoints[0].consecutive_errors == 0, "ошибка параметров засчитана ноде"
+
+        a.http_status = b.http_status = 500
+        with pytest.raises(RpcError, match="все RPC ноды недоступны"):
+            await router.request("getAccountInfo", ["x"], hedge=False)
+
+    with_nodes(check)
+
+
+def test_hedged_read_and_single_write():
+    async def check(router: RpcRouter, a: StubRpc, b: StubRpc) -> None:
+        a.delay = 0.005
+        for _ in range(20):
+            # Прогрев: у a короткий p95 и лучший балл, она будет первой
+            await router.request("getAccountInfo", ["x"], hedge=False)
+        assert router.ranked("getAccountInfo")[0].name == "a"
+        a.delay = 1.0
+        started = time.monotonic()
+        result = await router.request("getAccountInfo", ["x"])
+        elapsed = time.monotonic() - started
+        assert result["node"] == "b", result
+        assert elapsed < 0.5, f"hedged-чтение заняло {elapsed:.3f} с"
+        assert b.calls["getAccountInfo"] == 1
+
+        # Запись не дублируется, даже если первая нода отвечает медленно
+        first = {"a": a, "b": b}[router.ranked("sendTransaction")[0].name]
+        a.delay = b.delay = 0
+        first.delay = 0.3
+        result = await router.request("sendTransaction", ["x"])
+        assert result["node"] == first.name, result
+        assert a.calls["sendTransaction"] + b.calls["sendTransaction"] == 1, "запись продублирована"
+
+    with_nodes(check)
+
+
+def test_slot_lag():
+    async def check(router: RpcRouter, a: StubRpc, b: StubRpc) -> None:
+        b.slot = a.slot - settings.rpc.max_slot_lag - 1
+        await router.refresh_slots()
+        lagging = router.endpoints[1]
+        assert lagging.slot_lag == settings.rpc.max_slot_lag + 1 and not lagging.available
+        b.slot = a.slot
+        await router.refresh_slots()
+        assert lagging.available
+
+    with_nodes(check)
+
+
+def test_broadcast():
+    async def check(router: RpcRouter, a: StubRpc, b: StubRpc) -> None:
+        assert set(await router.broadcast("sendTransaction", ["tx"])) == {"a", "b"}
+        a.http_status = 500
+        assert set(await router.broadcast("sendTransaction", ["tx"])) == {"b"}
+        b.http_status = 500
+        with pytest.raises(RpcError):
+            await router.broadcast("sendTransaction", ["tx"])
+
+    with_nodes(check)
+
+
+def test_rate_limit():
+    rate = 20
+
+    async def check(router: RpcRouter, a: StubRpc) -> None:
+        count = rate * 2
+        started = time.monotonic()
+        await asyncio.gather(*[router.request("getSlot", hedge=False) for _ in range(count)])
+        elapsed = time.monotonic() - started
+        # Первые rate запросов проходят сразу из корзины, остальные — по rate в секунду
+        expected = (count - rate) / rate
+        assert elapsed >= expected * 0.9, f"{count} запросов за {elapsed:.2f} с при лимите {rate}/с"
+
+    with_nodes(check, names=("a",), rate=rate)
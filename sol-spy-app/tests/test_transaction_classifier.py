@@ -0,0 +1,34 @@
+"""
+classify_transaction на записанных ответах getTransaction (jsonParsed) из fixtures/transactions:
+каждая фикстура хранит ожидаемый разбор, путь DecodeExecutor должен давать тот же результат.
+"""
+import json
+import math
+
+import pytest
+
+from api.transaction_classifier import classify_payload, classify_transaction
+from tests.stubs import load_transaction_fixtures
+
+EXPECTED_FIELDS = ("transaction_action", "token_address", "token_symbol", "buy_amount", "sell_amount",
+                   "transfer_amount", "dex_name", "sol_balance_before", "token_balance_before")
+
+
+def actual_fields(parsed) -> dict:
+    return {field: getattr(parsed, field).name if field == "transaction_action" else getattr(parsed, field)
+            for field in EXPECTED_FIELDS}
+
+
+@pytest.mark.parametrize("fixture", load_transaction_fixtures(), ids=lambda fixture: fixture["name"])
+def test_fixture(fixture: dict):
+    parsed = classify_transaction(fixture["signature"], fixture["result"], oracle=None)
+    actual = actual_fields(parsed)
+    for field, expected in fixture["expected"].items():
+        value = actual[field]
+        same = math.isclose(value, expected, rel_tol=1e-9, abs_tol=1e-12) \
+            if isinstance(expected, float) and value is not None else value == expected
+        assert same, f"{field} = {value!r}, ожидалось {expected!r}"
+
+    body = json.dumps({"jsonrpc": "2.0", "id": 1, "result": fixture["result"]}).encode()
+    assert classify_payload((fixture["signature"], body, False))[0] == parsed, \
+        "classify_payload расходится с classify_transaction"